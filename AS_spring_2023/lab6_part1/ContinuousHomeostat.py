@@ -0,0 +1,585 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+from Homeostat import *
+
+from abc import ABC, abstractmethod
+
+from scipy.linalg import expm
+from scipy.optimize import brentq
+
+'''
+    A Homeostat which is simulated in continuous time, rather than with
+    fixed Euler steps.
+
+    Between events, the dynamics of every unit are linear with constant
+    coefficients:
+        theta'     = theta_dot
+        theta_dot' = -k * theta_dot + l * (p - q) * sum_j(w_ij * theta_j)
+    which is the system which Unit.integrate approximates as dt -> 0. The
+    state of the whole Homeostat is packed into a single vector,
+        x = [theta (n), theta_dot (n), 1]
+    so that x' = M x, where the constant 1 carries the values of theta of
+    any units which are pinned at their hard limits.
+
+    The events which change the dynamics are:
+        - a unit crossing its viability boundary, if it could adapt, in which
+          case it adapts its weights and starts testing them
+        - a unit hitting a hard limit, in which case theta_dot is set to 0,
+          as in Unit.integrate, and the unit stays pinned at the limit for as
+          long as its acceleration points out of its limits
+        - a pinned unit's acceleration turning back inside its limits, in
+          which case it is released
+        - a test timer expiring, after test_interval units of simulated
+          time, in which case the unit stops testing, and adapts again
+          straight away if it is still not viable
+    Every event is found as the root of a function which is linear in x,
+    and which is positive past the boundary. Subclasses implement
+    propagate(), which moves the state forwards until the first event or
+    until some maximum time, in whatever way suits them.
+
+    The histories (ts, states, weights_hist, testing_hist) are recorded at
+    the times of events, and at the other times at which the subclass
+    computes the state, so unlike the other Homeostats the time steps are
+    not evenly spaced.
+'''
+class ContinuousHomeostat(System, ABC):
+
+    def __init__(self, n_units, upper_viability, lower_viability, adapt_fun, upper_limit=np.Inf, lower_limit=-np.Inf, weights_set=None, test_interval=10, adapt_enabled=True, m=1, k=1, l=1, p=2, q=1, theta0=2, theta_dot0=0, seed=None):
+
+        self.n_units = n_units
+        # the adaptation function has the same signature as in Homeostat
+        self.adapt_fun = adapt_fun
+        # the discrete set of weights to choose from, if one is used
+        self.weights_set = weights_set
+
+        # per-unit parameters
+        self.m = self.unit_param(m)
+        self.k = self.unit_param(k)
+        self.l = self.unit_param(l)
+        self.p = self.unit_param(p)
+        self.q = self.unit_param(q)
+        self.upper_limit = self.unit_param(upper_limit)
+        self.lower_limit = self.unit_param(lower_limit)
+        self.upper_viability = self.unit_param(upper_viability)
+        self.lower_viability = self.unit_param(lower_viability)
+        self.test_interval = self.unit_param(test_interval)
+        self.adapt_enabled = self.unit_param(adapt_enabled, dtype=bool)
+
+        # the packed state, [theta (n), theta_dot (n), 1]
+        self.x = np.concatenate((self.unit_param(theta0), self.unit_param(theta_dot0), [1.0]))
+
+        # random number streams for the initial weights and for each unit,
+        # spawned from seed in the same way as in Homeostat
+        weights_rng, self.rngs = make_streams(seed, n_units)
+
+        # connect units, with random weights, drawn in the same order as in Homeostat
+        self.weights_version = 0
+        self.set_weights(get_rng(weights_rng).uniform(-1, 1, (n_units, n_units)))
+
+        self.testing = np.zeros(n_units, dtype=bool) # which units are in the process of adaptation
+        self.timer = np.zeros(n_units) # the simulated time since each unit started testing its current weights
+        self.test_times = [[] for _ in range(n_units)] # times when each unit starts testing new weights
+        self.pinned = np.zeros(n_units, dtype=bool) # which units are being held at one of their hard limits
+        self.t = 0
+        self.n_events = 0 # a count of the events which have been handled
+
+        # histories, recorded at irregular times
+        self.ts = []
+        self.states = []
+        self.weights_hist = []
+        self.testing_hist = []
+        self.record()
+
+    # broadcast a parameter to a (n_units,) array
+    def unit_param(self, value, dtype=float):
+        return np.array(np.broadcast_to(value, (self.n_units,)), dtype=dtype)
+
+    # views of the parts of the current state
+    @property
+    def theta(self):
+        return self.x[:self.n_units]
+
+    @property
+    def theta_dot(self):
+        return self.x[self.n_units:2*self.n_units]
+
+    # histories of the parts of the state, as (times, n_units) arrays
+    @property
+    def thetas(self):
+        return np.array(self.states)[:, :self.n_units]
+
+    @property
+    def theta_dots(self):
+        return np.array(self.states)[:, self.n_units:2*self.n_units]
+
+    # set the full weight matrix. the matrix is replaced, rather than
+    # modified, and the version is used to know when anything which was
+    # computed from the weights is out of date
+    def set_weights(self, weights):
+        self.weights = np.array(weights, dtype=float)
+        self.weights.flags.writeable = False
+        self.weights_version += 1
+
+    # the rows of the dynamics which give the acceleration of each unit,
+    # theta_dotdot = -k * theta_dot + l * (p - q) * (weights @ theta)
+    def acceleration_rows(self):
+        n = self.n_units
+        rows = np.zeros((n, 2*n + 1))
+        rows[:, :n] = (self.l * (self.p - self.q))[:, None] * self.weights
+        rows[:, n:2*n] = -np.diag(self.k)
+        return rows
+
+    # the matrix M for which x' = M x, while the units in self.pinned are
+    # held at their limits
+    def dynamics_matrix(self):
+        n = self.n_units
+        M = np.zeros((2*n + 1, 2*n + 1))
+        free = np.flatnonzero(~self.pinned)
+        M[free, n + free] = 1
+        M[n:2*n] = self.acceleration_rows()
+        M[n + np.flatnonzero(self.pinned)] = 0
+        return M
+
+    # the boundary which matters to each unit is its viability limit, if it
+    # could adapt, otherwise it is its hard limit
+    def boundaries(self):
+        can_adapt = self.adapt_enabled & ~self.testing
+        upper = np.where(can_adapt, np.minimum(self.upper_viability, self.upper_limit), self.upper_limit)
+        lower = np.where(can_adapt, np.maximum(self.lower_viability, self.lower_limit), self.lower_limit)
+        return upper, lower
+
+    # the event functions for the current configuration, as a matrix C, so
+    # that the event values are C @ x, and an event happens when a value
+    # becomes positive. Also returns the unit which each event belongs to,
+    # and its kind: 1 for crossing the upper boundary, -1 for crossing the
+    # lower boundary, and 0 for the release of a pinned unit
+    def event_functions(self):
+        n = self.n_units
+        upper, lower = self.boundaries()
+        acc = self.acceleration_rows()
+        rows = []
+        units = []
+        kinds = []
+        for i in range(n):
+            if self.pinned[i]:
+                # the acceleration points back inside the limits
+                at_upper = self.theta[i] >= self.upper_limit[i]
+                rows.append(-acc[i] if at_upper else acc[i])
+                units.append(i)
+                kinds.append(0)
+                continue
+            for kind, boundary in ((1, upper[i]), (-1, lower[i])):
+                if np.isfinite(boundary):
+                    row = np.zeros(2*n + 1)
+                    row[i] = kind
+                    row[2*n] = -kind * boundary
+                    rows.append(row)
+                    units.append(i)
+                    kinds.append(kind)
+        return np.array(rows).reshape(-1, 2*n + 1), np.array(units, dtype=int), np.array(kinds, dtype=int)
+
+    # which units' test timers have expired. timers which are within
+    # rounding error of test_interval count as expired
+    def expired_timers(self):
+        return self.testing & (self.timer >= self.test_interval * (1 - 1e-12))
+
+    # the simulated time until the next test timer expires
+    def time_to_expiry(self):
+        if not self.testing.any():
+            return np.inf
+        return max(0, (self.test_interval - self.timer)[self.testing].min())
+
+    # run the homeostat until its clock reaches duration, and return the
+    # times at which the histories were recorded
+    def run(self, duration):
+        self.resolve_boundaries()
+        while self.t < duration:
+            if self.expired_timers().any():
+                self.expire_timers()
+                self.resolve_boundaries()
+                continue
+            max_time = min(duration - self.t, self.time_to_expiry())
+            C, units, kinds = self.event_functions()
+            # an event can only happen once its function has been negative,
+            # so that events are not found again at the boundary they were
+            # just handled at
+            armed = C @ self.x < 0
+            elapsed, event = self.propagate(max_time, C, armed)
+            self.advance_clock(elapsed)
+            if event is not None:
+                self.handle_event(units[event], kinds[event])
+            self.resolve_boundaries()
+        return np.array(self.ts)
+
+    # move the state forwards by up to max_time, stopping at the first armed
+    # event. Returns the time which was simulated, and the index of the
+    # event which stopped it (or None). Implemented by subclasses
+    @abstractmethod
+    def propagate(self, max_time, C, armed):
+        pass
+
+    def advance_clock(self, elapsed):
+        self.t += elapsed
+        self.timer += elapsed
+
+    # handle an event of the given kind for unit i, at the current time
+    def handle_event(self, i, kind):
+        self.n_events += 1
+        if kind == 0:
+            # the unit's acceleration points back inside its limits
+            self.pinned[i] = False
+            return
+        # put theta exactly on the boundary it crossed
+        upper, lower = self.boundaries()
+        boundary = upper[i] if kind > 0 else lower[i]
+        limit = self.upper_limit[i] if kind > 0 else self.lower_limit[i]
+        self.theta[i] = boundary
+        if boundary == limit:
+            self.hit_limit(i)
+        else:
+            # the unit reached its viability limit
+            self.adapt(i)
+        self.record()
+
+    # stop testing for any units whose timers have expired. units which are
+    # still not viable adapt again straight away
+    def expire_timers(self):
+        self.n_events += 1
+        expired = self.expired_timers()
+        self.testing = self.testing & ~expired
+        for i in np.flatnonzero(expired & self.adapt_enabled & ~self.test_viability()):
+            self.adapt(i)
+        self.record()
+
+    # a unit at a hard limit stops, as in Unit.integrate, and is pinned there
+    # while its acceleration points out of its limits
+    def hit_limit(self, i):
+        self.theta_dot[i] = 0
+        self.update_pin(i)
+
+    def update_pin(self, i):
+        acc = self.acceleration_rows()[i] @ self.x
+        if self.theta[i] >= self.upper_limit[i]:
+            self.pinned[i] = acc >= 0
+        elif self.theta[i] <= self.lower_limit[i]:
+            self.pinned[i] = acc <= 0
+        else:
+            self.pinned[i] = False
+        if self.pinned[i]:
+            self.theta_dot[i] = 0
+
+    # get new weights for unit i, and start testing them. As in
+    # VectorHomeostat, only the most recent inputs, weights and state of the
+    # unit are passed to adapt_fun
+    def adapt(self, i):
+        weights = self.weights.copy()
+        weights[i] = self.adapt_fun(0, [self.weights[i] * self.theta], [self.weights[i]], [self.theta[i]], [self.theta_dot[i]], weights_set=self.weights_set, self_ind=i, rng=self.rngs[i])
+        self.set_weights(weights)
+        self.testing = self.testing.copy()
+        self.testing[i] = True
+        self.timer[i] = 0
+        self.test_times[i].append(self.t)
+        if self.pinned[i]:
+            self.update_pin(i)
+
+    # make the state consistent with the limits and the viability test, e.g.
+    # at the start of a run, or after the state has been changed from
+    # outside: units past their hard limits are moved onto them, units
+    # which are not viable adapt, and pinned units are released if their
+    # acceleration no longer holds them at their limits
+    def resolve_boundaries(self):
+        changed = False
+        for i in range(self.n_units):
+            # units which are past their limits, or on them and moving out
+            if self.theta[i] >= self.upper_limit[i] and not self.pinned[i] and (self.theta[i] > self.upper_limit[i] or self.theta_dot[i] > 0):
+                self.theta[i] = self.upper_limit[i]
+                self.hit_limit(i)
+                changed = True
+            elif self.theta[i] <= self.lower_limit[i] and not self.pinned[i] and (self.theta[i] < self.lower_limit[i] or self.theta_dot[i] < 0):
+                self.theta[i] = self.lower_limit[i]
+                self.hit_limit(i)
+                changed = True
+            if self.adapt_enabled[i] and not self.testing[i] and not self.test_viability()[i]:
+                self.adapt(i)
+                changed = True
+        for i in np.flatnonzero(self.pinned):
+            self.update_pin(i)
+        if changed:
+            self.record()
+
+    # store the current state
+    def record(self):
+        self.ts.append(self.t)
+        self.states.append(self.x.copy())
+        self.weights_hist.append(self.weights)
+        self.testing_hist.append(self.testing)
+
+    # test which units are within their limits for viability
+    def test_viability(self):
+        return ~((self.theta > self.upper_viability) | (self.theta < self.lower_viability))
+
+'''
+    A ContinuousHomeostat which is integrated exactly, with a matrix
+    exponential propagator.
+
+    For the current weights and pinned units, the propagator P = expm(M h)
+    moves the state forwards by h, and its powers P^1..P^window are computed
+    once (by repeated doubling) and cached until the weights change, so a
+    window of samples of the trajectory costs one matrix product. The
+    sample interval h is short compared with the fastest time scale of M,
+    so an event function which crosses zero changes sign between two
+    samples, and the crossing is then found exactly by root finding on
+    expm(M s) applied to the sample before it.
+
+    When the free units are asymptotically stable and every event function
+    is bounded below zero for all future time (using the eigendecomposition
+    of M), the state is moved straight to the next timer expiry, or the end
+    of the run, with a single propagator. So a run which settles into
+    stability costs a handful of matrix exponentials, however long it is.
+'''
+class ExactHomeostat(ContinuousHomeostat):
+
+    def __init__(self, *args, max_sample_interval=0.1, window=256, **kwargs):
+        # the longest interval between samples, and the number of samples
+        # which are computed at once
+        self.max_sample_interval = max_sample_interval
+        self.window = window
+        self.propagators = {}
+        self.propagators_version = None
+        self.n_expm = 0 # a count of the matrix exponentials which have been computed
+        super().__init__(*args, **kwargs)
+
+    def expm(self, M, h):
+        self.n_expm += 1
+        return expm(M * h)
+
+    # the cached propagator for the current weights and pinned units, as
+    # (M, h, powers, stable), where powers[j] = expm(M h)^(j+1)
+    def propagator(self):
+        if self.propagators_version != self.weights_version:
+            self.propagators = {}
+            self.propagators_version = self.weights_version
+        key = self.pinned.tobytes()
+        if key not in self.propagators:
+            M = self.dynamics_matrix()
+            rate = np.abs(np.linalg.eigvals(M)).max()
+            h = self.max_sample_interval if rate == 0 else min(self.max_sample_interval, 0.5 / rate)
+            powers = np.empty((self.window, len(M), len(M)))
+            powers[0] = self.expm(M, h)
+            done = 1
+            while done < self.window:
+                count = min(done, self.window - done)
+                powers[done:done+count] = powers[:count] @ powers[done-1]
+                done += count
+            self.propagators[key] = (M, h, powers, self.stable_modes(M))
+        return self.propagators[key]
+
+    # if the part of the dynamics of the units which are not pinned is
+    # asymptotically stable and diagonalisable, return what settled() needs
+    # to bound its future, otherwise None. Writing y for the free part of
+    # the state, and u for the fixed part, y' = A y + B u, and
+    # y(t) = y* + V exp(L t) V^-1 (y(0) - y*), where y* = -A^-1 B u
+    def stable_modes(self, M):
+        n = self.n_units
+        free_units = np.flatnonzero(~self.pinned)
+        free = np.concatenate((free_units, n + free_units))
+        fixed = np.setdiff1d(np.arange(2*n + 1), free)
+        if len(free) == 0:
+            return None
+        A = M[np.ix_(free, free)]
+        B = M[np.ix_(free, fixed)]
+        eigenvalues, V = np.linalg.eig(A)
+        if eigenvalues.real.max() >= 0 or np.linalg.cond(V) > 1e8:
+            return None
+        V_inv = np.linalg.inv(V)
+        return free, fixed, A, B, eigenvalues, V, V_inv
+
+    # returns True if none of the event functions can become positive in
+    # any future time, while the configuration stays the same
+    def settled(self, modes, C):
+        free, fixed, A, B, eigenvalues, V, V_inv = modes
+        u = self.x[fixed]
+        equilibrium = -np.linalg.solve(A, B @ u)
+        z = V_inv @ (self.x[free] - equilibrium)
+        # the event values at the equilibrium, plus the largest amount which
+        # the decaying modes could add to them
+        values = C[:, free] @ equilibrium + C[:, fixed] @ u
+        bounds = np.abs(C[:, free] @ V) @ np.abs(z)
+        return (values + bounds < 0).all()
+
+    def propagate(self, max_time, C, armed):
+        M, h, powers, modes = self.propagator()
+
+        if np.isfinite(max_time) and modes is not None and self.settled(modes, C):
+            # jump straight to the end
+            self.x = self.expm(M, max_time) @ self.x
+            self.ts.append(self.t + max_time)
+            self.states.append(self.x.copy())
+            self.weights_hist.append(self.weights)
+            self.testing_hist.append(self.testing)
+            return max_time, None
+
+        # the samples in this window
+        n_samples = int(min(self.window, max_time // h))
+        samples = powers[:n_samples] @ self.x
+        taus = h * np.arange(1, n_samples + 1)
+        if n_samples < self.window and max_time - n_samples * h > 0:
+            # the end of the window falls between two samples
+            start = samples[-1] if n_samples else self.x
+            samples = np.concatenate((samples, [self.expm(M, max_time - n_samples * h) @ start]))
+            taus = np.append(taus, max_time)
+
+        # find the first sample at which an armed event function is positive
+        values = samples @ C.T
+        # an event is armed at a sample if it was armed at the start of the
+        # window, or its value was negative at an earlier sample
+        armed = np.logical_or.accumulate(np.vstack((armed, values[:-1] < 0)), axis=0)
+        crossed = (values > 0) & armed
+        hits = np.flatnonzero(crossed.any(axis=1))
+        if len(hits) == 0:
+            self.record_samples(taus, samples)
+            self.x = samples[-1].copy()
+            return taus[-1], None
+
+        # find the time of each crossing between the sample before and the
+        # sample at which it was seen, and take the earliest
+        j = hits[0]
+        start_tau = taus[j-1] if j > 0 else 0
+        start = samples[j-1] if j > 0 else self.x
+        interval = taus[j] - start_tau
+        self.record_samples(taus[:j], samples[:j])
+        first = None
+        for e in np.flatnonzero(crossed[j]):
+            f = lambda s: C[e] @ (self.expm(M, s) @ start)
+            s = 0 if f(0) >= 0 else brentq(f, 0, interval, xtol=1e-12)
+            if first is None or s < first[0]:
+                first = (s, e)
+        s, e = first
+        self.x = self.expm(M, s) @ start
+        return start_tau + s, e
+
+    # record samples at times taus after the current time
+    def record_samples(self, taus, samples):
+        for tau, sample in zip(taus, samples):
+            self.ts.append(self.t + tau)
+            self.states.append(sample)
+            self.weights_hist.append(self.weights)
+            self.testing_hist.append(self.testing)
+
+# the Butcher tableau of the Dormand-Prince 5(4) embedded Runge-Kutta pair.
+# The last row of dp_a is the 5th order solution, and dp_error gives the
+# difference between the 5th and 4th order solutions
+dp_a = [[],
+        [1/5],
+        [3/40, 9/40],
+        [44/45, -56/15, 32/9],
+        [19372/6561, -25360/2187, 64448/6561, -212/729],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]]
+dp_error = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+
+'''
+    A ContinuousHomeostat which is integrated with the Dormand-Prince 5(4)
+    embedded Runge-Kutta pair, with error control.
+
+    The step size grows while the dynamics are quiet, and shrinks to
+    resolve fast transients, so that the local error stays within
+    rtol * |x| + atol. Events are detected by a change in sign of their
+    function over an accepted step, and are then located by root finding
+    on the cubic Hermite interpolant of the step. n_evaluations counts the
+    evaluations of the dynamics, for comparison with the n_units
+    evaluations per step of the Euler-stepped Homeostat.
+'''
+class RKHomeostat(ContinuousHomeostat):
+
+    def __init__(self, *args, rtol=1e-4, atol=1e-6, max_step=np.inf, first_step=0.01, **kwargs):
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.h = first_step # the size of the next step to try
+        self.n_evaluations = 0
+        self.n_steps = 0
+        self.n_rejected = 0
+        self.dynamics = {}
+        self.dynamics_version = None
+        super().__init__(*args, **kwargs)
+
+    # the dynamics matrix, cached until the weights change
+    def cached_dynamics_matrix(self):
+        if self.dynamics_version != self.weights_version:
+            self.dynamics = {}
+            self.dynamics_version = self.weights_version
+        key = self.pinned.tobytes()
+        if key not in self.dynamics:
+            self.dynamics[key] = self.dynamics_matrix()
+        return self.dynamics[key]
+
+    # take one Dormand-Prince step of size h from x, where f0 = M @ x.
+    # Returns the new state, the derivative at the new state, and the
+    # error estimate scaled by the tolerances
+    def rk_step(self, M, x, f0, h):
+        stages = [f0]
+        for row in dp_a[1:]:
+            stages.append(M @ (x + h * (np.array(row) @ stages)))
+        self.n_evaluations += len(dp_a) - 1
+        # the last stage is evaluated at the new state (first same as last)
+        new_x = x + h * (np.array(dp_a[-1]) @ stages[:-1])
+        error = h * (dp_error @ stages)
+        scale = self.atol + self.rtol * np.maximum(np.abs(x), np.abs(new_x))
+        return new_x, stages[-1], np.sqrt(np.mean((error / scale)**2))
+
+    def propagate(self, max_time, C, armed):
+        M = self.cached_dynamics_matrix()
+        x = self.x
+        f0 = M @ x
+        self.n_evaluations += 1
+        tau = 0
+        while tau < max_time:
+            h = min(self.h, self.max_step, max_time - tau)
+            new_x, new_f, error = self.rk_step(M, x, f0, h)
+
+            # choose the next step size from the error
+            factor = 5 if error == 0 else min(5, max(0.2, 0.9 * error**-0.2))
+            if error > 1:
+                # reject the step, and try again with a smaller one
+                self.h = h * min(factor, 0.9)
+                self.n_rejected += 1
+                continue
+            # (a step which was shortened to end the window does not shrink the next one)
+            self.h = h * factor if h == self.h else min(self.h, h * factor)
+            self.n_steps += 1
+
+            new_values = C @ new_x
+            crossed = (new_values > 0) & armed
+            if crossed.any():
+                # locate the first crossing in this step
+                first = None
+                for e in np.flatnonzero(crossed):
+                    f = lambda s: C[e] @ hermite(x, f0, new_x, new_f, h, s)
+                    s = 0 if f(0) >= 0 else brentq(f, 0, h, xtol=1e-12)
+                    if first is None or s < first[0]:
+                        first = (s, e)
+                s, e = first
+                self.x = hermite(x, f0, new_x, new_f, h, s)
+                return tau + s, e
+
+            armed = armed | (new_values < 0)
+            x, f0 = new_x, new_f
+            tau += h
+            self.ts.append(self.t + tau)
+            self.states.append(x)
+            self.weights_hist.append(self.weights)
+            self.testing_hist.append(self.testing)
+
+        self.x = x.copy()
+        return tau, None
+
+# the cubic Hermite interpolant between x0 and x1, with derivatives f0 and
+# f1, over a step of size h, evaluated at s
+def hermite(x0, f0, x1, f1, h, s):
+    u = s / h
+    return ((2*u**3 - 3*u**2 + 1) * x0 + (u**3 - 2*u**2 + u) * h * f0
+            + (-2*u**3 + 3*u**2) * x1 + (u**3 - u**2) * h * f1)
@@ -3,12 +3,14 @@ import sys
 sys.path.insert(1, '../..')
 from Sandbox import *
 
+from histories import *
+
 '''
     A class to simulate a single unit in a simulation of Ashby's Homeostat machine.
 '''
 class Unit(System):
 
-    def __init__(self, test_interval, adapt_fun, upper_viability=1, lower_viability=-1, upper_limit=np.Inf, lower_limit=-np.Inf, m=1, k=1, l=1, p=2, q=1, theta0=2, theta_dot0=0, weights_set=None, adapt_enabled=True):
+    def __init__(self, test_interval, adapt_fun, upper_viability=1, lower_viability=-1, upper_limit=np.Inf, lower_limit=-np.Inf, m=1, k=1, l=1, p=2, q=1, theta0=2, theta_dot0=0, weights_set=None, adapt_enabled=True, record=None, capacity=1024, rng=None):
 
         # Ashby's homeostat used a discrete set of weights. If we want
         # to do that, we need to pass a list of weights into here, and
@@ -34,20 +36,38 @@ class Unit(System):
         # lower limit for viability
         self.lower_viability = lower_viability
 
-        self.thetas = [theta0] # the system variable. theta is used instead of x, because in SituSim x is always used to mean a spatial coordinate
-        self.theta_dots = [theta_dot0] # the system state is [theta, theta_dot]
-        self.theta_dotdots = [0] # the input to the system is converted into an acceleration (technically, it is a force, but mass is not modelled here)
+        # the number of steps of history which adapt_fun needs, if it
+        # declares it (see history_window), or None if it needs the full
+        # histories
+        self.history_window = getattr(adapt_fun, 'history_window', None)
+        window = self.history_window or 0
+
+        # how each history is recorded - a dict which maps any of 'thetas',
+        # 'theta_dots', 'theta_dotdots' and 'inputs_hist' to 'full' (the
+        # default), 'off', or k, to record every k-th step. capacity is the
+        # number of steps to preallocate the histories for, e.g. duration / dt.
+        # Whatever is recorded, the histories which are passed to adapt_fun
+        # keep the window of steps which it needs
+        record = record or {}
+        self.thetas = make_history(record.get('thetas', 'full'), capacity, window=window) # the system variable. theta is used instead of x, because in SituSim x is always used to mean a spatial coordinate
+        self.thetas.append(theta0)
+        self.theta_dots = make_history(record.get('theta_dots', 'full'), capacity, window=window) # the system state is [theta, theta_dot]
+        self.theta_dots.append(theta_dot0)
+        self.theta_dotdots = make_history(record.get('theta_dotdots', 'full'), capacity) # the input to the system is converted into an acceleration (technically, it is a force, but mass is not modelled here)
+        self.theta_dotdots.append(0)
         self.units = [] # a list of connected Units
         self.weights = [] # a list of weights, which are applied to connected units
-        self.weights_hist = [] # a record of weights over time
+        self.weights_hist = ChangeLog() # a record of weights over time - as weights only change when the unit adapts, only the changes are stored
         self.testing = False # this boolean variable keeps track of whether the system is in the process of adaptation
-        self.testing_hist = [self.testing] # a record of when the unit is adapting
-        self.inputs_hist = [] # a record of all inputs to a unit over time, including the feedback from the unit itself
+        self.testing_hist = ChangeLog() # a record of when the unit is adapting, also stored as changes
+        self.testing_hist.append(self.testing)
+        self.inputs_hist = make_history(record.get('inputs_hist', 'full'), capacity, window=window) # a record of all inputs to a unit over time, including the feedback from the unit itself
         self.adapt_fun = adapt_fun #
         self.self_ind = 0 # used to be able to set the unit's feedback connection to always be negative
         self.test_times = [] # times when the unit starts testing new weights
         self.timer = 0 # a timer for how long to wait after changing a unit's weights
         self.adapt_enabled = adapt_enabled # Unit will only adapt if this variable is set to True
+        self.rng = rng # the unit's own np.random.Generator, or None to draw from the global NumPy RNG
 
     # this method should be called after a unit's connections have
     # been made, and before it is run
@@ -58,11 +78,13 @@ class Unit(System):
     # (i.e. all parameters *apart from* the connection weights)
     def randomise_params(self):
 
-        self.m = random_in_interval(minimum=0.1, maximum=2)
-        self.k = random_in_interval(minimum=0.1, maximum=2)
-        self.l = random_in_interval(minimum=0.1, maximum=2)
-        self.q = random_in_interval(minimum=0.1, maximum=1)
-        self.p = self.q + random_in_interval(minimum=0.1, maximum=2)
+        # draw all of the parameters at once, in the order m, k, l, q, p
+        m, k, l, q, dp = get_rng(self.rng).uniform(param_minimums, param_maximums).tolist()
+        self.m = m
+        self.k = k
+        self.l = l
+        self.q = q
+        self.p = self.q + dp
 
         print("***** Randomising homeostat unit params *****")
         print("m", self.m)
@@ -129,10 +151,11 @@ class Unit(System):
     def integrate(self, dt, input_sum):
 
         # integrate the system, from acceleration to position
-        theta_dotdot = (-self.k * self.theta_dots[-1]) + (self.l * (self.p - self.q) * input_sum) # calculate acceleration
+        theta_dot = self.theta_dots.latest
+        theta_dotdot = (-self.k * theta_dot) + (self.l * (self.p - self.q) * input_sum) # calculate acceleration
         # - we integrate twice here, because this is a second order system
-        theta_dot = (self.theta_dots[-1] + (self.theta_dotdots[-1] * dt)) # integrate acceleration to get velocity
-        theta = (self.thetas[-1] + (self.theta_dots[-1] * dt)) # integrate velocity to get position
+        theta = (self.thetas.latest + (theta_dot * dt)) # integrate velocity to get position
+        theta_dot = (theta_dot + (self.theta_dotdots.latest * dt)) # integrate acceleration to get velocity
 
         # in Ashby's Homeostat, there were hard limits to how far the needle
         # (system variable) could move in either direction - enforce these limits
@@ -164,7 +187,15 @@ class Unit(System):
     def adjust_weights(self, dt):
 
         # adjust parameters
-        self.weights = self.adapt_fun(dt, self.inputs_hist, self.weights_hist, self.thetas, self.theta_dots, weights_set=self.weights_set, self_ind=self.self_ind)
+        if self.history_window is None:
+            self.weights = self.adapt_fun(dt, self.inputs_hist, self.weights_hist, self.thetas, self.theta_dots, weights_set=self.weights_set, self_ind=self.self_ind, rng=self.rng)
+        else:
+            # pass arrays of only the steps which adapt_fun needs - views of
+            # the histories, apart from the weights, which are rebuilt from
+            # their changes. The weights for this step are not in the
+            # history yet, so they are added to the end
+            weights_hist = np.concatenate((self.weights_hist.recent(self.history_window - 1).reshape(-1, len(self.weights)), [self.weights]))
+            self.weights = self.adapt_fun(dt, self.inputs_hist.recent, weights_hist, self.thetas.recent, self.theta_dots.recent, weights_set=self.weights_set, self_ind=self.self_ind, rng=self.rng)
 
     # connect a Unit to this Unit
     def add_connection(self, unit, weight):
@@ -181,24 +212,36 @@ class Unit(System):
     # get the state of the Unit variable (the full state of a Unit is
     # actually [theta, theta_dot], but other Units can only "see" theta)
     def get_theta(self):
-        return self.thetas[-1]
+        return self.thetas.latest
 
 '''
     A class to simulate Ashby's Homeostat machine.
 '''
 class Homeostat(System):
 
-    def __init__(self, n_units, upper_viability, lower_viability, adapt_fun, upper_limit=np.Inf, lower_limit=-np.Inf, weights_set=None, test_interval=10, adapt_enabled=True):
+    def __init__(self, n_units, upper_viability, lower_viability, adapt_fun, upper_limit=np.Inf, lower_limit=-np.Inf, weights_set=None, test_interval=10, adapt_enabled=True, record=None, duration=None, dt=None, seed=None):
+
+        # the units' histories are recorded as given by record (see Unit),
+        # and if the duration and dt of the run are given, they are
+        # preallocated for the whole run
+        capacity = 1024
+        if duration is not None and dt is not None:
+            capacity = int(np.ceil(duration / dt)) + 2
+
+        # random number streams for the initial weights and for each unit
+        # (see make_streams)
+        weights_rng, unit_rngs = make_streams(seed, n_units)
 
         # set up units
         self.units = []
-        for _ in range(n_units):
-            self.units.append(Unit(test_interval=test_interval, adapt_fun=adapt_fun, upper_limit=upper_limit, lower_limit=lower_limit, upper_viability=upper_viability, lower_viability=lower_viability, weights_set=weights_set, adapt_enabled=adapt_enabled))
+        for i in range(n_units):
+            self.units.append(Unit(test_interval=test_interval, adapt_fun=adapt_fun, upper_limit=upper_limit, lower_limit=lower_limit, upper_viability=upper_viability, lower_viability=lower_viability, weights_set=weights_set, adapt_enabled=adapt_enabled, record=record, capacity=capacity, rng=unit_rngs[i]))
 
         # connect units, with random weights
-        for unit in self.units:
-            for unit2 in self.units:
-                unit.add_connection(unit2, random_in_interval(minimum=-1, maximum=1))
+        weights = get_rng(weights_rng).uniform(-1, 1, (n_units, n_units)).tolist()
+        for unit, unit_weights in zip(self.units, weights):
+            for unit2, weight in zip(self.units, unit_weights):
+                unit.add_connection(unit2, weight)
 
         # initialise units
         self.initialise()
@@ -222,15 +265,58 @@ class Homeostat(System):
         for unit in self.units:
             unit.randomise_params()
 
+# the ranges which Unit.randomise_params draws m, k, l, q and p - q from
+param_minimums = [0.1, 0.1, 0.1, 0.1, 0.1]
+param_maximums = [2, 2, 2, 1, 2]
+
+'''
+    Random number streams.
+
+    A Homeostat can be given a seed (an int, or a np.random.SeedSequence, e.g.
+    one spawned for each run of a sweep), from which it spawns independent
+    np.random.Generator streams: one for its initial weights, and one for
+    each unit, which the unit's adaptation function draws from. This makes
+    a run reproducible, whatever else uses the global NumPy RNG, e.g. in the
+    worker processes of a parallel sweep.
+
+    Without a seed, every stream is None, and everything is drawn from the
+    global NumPy RNG, as before, so np.random.seed still works.
+
+    The adaptation functions below draw a whole vector of new weights at
+    once, from their rng argument if it is given, otherwise from the global
+    NumPy RNG, and return the weights as a list.
+
+    An adaptation function which only looks at recent behaviour declares how
+    many steps of history it needs with the history_window decorator (from
+    Sandbox). A Unit then passes it arrays of only those steps - views of
+    its histories, which keep that many steps even when recording is off -
+    so it runs in constant memory, however long the run is. The functions
+    below only need the current weights. The array engines (VectorHomeostat
+    etc.) always pass histories of only the current step.
+'''
+def make_streams(seed, n_units):
+    if seed is None:
+        return None, [None] * n_units
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    children = seed.spawn(n_units + 1)
+    return np.random.default_rng(children[0]), [np.random.default_rng(child) for child in children[1:]]
+
+# the stream to draw from - np.random (the global RNG) has the same methods
+# as a Generator for the draws used here (uniform, choice)
+def get_rng(rng):
+    if rng is None:
+        return np.random
+    return rng
+
 '''
 	An example adaptation function, loosely based on Ashby's random step change. It differs from Ahsby's mechanism in that it does
 	not choose weights from a discrete set of values, but randomly
 	draws values from a uniform interval.
 '''
-def random_val(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set=[], self_ind = None):
-    weights = []
-    for _ in range(len(weights_hist[0])):
-        weights.append(random_in_interval(-1, 1))
+@history_window(1)
+def random_val(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set=[], self_ind = None, rng=None):
+    weights = get_rng(rng).uniform(-1, 1, len(weights_hist[0]))
 
     # this ensures that the self-connection on a Unit will have a
 	# negative weight - this is not a requirement, but will lead to
@@ -239,17 +325,16 @@ def random_val(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set=[]
         weights[self_ind] = - np.abs(weights[self_ind])
 
     # return new weights
-    return weights
+    return weights.tolist()
 
 '''
 	An example adaptation function, which moves weights by a small
 	random amount from their current values.
 '''
-def random_creeper(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set=[], self_ind = None):
+@history_window(1)
+def random_creeper(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set=[], self_ind = None, rng=None):
 
-    weights = []
-    for i in range(len(weights_hist[-1])):
-        weights.append(weights_hist[-1][i] + random_in_interval(-0.05, 0.05))
+    weights = np.asarray(weights_hist[-1], dtype=float) + get_rng(rng).uniform(-0.05, 0.05, len(weights_hist[-1]))
 
     # this ensures that the self-connection on a Unit will have a
 	# negative weight - this is not a requirement, but will lead to
@@ -258,16 +343,15 @@ def random_creeper(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_se
         weights[self_ind] = - np.abs(weights[self_ind])
 
     # return new weights
-    return weights
+    return weights.tolist()
 
 '''
 	An example adaptation function, loosely based on Ashby's random step change. Like Ashby's mechanism it chooses weights from a discrete set of values, "weights_set".
 '''
-def random_selector(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set, self_ind = None):
+@history_window(1)
+def random_selector(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set, self_ind = None, rng=None):
 
-    weights = []
-    for _ in range(len(weights_hist[0])):
-        weights.append(np.random.choice(weights_set))
+    weights = get_rng(rng).choice(weights_set, len(weights_hist[0]))
 
     # this ensures that the self-connection on a Unit will have a
 	# negative weight - this is not a requirement, but will lead to
@@ -276,4 +360,4 @@ def random_selector(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_s
         weights[self_ind] = - np.abs(weights[self_ind])
 
     # return new weights
-    return weights
+    return weights.tolist()
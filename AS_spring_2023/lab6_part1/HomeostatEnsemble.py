@@ -0,0 +1,271 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+from Homeostat import *
+
+'''
+    An ensemble of B independent Homeostats, which all have the same number
+    of units, and which are stepped together in lockstep.
+
+    The states of the units are held in (B, n) arrays, where row b holds the
+    states of the units in member b, and the weights are held in a (B, n, n)
+    array, where weights[b, i] holds the weights which unit i of member b
+    applies to the outputs of units 0..n-1 of the same member.
+
+    Every parameter can be given as:
+        - a scalar, which is used for every unit of every member
+        - a 1D array of length B, which gives one value per member
+        - a 2D array of shape (B, n) (or (1, n)), which gives one value per
+          unit of every member
+    so e.g. a sweep over k can be run as a single ensemble, with
+    k=np.repeat(ks, n_runs).
+
+    The semantics of each member are the same as for Homeostat: units are
+    stepped in order, so unit i "sees" the new values of theta of units
+    0..i-1 and the previous values of units i..n-1, and the hard limits,
+    viability test and test timers behave as they do in Unit.step. Each
+    member adapts independently, with its own random draws.
+'''
+class HomeostatEnsemble(System):
+
+    def __init__(self, n_members, n_units, upper_viability, lower_viability, adapt_fun, upper_limit=np.Inf, lower_limit=-np.Inf, weights_set=None, test_interval=10, adapt_enabled=True, m=1, k=1, l=1, p=2, q=1, theta0=2, theta_dot0=0, record_history=False, seed=None):
+
+        self.n_members = n_members
+        self.n_units = n_units
+        # the adaptation function has the same signature as in Homeostat. If
+        # it has a batched version in batch_adapt_funs, that is used instead,
+        # and the batched versions can also be passed in directly
+        self.adapt_fun = adapt_fun
+        if adapt_fun in batch_adapt_funs.values():
+            self.batch_adapt_fun = adapt_fun
+        else:
+            self.batch_adapt_fun = batch_adapt_funs.get(adapt_fun)
+        # the discrete set of weights to choose from, if one is used
+        self.weights_set = weights_set
+
+        # per-member, per-unit parameters
+        self.m = self.member_param(m)
+        self.k = self.member_param(k)
+        self.l = self.member_param(l)
+        self.p = self.member_param(p)
+        self.q = self.member_param(q)
+        self.upper_limit = self.member_param(upper_limit)
+        self.lower_limit = self.member_param(lower_limit)
+        self.upper_viability = self.member_param(upper_viability)
+        self.lower_viability = self.member_param(lower_viability)
+        self.test_interval = self.member_param(test_interval)
+        self.adapt_enabled = self.member_param(adapt_enabled, dtype=bool)
+
+        # the states of all units in all members
+        self.theta = self.member_param(theta0)
+        self.theta_dot = self.member_param(theta_dot0)
+        self.theta_dotdot = np.zeros((n_members, n_units))
+
+        # all random draws for the ensemble come from a single
+        # np.random.Generator, seeded with seed (an int or a SeedSequence), as
+        # the draws for all adapting units are made at once. Without a seed,
+        # they come from the global NumPy RNG
+        self.rng = None if seed is None else np.random.default_rng(seed)
+
+        # connect units, with random weights
+        self.set_weights(get_rng(self.rng).uniform(-1, 1, (n_members, n_units, n_units)))
+
+        self.testing = np.zeros((n_members, n_units), dtype=bool) # which units are in the process of adaptation
+        self.timer = np.zeros((n_members, n_units)) # timers for how long to wait after changing a unit's weights
+        self.test_times = [[[] for _ in range(n_units)] for _ in range(n_members)] # times when each unit of each member starts testing new weights
+        self.testing_steps = np.zeros((n_members, n_units), dtype=int) # the number of steps which each unit has spent testing, i.e. sum(unit.testing_hist)
+        self.n_adaptations = np.zeros((n_members, n_units), dtype=int) # the number of times each unit has adapted, i.e. len(unit.test_times)
+        self.t = 0
+
+        # views of each unit across all members, which can be disturbed in
+        # the same way as a Unit (see EnsembleUnit)
+        self.units = [EnsembleUnit(self, i) for i in range(n_units)]
+
+        # histories are lists with one entry per time step. record_history
+        # can be True, to record the histories of all members, or a list of
+        # the indices of the members to record, as recording every member of
+        # a large ensemble can take a lot of memory
+        if record_history is True:
+            self.recorded_members = slice(None)
+        elif record_history is False or record_history is None:
+            self.recorded_members = None
+        else:
+            self.recorded_members = np.array(record_history, dtype=int)
+        self.thetas = []
+        self.theta_dots = []
+        self.theta_dotdots = []
+        self.weights_hist = []
+        self.testing_hist = []
+        self.record()
+
+    # broadcast a parameter to a (n_members, n_units) array. 1D arrays give
+    # one value per member
+    def member_param(self, value, dtype=float):
+        value = np.asarray(value, dtype=dtype)
+        if value.ndim == 1:
+            value = value[:, None]
+        return np.array(np.broadcast_to(value, (self.n_members, self.n_units)), dtype=dtype)
+
+    # set the full (n_members, n_units, n_units) weight tensor. the tensor is
+    # replaced, rather than modified, so that weights_hist can share
+    # unchanged tensors between time steps
+    def set_weights(self, weights):
+        self.weights = np.array(weights, dtype=float)
+        # unit i uses the new outputs of units j < i, and the previous
+        # outputs of units j >= i
+        self.weights_lower = np.tril(self.weights, -1)
+        self.weights_upper = np.triu(self.weights)
+
+    # step all units of all members forwards in time
+    def step(self, dt):
+        # manage timers
+        expired = self.timer > self.test_interval
+        if expired.any():
+            self.timer[expired] = 0
+            self.testing = self.testing & ~expired
+
+        # integrate the systems' dynamics. The new values of theta do not
+        # depend on the inputs, so they can all be computed first, and then
+        # used as the outputs which later units see
+        previous = self.theta
+        theta = previous + self.theta_dot * dt
+        theta_dot = self.theta_dot + self.theta_dotdot * dt
+
+        # enforce hard limits
+        clamped = (theta > self.upper_limit) | (theta < self.lower_limit)
+        if clamped.any():
+            theta = np.clip(theta, self.lower_limit, self.upper_limit)
+            theta_dot[clamped] = 0
+
+        input_sum = (self.weights_lower @ theta[:, :, None] + self.weights_upper @ previous[:, :, None])[:, :, 0]
+        self.theta_dotdot = (-self.k * self.theta_dot) + (self.l * (self.p - self.q) * input_sum)
+        self.theta = theta
+        self.theta_dot = theta_dot
+
+        # units which are not viable, and not already testing, try some new weights
+        adapting = self.adapt_enabled & ~self.testing & ((theta > self.upper_viability) | (theta < self.lower_viability))
+        if adapting.any():
+            self.adjust_weights(dt, adapting, previous)
+            for b, i in zip(*np.nonzero(adapting)):
+                self.test_times[b][i].append(self.t)
+            self.timer[adapting] = 0
+            self.testing = self.testing | adapting
+            self.n_adaptations = self.n_adaptations + adapting
+
+        self.testing_steps += self.testing
+        self.record()
+
+        # increment clock
+        self.t += dt
+        # increment test timers
+        self.timer += dt
+
+        # return current states
+        return self.theta
+
+    # get new weights for the adapting units
+    def adjust_weights(self, dt, adapting, previous):
+        weights = self.weights.copy()
+        if self.batch_adapt_fun is not None:
+            weights[adapting] = self.batch_adapt_fun(dt, self.weights, adapting, self.weights_set, rng=self.rng)
+        else:
+            # call the adaptation function unit by unit. as in VectorHomeostat,
+            # only the most recent inputs, weights and state are passed to it
+            for b, i in zip(*np.nonzero(adapting)):
+                outputs = np.concatenate((self.theta[b, :i], previous[b, i:]))
+                weights[b, i] = self.adapt_fun(dt, [self.weights[b, i] * outputs], [self.weights[b, i]], [self.theta[b, i]], [self.theta_dot[b, i]], weights_set=self.weights_set, self_ind=i, rng=self.rng)
+        self.set_weights(weights)
+
+    # store the current states of the recorded members
+    def record(self):
+        if self.recorded_members is not None:
+            members = self.recorded_members
+            self.thetas.append(self.theta[members])
+            self.theta_dots.append(self.theta_dot[members])
+            self.theta_dotdots.append(self.theta_dotdot[members])
+            self.weights_hist.append(self.weights[members])
+            self.testing_hist.append(self.testing[members])
+
+    # test which units of which members are within their limits for viability
+    def test_viability(self):
+        return ~((self.theta > self.upper_viability) | (self.theta < self.lower_viability))
+
+'''
+    A view of one unit across all members of a HomeostatEnsemble. It can be
+    given to the disturbance sources in place of a Unit, as setting
+    unit.thetas[-1] sets theta for that unit in every member.
+'''
+class EnsembleUnit:
+
+    def __init__(self, ensemble, index):
+        self.ensemble = ensemble
+        self.index = index
+        self.thetas = EnsembleThetas(self)
+
+    def get_theta(self):
+        return self.ensemble.theta[:, self.index]
+
+class EnsembleThetas:
+
+    def __init__(self, unit):
+        self.unit = unit
+
+    # only the current value of theta can be read or written, as thetas[-1]
+    def __getitem__(self, key):
+        if key != -1:
+            raise IndexError('only thetas[-1] is available for an ensemble unit')
+        return self.unit.get_theta()
+
+    def __setitem__(self, key, value):
+        if key != -1:
+            raise IndexError('only thetas[-1] is available for an ensemble unit')
+        ensemble = self.unit.ensemble
+        ensemble.theta[:, self.unit.index] = value
+        # as with a Unit, the disturbance also replaces the latest recorded value
+        if ensemble.recorded_members is not None and ensemble.thetas:
+            ensemble.thetas[-1] = ensemble.theta[ensemble.recorded_members]
+
+'''
+    Batched versions of the adaptation functions in Homeostat.py. They take
+    the (B, n, n) weights of an ensemble and the (B, n) mask of the units
+    which are adapting, and return the new weights of the adapting units,
+    as an array with one row per adapting unit (in the order of
+    np.nonzero(adapting)). Each row is drawn independently, from rng if it
+    is given, otherwise from the global NumPy RNG.
+'''
+def batch_random_val(dt, weights, adapting, weights_set=None, rng=None):
+    units = np.nonzero(adapting)[1]
+    new_weights = get_rng(rng).uniform(-1, 1, (len(units), weights.shape[-1]))
+
+    # as in random_val, the self-connection of every unit is negative
+    rows = np.arange(len(units))
+    new_weights[rows, units] = -np.abs(new_weights[rows, units])
+
+    return new_weights
+
+def batch_random_creeper(dt, weights, adapting, weights_set=None, rng=None):
+    units = np.nonzero(adapting)[1]
+    new_weights = weights[adapting] + get_rng(rng).uniform(-0.05, 0.05, (len(units), weights.shape[-1]))
+
+    # as in random_creeper, the self-connection is made negative for every
+    # unit apart from unit 0
+    rows = np.flatnonzero(units)
+    new_weights[rows, units[rows]] = -np.abs(new_weights[rows, units[rows]])
+
+    return new_weights
+
+def batch_random_selector(dt, weights, adapting, weights_set=None, rng=None):
+    units = np.nonzero(adapting)[1]
+    new_weights = get_rng(rng).choice(weights_set, size=(len(units), weights.shape[-1]))
+
+    # as in random_selector, the self-connection is made negative for every
+    # unit apart from unit 0
+    rows = np.flatnonzero(units)
+    new_weights[rows, units[rows]] = -np.abs(new_weights[rows, units[rows]])
+
+    return new_weights
+
+# the batched version of each of the adaptation functions in Homeostat.py
+batch_adapt_funs = {random_val: batch_random_val, random_creeper: batch_random_creeper, random_selector: batch_random_selector}
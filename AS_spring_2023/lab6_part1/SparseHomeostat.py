@@ -0,0 +1,283 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+from Homeostat import *
+
+import scipy.sparse
+
+'''
+    A Homeostat with sparse connectivity, for networks of thousands of units.
+
+    Instead of every unit being connected to every other unit, the
+    connections are given as a list of edges, and the weights are stored in
+    compressed sparse row (CSR) form: the weights of the inputs to unit i are
+    data[indptr[i]:indptr[i+1]], and the units they come from are
+    indices[indptr[i]:indptr[i+1]], in increasing order. Memory, and the cost
+    of a step, are linear in the number of edges.
+
+    The semantics are the same as for Homeostat (and HomeostatEnsemble):
+        - each unit uses the same (lagged) Euler integration as Unit.integrate
+        - units are stepped in order, so unit i "sees" the new values of
+          theta of units j < i and the previous values of units j >= i
+        - the hard limits, the viability test and the test timers behave
+          as they do in Unit.step
+    so with a complete graph, it produces the same results as Homeostat.
+
+    When a unit adapts, its adaptation function is called with only the
+    unit's own row of weights, so e.g. random_val draws one new weight for
+    each of the unit's inputs, and the unit's self-connection (if it has
+    one) is made negative. The adaptation functions are given the position
+    of the self-connection in the row as self_ind, and random_creeper and
+    random_selector skip it when that position is 0, so for those two
+    functions adjust_weights makes it negative itself - apart from unit 0's,
+    which they don't make negative in Homeostat either. The weights from any
+    other adaptation function are used as they are.
+
+    Histories can take a lot of memory for a large network, so by default
+    none are recorded. record_history can be True, to record theta and
+    theta_dot of all units, or a list of the indices of the units to record,
+    and record_every records every k-th step.
+'''
+class SparseHomeostat(System):
+
+    def __init__(self, n_units, sources, targets, upper_viability, lower_viability, adapt_fun, upper_limit=np.Inf, lower_limit=-np.Inf, weights_set=None, test_interval=10, adapt_enabled=True, m=1, k=1, l=1, p=2, q=1, theta0=2, theta_dot0=0, self_connections=True, record_history=False, record_every=1, seed=None):
+
+        self.n_units = n_units
+        # the adaptation function has the same signature as in Homeostat
+        self.adapt_fun = adapt_fun
+        # the discrete set of weights to choose from, if one is used
+        self.weights_set = weights_set
+
+        # per-unit parameters
+        self.m = self.unit_param(m)
+        self.k = self.unit_param(k)
+        self.l = self.unit_param(l)
+        self.p = self.unit_param(p)
+        self.q = self.unit_param(q)
+        self.upper_limit = self.unit_param(upper_limit)
+        self.lower_limit = self.unit_param(lower_limit)
+        self.upper_viability = self.unit_param(upper_viability)
+        self.lower_viability = self.unit_param(lower_viability)
+        self.test_interval = self.unit_param(test_interval)
+        self.adapt_enabled = self.unit_param(adapt_enabled, dtype=bool)
+
+        # the state of every unit
+        self.theta = self.unit_param(theta0)
+        self.theta_dot = self.unit_param(theta_dot0)
+        self.theta_dotdot = np.zeros(n_units)
+
+        # build the CSR structure from the edges (source -> target), with
+        # every unit connected to itself, as in Homeostat, unless
+        # self_connections is False. repeated edges are only kept once
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if self_connections:
+            sources = np.concatenate((sources, np.arange(n_units)))
+            targets = np.concatenate((targets, np.arange(n_units)))
+        edges = np.unique(targets * n_units + sources)
+        self.rows = edges // n_units # the unit which receives each edge
+        self.indices = edges % n_units # the unit which each edge comes from
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(self.rows, minlength=n_units))))
+        self.n_edges = len(edges)
+
+        # each edge reads the new theta of its source if the source comes
+        # before the receiving unit, and the previous theta otherwise. These
+        # are the indices of the source values in [new theta, previous theta]
+        self.source_index = self.indices + n_units * (self.indices >= self.rows)
+
+        # the position of each unit's self-connection in its row, or None
+        self.self_ind = [None] * n_units
+        for edge in np.flatnonzero(self.indices == self.rows):
+            self.self_ind[self.rows[edge]] = int(edge - self.indptr[self.rows[edge]])
+
+        # random number streams for the initial weights and for each unit
+        weights_rng, self.rngs = make_streams(seed, n_units)
+
+        # random initial weights. for a complete graph, these are drawn in
+        # the same order as in Homeostat
+        self.data = get_rng(weights_rng).uniform(-1, 1, self.n_edges)
+
+        self.testing = np.zeros(n_units, dtype=bool) # which units are in the process of adaptation
+        self.timer = np.zeros(n_units) # timers for how long to wait after changing a unit's weights
+        self.test_times = [[] for _ in range(n_units)] # times when each unit starts testing new weights
+        self.testing_steps = np.zeros(n_units, dtype=int) # the number of steps which each unit has spent testing
+        self.n_adaptations = np.zeros(n_units, dtype=int) # the number of times each unit has adapted
+        self.t = 0
+
+        # histories of the recorded units
+        if record_history is True:
+            self.recorded_units = slice(None)
+        elif record_history is False or record_history is None:
+            self.recorded_units = None
+        else:
+            self.recorded_units = np.array(record_history, dtype=int)
+        self.thetas = make_history(record_every if self.recorded_units is not None else 'off')
+        self.theta_dots = make_history(record_every if self.recorded_units is not None else 'off')
+        self.record()
+
+    # make a SparseHomeostat in which each unit receives degree inputs from
+    # other units, which are chosen at random. graph_seed seeds the choice of
+    # the inputs (otherwise the global NumPy RNG is used), and any other
+    # arguments are passed to SparseHomeostat
+    @classmethod
+    def random_graph(cls, n_units, degree, *args, graph_seed=None, **kwargs):
+        sources, targets = random_graph_edges(n_units, degree, get_rng(None if graph_seed is None else np.random.default_rng(graph_seed)))
+        return cls(n_units, sources, targets, *args, **kwargs)
+
+    # make a SparseHomeostat whose units are arranged on a lattice of the
+    # given shape (e.g. (100, 100)), and receive inputs from their nearest
+    # neighbours along each axis
+    @classmethod
+    def lattice(cls, shape, *args, periodic=True, **kwargs):
+        sources, targets = lattice_edges(shape, periodic)
+        return cls(int(np.prod(shape)), sources, targets, *args, **kwargs)
+
+    # make a SparseHomeostat with Watts-Strogatz small-world connectivity:
+    # each unit receives inputs from its degree nearest neighbours on a
+    # ring, and each of those inputs is rewired to come from a random unit
+    # with probability p_rewire
+    @classmethod
+    def small_world(cls, n_units, degree, p_rewire, *args, graph_seed=None, **kwargs):
+        sources, targets = small_world_edges(n_units, degree, p_rewire, get_rng(None if graph_seed is None else np.random.default_rng(graph_seed)))
+        return cls(n_units, sources, targets, *args, **kwargs)
+
+    # broadcast a parameter to a (n_units,) array
+    def unit_param(self, value, dtype=float):
+        return np.array(np.broadcast_to(value, (self.n_units,)), dtype=dtype)
+
+    # the slice of the CSR arrays which holds the inputs to unit i
+    def row(self, i):
+        return slice(self.indptr[i], self.indptr[i+1])
+
+    # the weights as a scipy.sparse matrix, where entry (i, j) is the weight
+    # which unit i applies to the output of unit j
+    def weight_matrix(self):
+        return scipy.sparse.csr_matrix((self.data.copy(), self.indices, self.indptr), shape=(self.n_units, self.n_units))
+
+    # step all units forwards in time
+    def step(self, dt):
+        # manage timers
+        expired = self.timer > self.test_interval
+        if expired.any():
+            self.timer[expired] = 0
+            self.testing = self.testing & ~expired
+
+        # integrate the systems' dynamics. The new values of theta do not
+        # depend on the inputs, so they can all be computed first, and then
+        # used as the outputs which later units see
+        previous = self.theta
+        theta = previous + self.theta_dot * dt
+        theta_dot = self.theta_dot + self.theta_dotdot * dt
+
+        # enforce hard limits
+        clamped = (theta > self.upper_limit) | (theta < self.lower_limit)
+        if clamped.any():
+            theta = np.clip(theta, self.lower_limit, self.upper_limit)
+            theta_dot[clamped] = 0
+
+        # weighted sums of the inputs of every unit, with one product per edge
+        outputs = np.concatenate((theta, previous))[self.source_index]
+        input_sum = np.bincount(self.rows, weights=self.data * outputs, minlength=self.n_units)
+        self.theta_dotdot = (-self.k * self.theta_dot) + (self.l * (self.p - self.q) * input_sum)
+        self.theta = theta
+        self.theta_dot = theta_dot
+
+        # units which are not viable, and not already testing, try some new weights
+        adapting = self.adapt_enabled & ~self.testing & ((theta > self.upper_viability) | (theta < self.lower_viability))
+        if adapting.any():
+            units = np.flatnonzero(adapting)
+            for i in units:
+                self.adjust_weights(dt, i, outputs)
+                self.test_times[i].append(self.t)
+            self.timer[units] = 0
+            self.testing = self.testing | adapting
+            self.n_adaptations = self.n_adaptations + adapting
+
+        self.testing_steps += self.testing
+        self.record()
+
+        # increment clock
+        self.t += dt
+        # increment test timers
+        self.timer += dt
+
+        # return current states
+        return self.theta
+
+    # get new weights for unit i, which only change the unit's own row. As
+    # in VectorHomeostat, only the most recent inputs, weights and state of
+    # the unit are passed to adapt_fun
+    def adjust_weights(self, dt, i, outputs):
+        row = self.row(i)
+        weights = self.data[row]
+        self_ind = self.self_ind[i]
+        self.data[row] = self.adapt_fun(dt, [weights * outputs[row]], [weights.copy()], [self.theta[i]], [self.theta_dot[i]], weights_set=self.weights_set, self_ind=self_ind, rng=self.rngs[i])
+        # random_creeper and random_selector only make the self-connection
+        # negative when self_ind isn't 0, which in Homeostat is only the case
+        # for unit 0. Here, another unit's self-connection can be first in
+        # its row, so it is made negative as those functions would make it
+        if self_ind == 0 and i != 0 and self.adapt_fun in (random_creeper, random_selector):
+            self.data[self.indptr[i]] = -np.abs(self.data[self.indptr[i]])
+
+    # store the current states of the recorded units
+    def record(self):
+        if self.recorded_units is not None:
+            self.thetas.append(self.theta[self.recorded_units])
+            self.theta_dots.append(self.theta_dot[self.recorded_units])
+
+    # test which units are within their limits for viability
+    def test_viability(self):
+        return ~((self.theta > self.upper_viability) | (self.theta < self.lower_viability))
+
+'''
+    Edges for the standard kinds of network. Each function returns the
+    sources and targets of the edges, as arrays, where an edge
+    sources[e] -> targets[e] means that unit targets[e] receives the output
+    of unit sources[e] as an input.
+'''
+
+# each unit receives degree inputs from other units, chosen at random. The
+# inputs are drawn all at once, and any which are drawn twice for the same
+# unit are only kept once, so a few units can have slightly fewer inputs
+def random_graph_edges(n_units, degree, rng=np.random):
+    targets = np.repeat(np.arange(n_units), degree)
+    # draw from the n_units - 1 other units, skipping the target itself
+    sources = rng.integers(0, n_units - 1, len(targets)) if hasattr(rng, 'integers') else rng.randint(0, n_units - 1, len(targets))
+    sources = sources + (sources >= targets)
+    return sources, targets
+
+# each unit receives inputs from its nearest neighbours along each axis of
+# a lattice. If periodic is True, the lattice wraps around at its edges
+def lattice_edges(shape, periodic=True):
+    shape = tuple(shape)
+    coords = np.indices(shape).reshape(len(shape), -1)
+    targets = np.arange(coords.shape[1])
+    all_sources = []
+    all_targets = []
+    for axis in range(len(shape)):
+        for shift in [-1, 1]:
+            neighbours = coords.copy()
+            neighbours[axis] += shift
+            if periodic:
+                neighbours[axis] %= shape[axis]
+            valid = (neighbours[axis] >= 0) & (neighbours[axis] < shape[axis])
+            all_sources.append(np.ravel_multi_index(neighbours[:, valid], shape))
+            all_targets.append(targets[valid])
+    return np.concatenate(all_sources), np.concatenate(all_targets)
+
+# Watts-Strogatz small-world edges: each unit receives inputs from the
+# degree // 2 units on either side of it on a ring, and each input is then
+# rewired to come from a random unit with probability p_rewire. Rewired
+# inputs which would connect a unit to itself are dropped, as are any which
+# duplicate another input
+def small_world_edges(n_units, degree, p_rewire, rng=np.random):
+    half = degree // 2
+    offsets = np.concatenate((np.arange(-half, 0), np.arange(1, half + 1)))
+    targets = np.repeat(np.arange(n_units), len(offsets))
+    sources = (targets + np.tile(offsets, n_units)) % n_units
+    rewire = rng.random(len(sources)) < p_rewire
+    sources[rewire] = rng.integers(0, n_units, rewire.sum()) if hasattr(rng, 'integers') else rng.randint(0, n_units, rewire.sum())
+    keep = sources != targets
+    return sources[keep], targets[keep]
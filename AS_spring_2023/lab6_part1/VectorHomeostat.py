@@ -0,0 +1,437 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+from Homeostat import *
+from stability import *
+
+# make a per-unit parameter of a VectorHomeostat. Parameter arrays are
+# read-only, so that they can only be changed by assignment, e.g.
+# homeostat.k = 2 or homeostat.k = [1, 2, 3, 4], which lets the homeostat
+# know that it needs to rebuild its step matrix
+def unit_parameter(name, dtype=float):
+    attr = '_' + name
+
+    def get_param(self):
+        return getattr(self, attr)
+
+    def set_param(self, value):
+        values = np.array(np.broadcast_to(value, (self.n_units,)), dtype=dtype)
+        values.flags.writeable = False
+        setattr(self, attr, values)
+        self.dirty = True
+
+    return property(get_param, set_param)
+
+'''
+    A vectorised implementation of Ashby's Homeostat machine.
+
+    Instead of a list of Unit objects, the state of every unit (theta,
+    theta_dot and theta_dotdot) is held in a NumPy vector, and the
+    connection weights are held in an n x n matrix, where row i holds the
+    weights which unit i applies to the outputs of units 0..n-1.
+
+    The semantics are the same as for Homeostat:
+        - each unit uses the same (lagged) Euler integration as Unit.integrate
+        - units are stepped in order, so unit i "sees" the new states of
+          units 0..i-1 and the previous states of units i..n-1
+        - the hard limits, the viability test and the test timers behave
+          as they do in Unit.step
+        - every unit has its own m, k, l, p and q parameters
+
+    While no unit hits a hard limit or needs to adapt, the Euler step of the
+    whole Homeostat is linear, so it is done with a single matrix-vector
+    product. The same product also computes how far each unit is from the
+    nearest boundary which matters to it (its viability limits, if it could
+    adapt, otherwise its hard limits), and only when a unit crosses one of
+    those boundaries is the step redone with the clamp, viability test and
+    adaptation applied as masked array operations.
+
+    This is an engine for large homeostats. Each step costs a handful of
+    NumPy calls, whatever the number of units, so it is at least 10 times
+    faster than Homeostat from about 32 units, and about 25-35 times faster
+    at 64, but only 3-5 times faster at 16 units, and no faster than
+    Homeostat at 4. It is not a faster engine for the 4 unit homeostats of
+    the lab experiments: while they are adapting, a unit crosses a boundary
+    every few dozen steps, and each of those steps costs tens of NumPy
+    calls, so even taking the steps between them in blocks is only about
+    twice as fast as Homeostat. Only a compiled step loop could do better.
+'''
+class VectorHomeostat(System):
+
+    m = unit_parameter('m')
+    k = unit_parameter('k')
+    l = unit_parameter('l')
+    p = unit_parameter('p')
+    q = unit_parameter('q')
+    upper_limit = unit_parameter('upper_limit')
+    lower_limit = unit_parameter('lower_limit')
+    upper_viability = unit_parameter('upper_viability')
+    lower_viability = unit_parameter('lower_viability')
+    test_interval = unit_parameter('test_interval')
+    adapt_enabled = unit_parameter('adapt_enabled', dtype=bool)
+
+    def __init__(self, n_units, upper_viability, lower_viability, adapt_fun, upper_limit=np.Inf, lower_limit=-np.Inf, weights_set=None, test_interval=10, adapt_enabled=True, m=1, k=1, l=1, p=2, q=1, theta0=2, theta_dot0=0, record_history=True, seed=None):
+
+        self.n_units = n_units
+        # the adaptation function has the same signature as in Homeostat
+        self.adapt_fun = adapt_fun
+        # the discrete set of weights to choose from, if one is used
+        self.weights_set = weights_set
+
+        # per-unit parameters
+        self.m = m
+        self.k = k
+        self.l = l
+        self.p = p
+        self.q = q
+        self.upper_limit = upper_limit
+        self.lower_limit = lower_limit
+        self.upper_viability = upper_viability
+        self.lower_viability = lower_viability
+        self.test_interval = test_interval
+        self.adapt_enabled = adapt_enabled
+
+        # the system state is packed into a single vector,
+        #   [theta (n), theta_dot (n), theta_dotdot (n), 1]
+        # where the constant 1 is used to subtract the boundaries in the step matrix
+        self.state = np.concatenate((np.full(n_units, theta0, dtype=float), np.full(n_units, theta_dot0, dtype=float), np.zeros(n_units), [1.0]))
+
+        # random number streams for the initial weights and for each unit,
+        # spawned from seed in the same way as in Homeostat
+        weights_rng, self.rngs = make_streams(seed, n_units)
+
+        # connect units, with random weights. the weights are drawn in the
+        # same order as in Homeostat, so that both produce the same weights
+        # from the same random seed
+        self.set_weights(get_rng(weights_rng).uniform(-1, 1, (n_units, n_units)))
+
+        self.set_testing(np.zeros(n_units, dtype=bool)) # which units are in the process of adaptation
+        self.timer = np.zeros(n_units) # timers for how long to wait after changing a unit's weights - these only advance while any unit is testing, as they are not used otherwise
+        self.test_times = [[] for _ in range(n_units)] # times when each unit starts testing new weights
+        self.t = 0
+        self.dt = None # the dt which the step matrix was built for
+
+        # histories are lists with one entry per time step, e.g.
+        # homeostat.thetas[:, i] is the history of theta for unit i
+        self.record_history = record_history
+        self.states = []
+        self.weights_hist = ChangeLog()
+        self.testing_hist = ChangeLog()
+        self.record()
+
+    # construct a VectorHomeostat with the same parameters, weights and
+    # state as an existing (object based) Homeostat
+    @classmethod
+    def from_homeostat(cls, homeostat, record_history=True):
+        units = homeostat.units
+        unit0 = units[0]
+        vh = cls(n_units=len(units), upper_viability=unit0.upper_viability, lower_viability=unit0.lower_viability, adapt_fun=unit0.adapt_fun, weights_set=unit0.weights_set, record_history=False)
+
+        for name in ['m', 'k', 'l', 'p', 'q', 'upper_limit', 'lower_limit', 'upper_viability', 'lower_viability', 'test_interval', 'adapt_enabled']:
+            setattr(vh, name, [getattr(unit, name) for unit in units])
+        vh.theta[:] = [unit.thetas[-1] for unit in units]
+        vh.theta_dot[:] = [unit.theta_dots[-1] for unit in units]
+        vh.theta_dotdot[:] = [unit.theta_dotdots[-1] for unit in units]
+        vh.set_testing(np.array([unit.testing for unit in units]))
+        vh.timer = np.array([unit.timer for unit in units], dtype=float)
+        vh.test_times = [list(unit.test_times) for unit in units]
+        vh.set_weights([unit.weights for unit in units])
+        vh.rngs = [unit.rng for unit in units]
+        vh.t = homeostat.t
+
+        vh.record_history = record_history
+        vh.record()
+        return vh
+
+    # views of the parts of the current state
+    @property
+    def theta(self):
+        return self.state[:self.n_units]
+
+    @property
+    def theta_dot(self):
+        return self.state[self.n_units:2*self.n_units]
+
+    @property
+    def theta_dotdot(self):
+        return self.state[2*self.n_units:3*self.n_units]
+
+    # histories of the parts of the state, as (steps, n_units) arrays
+    @property
+    def thetas(self):
+        return np.array(self.states)[:, :self.n_units]
+
+    @property
+    def theta_dots(self):
+        return np.array(self.states)[:, self.n_units:2*self.n_units]
+
+    @property
+    def theta_dotdots(self):
+        return np.array(self.states)[:, 2*self.n_units:3*self.n_units]
+
+    # set the full weight matrix
+    def set_weights(self, weights):
+        self.weights = np.array(weights, dtype=float)
+        self.weights.flags.writeable = False
+        self.dirty = True
+
+    # set the weights of a single unit (row i of the weight matrix). the
+    # matrix is replaced, rather than modified, so that weights_hist (a
+    # ChangeLog) logs a change only when the weights change
+    def set_unit_weights(self, i, weights):
+        new_weights = self.weights.copy()
+        new_weights[i] = weights
+        self.set_weights(new_weights)
+
+    # randomise the parameters which affect the units' dynamics
+    # (i.e. all parameters *apart from* the connection weights).
+    # values are drawn unit by unit, from each unit's stream, in the same
+    # order as in Unit.randomise_params
+    def randomise_params(self):
+        m, k, l, q, dp = np.array([get_rng(rng).uniform(param_minimums, param_maximums) for rng in self.rngs]).T
+        self.m, self.k, self.l, self.p, self.q = m, k, l, q + dp, q
+
+        print("***** Randomising homeostat unit params *****")
+        print("m", self.m)
+        print("k", self.k)
+        print("l", self.l)
+        print("p", self.p)
+        print("q", self.q)
+
+    # build the step matrix for the given dt. The matrix maps the packed
+    # state at one time step to the packed state at the next, assuming no
+    # unit hits a hard limit, followed by 2n rows which give how far each
+    # unit's new theta is above its upper boundary and below its lower one
+    def build_step_matrix(self, dt):
+        n = self.n_units
+        eye = np.eye(n)
+        gain = (self.l * (self.p - self.q))[:, None]
+        weights_lower = np.tril(self.weights, -1)
+
+        A = np.zeros((5*n + 1, 3*n + 1))
+        # theta = theta + theta_dot * dt
+        A[:n, :n] = eye
+        A[:n, n:2*n] = dt * eye
+        # theta_dot = theta_dot + theta_dotdot * dt
+        A[n:2*n, n:2*n] = eye
+        A[n:2*n, 2*n:3*n] = dt * eye
+        # theta_dotdot = -k * theta_dot + l * (p - q) * input_sum, where the
+        # inputs from units j < i use their new values of theta
+        A[2*n:3*n, :n] = gain * self.weights
+        A[2*n:3*n, n:2*n] = (gain * dt * weights_lower) - np.diag(self.k)
+        # the constant
+        A[3*n, 3*n] = 1
+        # distances from the boundaries
+        A[3*n+1:4*n+1, :3*n+1] = A[:n]
+        A[4*n+1:, :3*n+1] = -A[:n]
+
+        self.A = A
+        self.gain = gain[:, 0]
+        self.weights_lower = weights_lower
+        self.dt = dt
+        self.dirty = False
+        self.modes = None
+        self.update_boundaries()
+
+    # the boundary which matters to each unit is its viability limit, if it
+    # could adapt, otherwise it is its hard limit
+    def update_boundaries(self):
+        n = self.n_units
+        can_adapt = self.adapt_enabled & ~self.testing
+        upper = np.where(can_adapt, np.minimum(self.upper_viability, self.upper_limit), self.upper_limit)
+        lower = np.where(can_adapt, np.maximum(self.lower_viability, self.lower_limit), self.lower_limit)
+        self.A[3*n+1:4*n+1, 3*n] = -upper
+        self.A[4*n+1:, 3*n] = lower
+        self.upper_boundary = upper
+        self.lower_boundary = lower
+
+    # step all units forwards in time
+    def step(self, dt):
+        if self.dirty or dt != self.dt:
+            self.build_step_matrix(dt)
+
+        # manage timers
+        if self.any_testing:
+            expired = self.timer > self.test_interval
+            if expired.any():
+                self.timer[expired] = 0
+                self.set_testing(self.testing & ~expired)
+
+        previous = self.state
+        result = self.A @ previous
+        self.state = result[:3*self.n_units+1]
+        if not result[3*self.n_units+1:].max() <= 0:
+            # at least one unit has crossed a boundary (or its state is nan)
+            self.boundary_step(dt, previous)
+
+        self.record()
+
+        # increment clock
+        self.t += dt
+        # increment test timers
+        if self.any_testing:
+            self.timer += dt
+
+        # return current state
+        return self.theta
+
+    # run the homeostat until its clock reaches duration, with the same
+    # number of steps as the loop "while t < duration: homeostat.step(dt); t += dt"
+    # would take, and return the times of the states which were recorded.
+    #   disturbances can be a DisturbanceSchedule (see homeostat_disturbances.py)
+    # which was compiled for this run, in which case the disturbances are
+    # written into theta after the steps they belong to
+    def run(self, duration, dt, accelerate=False, disturbances=None):
+        n_steps = int(np.ceil((duration - self.t) / dt)) + 2
+        ts = np.cumsum(np.concatenate(([self.t], np.full(n_steps, dt))))
+        n_steps = np.count_nonzero(ts < duration)
+        done = 0
+        if disturbances is not None:
+            for k in disturbances.active_steps:
+                if k >= n_steps:
+                    break
+                self.steps(k + 1 - done, dt, accelerate)
+                disturbances.apply(k, self.theta)
+                done = k + 1
+        self.steps(n_steps - done, dt, accelerate)
+        return ts[:n_steps + 1]
+
+    # step the homeostat forwards n_steps times, which has the same effect
+    # as calling step(dt) n_steps times.
+    #   If accelerate is True, then whenever the current configuration can
+    # be shown to be stable, and to never take any unit across a boundary,
+    # the rest of the run is computed directly (see fast_forward)
+    def steps(self, n_steps, dt, accelerate=False):
+        since_check = 0
+        while n_steps > 0:
+            if accelerate and not self.any_testing:
+                if self.dirty or dt != self.dt:
+                    self.build_step_matrix(dt)
+                if self.modes is None or since_check >= 256:
+                    since_check = 0
+                    done = self.fast_forward(n_steps, dt)
+                    n_steps -= done
+                    if done:
+                        continue
+            self.step(dt)
+            n_steps -= 1
+            since_check += 1
+
+    # if the eigenvalues of the current step matrix show that it is stable,
+    # bound how far every unit can move from 0 in any future step, and if no
+    # unit can cross a boundary which would matter to it (including its
+    # viability limits, if it could adapt once it stops testing), take all
+    # n_steps at once and return n_steps. Otherwise return 0.
+    #   The steps are computed with powers of the step matrix, so the
+    # results are the same as from stepping, up to rounding
+    def fast_forward(self, n_steps, dt):
+        n = self.n_units
+        F = self.A[:3*n, :3*n]
+        if self.modes is None:
+            eigenvalues, V = np.linalg.eig(F)
+            if np.abs(eigenvalues).max() < 1 and np.linalg.cond(V) < 1e8:
+                self.modes = (V, np.linalg.inv(V))
+            else:
+                self.modes = False
+        if self.modes is False:
+            return 0
+
+        # theta_i(j) = sum_k V_ik lambda_k^j z_k, where all |lambda_k| < 1
+        V, V_inv = self.modes
+        z = V_inv @ self.state[:3*n]
+        bound = np.abs(V[:n]) @ np.abs(z)
+        upper = np.where(self.adapt_enabled, np.minimum(self.upper_viability, self.upper_limit), self.upper_limit)
+        lower = np.where(self.adapt_enabled, np.maximum(self.lower_viability, self.lower_limit), self.lower_limit)
+        slack = 1e-9 * (1 + bound)
+        if not ((bound + slack < upper) & (-bound - slack > lower)).all():
+            return 0
+
+        A = self.A[:3*n+1]
+        if self.record_history:
+            # compute the states in chunks. The first chunk is built by
+            # doubling, as the states after steps j+1..2j are the states after
+            # steps 1..j multiplied by A^j, and each later chunk is the chunk
+            # before it multiplied by the chunk's power of A, so only the
+            # states and one power of A are stored
+            states = (A @ self.state)[None]
+            power = A
+            while len(states) < min(n_steps, 4096):
+                states = np.concatenate((states, states @ power.T))
+                power = power @ power
+            done = 0
+            while True:
+                count = min(len(states), n_steps - done)
+                self.states.extend(states[:count])
+                self.weights_hist.append(self.weights, count)
+                self.testing_hist.append(self.testing, count)
+                done += count
+                if done == n_steps:
+                    break
+                states = states @ power.T
+            self.state = states[count-1]
+        else:
+            self.state = np.linalg.matrix_power(A, n_steps) @ self.state
+
+        for _ in range(n_steps):
+            self.t += dt
+        return n_steps
+
+    # correct the state of any units which have crossed their boundaries in
+    # this step, by enforcing hard limits and adapting any units which are
+    # not viable
+    def boundary_step(self, dt, previous):
+        n = self.n_units
+        new_theta = self.theta
+
+        # enforce hard limits - as new theta values of units which were
+        # clamped are seen by units later in the order, the accelerations
+        # of those units are corrected too
+        clamped = (new_theta > self.upper_limit) | (new_theta < self.lower_limit)
+        if clamped.any():
+            clipped = np.clip(new_theta, self.lower_limit, self.upper_limit)
+            correction = np.where(clamped, clipped - new_theta, 0)
+            new_theta[clamped] = clipped[clamped]
+            self.theta_dot[clamped] = 0
+            self.theta_dotdot[:] += self.gain * (self.weights_lower @ correction)
+
+        # units which are not viable, and not already testing, try some new weights
+        adapting = self.adapt_enabled & ~self.testing & ((new_theta > self.upper_viability) | (new_theta < self.lower_viability))
+        if adapting.any():
+            weights = self.weights.copy()
+            for i in np.flatnonzero(adapting):
+                # the outputs which unit i received in this step
+                outputs = np.concatenate((new_theta[:i], previous[i:n]))
+                weights[i] = self.adjust_weights(dt, i, weights[i], outputs)
+                self.test_times[i].append(self.t)
+            self.set_weights(weights)
+            self.timer[adapting] = 0
+            self.set_testing(self.testing | adapting)
+
+    # set which units are testing new weights. the array is replaced, rather
+    # than modified, so that testing_hist (a ChangeLog) logs a change only
+    # when the flags change
+    def set_testing(self, testing):
+        self.testing = testing
+        self.any_testing = testing.any()
+        if not self.dirty:
+            self.update_boundaries()
+
+    # get new weights for unit i from the adaptation function.
+    #   Only the most recent inputs, weights and state of the unit are passed
+    # to adapt_fun - the adaptation functions in Homeostat.py only use the
+    # current weights
+    def adjust_weights(self, dt, i, weights, outputs):
+        return self.adapt_fun(dt, [weights * outputs], [weights], [self.theta[i]], [self.theta_dot[i]], weights_set=self.weights_set, self_ind=i, rng=self.rngs[i])
+
+    # store the current state, if histories are being recorded
+    def record(self):
+        if self.record_history:
+            self.states.append(self.state)
+            self.weights_hist.append(self.weights)
+            self.testing_hist.append(self.testing)
+
+    # test which units are within their limits for viability
+    def test_viability(self):
+        return ~((self.theta > self.upper_viability) | (self.theta < self.lower_viability))
@@ -0,0 +1,191 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+import json
+
+from Homeostat import *
+from VectorHomeostat import *
+
+'''
+    Checkpoints of the full dynamical state of a Homeostat, which can be
+    saved part way through a run and restored later, e.g. to start every
+    run of a disturbance experiment from a homeostat which has already
+    settled, instead of simulating its initial transients again each time.
+
+    A checkpoint is a dict of NumPy arrays, which is saved as a NumPy archive
+    (.npz), and holds:
+        - the time, and theta, theta_dot and theta_dotdot of every unit
+        - the weight matrix, where row i holds the weights of unit i
+        - every unit's test timer, testing flag and test times
+        - every unit's parameters (m, k, l, p, q, limits, test interval, ...)
+        - the name of the adaptation function, and the weights set, if any
+        - the state of every unit's random number stream, if the homeostat
+          was given a seed
+    so the units' references to each other, and the adaptation function
+    itself, don't need to be saved. Histories are not saved - a restored
+    homeostat starts new histories from its current state.
+
+    Checkpoints can be taken from a Homeostat or a VectorHomeostat, and
+    restored as either. Only fully connected homeostats, as Homeostat
+    builds them, can be checkpointed.
+'''
+
+# the per-unit parameters which are saved in a checkpoint
+checkpoint_params = ['m', 'k', 'l', 'p', 'q', 'upper_limit', 'lower_limit', 'upper_viability', 'lower_viability', 'test_interval', 'adapt_enabled']
+
+# the adaptation functions which can be restored by name. Other functions
+# have to be passed to restore_homeostat
+adapt_funs = {fun.__name__: fun for fun in [random_val, random_creeper, random_selector]}
+
+# the state of a random number stream, as something which can be written
+# as JSON, or None for the global NumPy RNG
+def rng_state(rng):
+    if rng is None:
+        return None
+    return rng.bit_generator.state
+
+# a random number stream with the given state
+def rng_from_state(state):
+    if state is None:
+        return None
+    rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+    rng.bit_generator.state = state
+    return rng
+
+# take a checkpoint of a Homeostat or a VectorHomeostat, as a dict of arrays
+def checkpoint_state(homeostat):
+    if isinstance(homeostat, VectorHomeostat):
+        checkpoint = {name: np.array(getattr(homeostat, name)) for name in checkpoint_params}
+        checkpoint.update({'theta': homeostat.theta.copy(),
+                           'theta_dot': homeostat.theta_dot.copy(),
+                           'theta_dotdot': homeostat.theta_dotdot.copy(),
+                           'weights': np.array(homeostat.weights),
+                           'testing': np.array(homeostat.testing, dtype=bool),
+                           'timer': np.array(homeostat.timer, dtype=float)})
+        test_times = homeostat.test_times
+        rngs = homeostat.rngs
+        adapt_fun = homeostat.adapt_fun
+        weights_set = homeostat.weights_set
+    else:
+        units = homeostat.units
+        for i, unit in enumerate(units):
+            if unit.units != units or unit.self_ind != i:
+                raise ValueError('only fully connected homeostats can be checkpointed')
+        checkpoint = {name: np.array([getattr(unit, name) for unit in units]) for name in checkpoint_params}
+        checkpoint.update({'theta': np.array([unit.thetas[-1] for unit in units], dtype=float),
+                           'theta_dot': np.array([unit.theta_dots[-1] for unit in units], dtype=float),
+                           'theta_dotdot': np.array([unit.theta_dotdots[-1] for unit in units], dtype=float),
+                           'weights': np.array([unit.weights for unit in units], dtype=float),
+                           'testing': np.array([unit.testing for unit in units], dtype=bool),
+                           'timer': np.array([unit.timer for unit in units], dtype=float)})
+        test_times = [unit.test_times for unit in units]
+        rngs = [unit.rng for unit in units]
+        adapt_fun = units[0].adapt_fun
+        weights_set = units[0].weights_set
+
+    # the test times of all units, one after the other, and where each
+    # unit's times start
+    checkpoint['test_times'] = np.array([time for times in test_times for time in times], dtype=float)
+    checkpoint['test_times_start'] = np.cumsum([0] + [len(times) for times in test_times])
+    checkpoint['t'] = np.array(homeostat.t, dtype=float)
+    checkpoint['adapt_fun'] = np.array(adapt_fun.__name__)
+    if weights_set is not None:
+        checkpoint['weights_set'] = np.array(weights_set, dtype=float)
+    # the states of the random number streams are saved as JSON, as they
+    # hold integers which are too large for NumPy arrays
+    checkpoint['rng_states'] = np.array(json.dumps([rng_state(rng) for rng in rngs]))
+    return checkpoint
+
+# save a checkpoint of a homeostat to a NumPy archive
+def save_checkpoint(homeostat, path):
+    np.savez_compressed(path, **checkpoint_state(homeostat))
+
+# load a checkpoint which was saved with save_checkpoint
+def load_checkpoint(path):
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
+
+'''
+    Make a new homeostat from a checkpoint (a dict from checkpoint_state or
+    load_checkpoint, or the path of a saved checkpoint), which carries on
+    from exactly the state it was in.
+
+    engine is 'object', for a Homeostat, or 'vector', for a VectorHomeostat,
+    and any other keyword arguments are passed to its constructor (e.g.
+    record, duration and dt for a Homeostat, or record_history for a
+    VectorHomeostat). adapt_fun must be given if the checkpoint's adaptation
+    function isn't one of adapt_funs.
+
+    By default, the units carry on drawing from their random number streams
+    where the checkpoint left off. Given a seed, the units get new streams
+    from it (as a Homeostat would), so e.g. each run of a sweep which starts
+    from the same checkpoint can adapt differently. Homeostats which were
+    not given a seed draw from the global NumPy RNG, whose state is not
+    saved in a checkpoint.
+'''
+def restore_homeostat(checkpoint, engine='object', adapt_fun=None, seed=None, **kwargs):
+    if isinstance(checkpoint, str):
+        checkpoint = load_checkpoint(checkpoint)
+    n_units = len(checkpoint['theta'])
+    if adapt_fun is None:
+        name = str(checkpoint['adapt_fun'])
+        if name not in adapt_funs:
+            raise ValueError('unknown adaptation function ' + repr(name) + ' - pass it as adapt_fun')
+        adapt_fun = adapt_funs[name]
+    weights_set = checkpoint.get('weights_set')
+
+    if seed is None:
+        rngs = [rng_from_state(state) for state in json.loads(str(checkpoint['rng_states']))]
+    else:
+        rngs = make_streams(seed, n_units)[1]
+
+    starts = checkpoint['test_times_start']
+    test_times = [checkpoint['test_times'][starts[i]:starts[i+1]].tolist() for i in range(n_units)]
+    weights = checkpoint['weights']
+
+    # the homeostats are constructed with a seed, so that their initial
+    # (random) weights don't use up any of the global NumPy RNG's numbers
+    if engine == 'vector':
+        homeostat = VectorHomeostat(n_units=n_units, upper_viability=checkpoint['upper_viability'], lower_viability=checkpoint['lower_viability'], adapt_fun=adapt_fun, weights_set=weights_set, seed=0, **kwargs)
+        for name in checkpoint_params:
+            setattr(homeostat, name, checkpoint[name])
+        homeostat.theta[:] = checkpoint['theta']
+        homeostat.theta_dot[:] = checkpoint['theta_dot']
+        homeostat.theta_dotdot[:] = checkpoint['theta_dotdot']
+        homeostat.set_weights(weights)
+        homeostat.set_testing(checkpoint['testing'].copy())
+        homeostat.timer = checkpoint['timer'].copy()
+        homeostat.test_times = test_times
+        homeostat.rngs = rngs
+        homeostat.t = float(checkpoint['t'])
+        # restart the histories from the restored state
+        homeostat.states = []
+        homeostat.weights_hist = ChangeLog()
+        homeostat.testing_hist = ChangeLog()
+        homeostat.record()
+    elif engine == 'object':
+        homeostat = Homeostat(n_units=n_units, upper_viability=0, lower_viability=0, adapt_fun=adapt_fun, weights_set=weights_set, seed=0, **kwargs)
+        for i, unit in enumerate(homeostat.units):
+            for name in checkpoint_params:
+                setattr(unit, name, checkpoint[name][i].item())
+            unit.thetas[-1] = float(checkpoint['theta'][i])
+            unit.theta_dots[-1] = float(checkpoint['theta_dot'][i])
+            unit.theta_dotdots[-1] = float(checkpoint['theta_dotdot'][i])
+            unit.weights = weights[i].tolist()
+            unit.testing = bool(checkpoint['testing'][i])
+            unit.timer = float(checkpoint['timer'][i])
+            unit.test_times = test_times[i]
+            unit.rng = rngs[i]
+            unit.t = float(checkpoint['t'])
+            # restart the histories from the restored state
+            unit.weights_hist = ChangeLog()
+            unit.weights_hist.append(unit.weights)
+            unit.testing_hist = ChangeLog()
+            unit.testing_hist.append(unit.testing)
+        homeostat.t = float(checkpoint['t'])
+    else:
+        raise ValueError("engine must be 'object' or 'vector'")
+
+    return homeostat
@@ -0,0 +1,286 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+from bisect import bisect_right
+
+'''
+    A history of a variable which changes only occasionally, such as a
+    Unit's weights or testing flag, stored as a log of the time steps at
+    which it changed, and the values it changed to.
+
+    It can be used in the same way as the list of one value per step which
+    it replaces - len(), indexing (e.g. weights_hist[-1]), iteration, and
+    conversion to an array (which is what happens in e.g.
+    plt.plot(ts, unit.weights_hist)) all behave as if every step had been
+    stored, but the dense list or array is only built when it is asked for.
+    Statistics which only need the values and how long they lasted, such as
+    sum(), are computed from the log, in O(events) time.
+
+    A value is logged as a change whenever the appended object is not the
+    same object as the last one, so values which are changed by replacing
+    them (as Unit.adjust_weights does with weights) are logged correctly,
+    but values which are modified in place are not.
+'''
+class ChangeLog:
+
+    def __init__(self):
+        self.starts = [] # the time index at which each value was first appended
+        self.values = [] # the values
+        self.length = 0 # the number of time steps in the history
+
+    # add a value to the end of the history, count times
+    def append(self, value, count=1):
+        if count <= 0:
+            return
+        if not self.values or value is not self.values[-1]:
+            self.starts.append(self.length)
+            self.values.append(value)
+        self.length += count
+
+    def __len__(self):
+        return self.length
+
+    # the lengths of the runs of each value
+    def durations(self):
+        return np.diff(self.starts + [self.length])
+
+    # iterate over the runs of values, as (start, stop, value)
+    def runs(self):
+        return zip(self.starts, self.starts[1:] + [self.length], self.values)
+
+    # the values for the last n time steps, oldest first, as an array, which
+    # is built only from the runs of values which cover them
+    def recent(self, n):
+        n = min(n, self.length)
+        if n <= 0:
+            return np.array([])
+        start = self.length - n
+        i = bisect_right(self.starts, start) - 1
+        durations = np.diff([start] + self.starts[i+1:] + [self.length])
+        return np.repeat(np.array(self.values[i:]), durations, axis=0)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('ChangeLog index out of range')
+        return self.values[bisect_right(self.starts, index) - 1]
+
+    def __iter__(self):
+        for start, stop, value in self.runs():
+            for _ in range(stop - start):
+                yield value
+
+    # the dense history, as an array with one entry per time step
+    def __array__(self, dtype=None, copy=None):
+        if not self.values:
+            return np.array([], dtype=dtype)
+        return np.repeat(np.array(self.values, dtype=dtype), self.durations(), axis=0)
+
+    # the sum of the values over all time steps, e.g. the number of steps
+    # for which a testing flag was True
+    def sum(self):
+        if not self.values:
+            return 0
+        return np.tensordot(self.durations(), np.array(self.values, dtype=float), axes=1)
+
+    def __repr__(self):
+        return 'ChangeLog(' + str(len(self.values)) + ' values over ' + str(self.length) + ' steps)'
+
+'''
+    A history of a variable which is recorded on every time step, such as a
+    Unit's theta, stored in a preallocated NumPy buffer.
+
+    The buffer starts with room for capacity entries (e.g. duration / dt),
+    and doubles in size whenever a run goes past that, so the recorded
+    values are always available as an array view, without copying. Values
+    can be scalars, or arrays of a fixed shape, e.g. a Unit's inputs on each
+    step - the buffer is allocated when the first values are written, with
+    their shape.
+
+    Writing single values into a NumPy array from Python is several times
+    slower than appending them to a list, so appended values are first
+    collected in a short list, which is copied into the buffer chunk values
+    at a time, and whenever the array is asked for.
+
+    What is recorded is chosen with every:
+        - 1 records every step
+        - k > 1 records every k-th step (steps 0, k, 2k, ...)
+        - 0 (or None) records nothing
+    Whatever is recorded, history[-1] always gives the latest value, and
+    setting history[-1] changes it (as the disturbance sources do), so
+    code which only uses the current value works the same in every mode.
+    len() and the array view only cover the recorded steps.
+
+    If window is given, the last window values are also available as an
+    array view, recent, whatever is recorded. When every step is recorded,
+    it is a view of the end of the buffer. Otherwise, the last values are
+    kept in a separate buffer of fixed size, window + chunk, and when it is
+    full, the last window values are moved back to its start, so the memory
+    used doesn't grow with the length of the run.
+'''
+class HistoryBuffer:
+
+    def __init__(self, every=1, capacity=1024, dtype=float, chunk=256, window=0):
+        self.every = every or 0
+        self.capacity = max(1, capacity)
+        self.dtype = dtype
+        self.chunk = chunk
+        self.buffer = None
+        self.count = 0 # the number of values which have been copied into the buffer
+        self.pending = [] # recorded values which have not been copied into the buffer yet
+        self.steps = 0 # the number of values which have been appended
+        self.latest = None # the latest value, whether or not it was recorded
+        self.latest_recorded = False
+        self.window = window or 0
+        self.recent_buffer = None
+        self.recent_count = 0 # the number of values in the recent buffer
+        self.recent_pending = [] # values for the recent buffer which have not been copied into it yet
+        # when every step is recorded, which is the common case, append is
+        # replaced by a shorter version, as it is called on every step
+        if self.every == 1:
+            self.append = self.append_every_step
+        elif self.window:
+            self.append = self.append_windowed
+
+    # add the value for the next time step
+    def append(self, value):
+        self.latest = value
+        if self.every == 1 or (self.every and self.steps % self.every == 0):
+            self.latest_recorded = True
+            self.pending.append(value)
+            if len(self.pending) == self.chunk:
+                self.flush()
+        else:
+            self.latest_recorded = False
+        self.steps += 1
+
+    def append_every_step(self, value):
+        self.latest = value
+        self.latest_recorded = True
+        pending = self.pending
+        pending.append(value)
+        if len(pending) == self.chunk:
+            self.flush()
+        self.steps += 1
+
+    # add the value for the next time step, when the steps which aren't
+    # recorded are still needed for the recent window
+    def append_windowed(self, value):
+        HistoryBuffer.append(self, value)
+        pending = self.recent_pending
+        pending.append(value)
+        if len(pending) == self.chunk:
+            self.flush_recent()
+
+    # copy the pending values into the buffer
+    def flush(self):
+        if not self.pending:
+            return
+        values = np.array(self.pending, dtype=self.dtype)
+        if self.buffer is None:
+            self.buffer = np.empty((max(self.capacity, len(values)),) + values.shape[1:], dtype=self.dtype)
+        while self.count + len(values) > len(self.buffer):
+            self.grow()
+        self.buffer[self.count:self.count + len(values)] = values
+        self.count += len(values)
+        self.pending = []
+
+    # double the size of the buffer
+    def grow(self):
+        new_buffer = np.empty((2 * len(self.buffer),) + self.buffer.shape[1:], dtype=self.buffer.dtype)
+        new_buffer[:self.count] = self.buffer[:self.count]
+        self.buffer = new_buffer
+
+    # copy the values for the recent window into its buffer, first moving
+    # the last window values back to the start of the buffer if they
+    # wouldn't fit
+    def flush_recent(self):
+        if not self.recent_pending:
+            return
+        values = np.array(self.recent_pending, dtype=self.dtype)
+        if self.recent_buffer is None:
+            self.recent_buffer = np.empty((self.window + self.chunk,) + values.shape[1:], dtype=self.dtype)
+        if self.recent_count + len(values) > len(self.recent_buffer):
+            keep = min(self.recent_count, self.window)
+            self.recent_buffer[:keep] = self.recent_buffer[self.recent_count - keep:self.recent_count]
+            self.recent_count = keep
+        self.recent_buffer[self.recent_count:self.recent_count + len(values)] = values
+        self.recent_count += len(values)
+        self.recent_pending = []
+
+    # the last window values, oldest first, as a view of a buffer (fewer
+    # if fewer steps have been appended)
+    @property
+    def recent(self):
+        if self.every == 1:
+            array = self.array
+            return array[max(0, len(array) - self.window):]
+        self.flush_recent()
+        if self.recent_buffer is None:
+            return np.empty(0, dtype=self.dtype)
+        return self.recent_buffer[max(0, self.recent_count - self.window):self.recent_count]
+
+    # the recorded values, as a view of the buffer
+    @property
+    def array(self):
+        self.flush()
+        if self.buffer is None:
+            return np.empty(0, dtype=self.dtype)
+        return self.buffer[:self.count]
+
+    # the time step of each recorded value
+    @property
+    def recorded_steps(self):
+        return np.arange(len(self)) * max(1, self.every)
+
+    def __len__(self):
+        return self.count + len(self.pending)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)) and index == -1:
+            return self.latest
+        return self.array[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, (int, np.integer)) and index == -1:
+            self.latest = value
+            if self.window and self.every != 1:
+                if self.recent_pending:
+                    self.recent_pending[-1] = value
+                else:
+                    self.recent_buffer[self.recent_count - 1] = value
+            if self.latest_recorded:
+                if self.pending:
+                    self.pending[-1] = value
+                else:
+                    self.buffer[self.count - 1] = value
+            return
+        self.array[index] = value
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.array
+        return self.array.astype(dtype)
+
+    def __repr__(self):
+        return 'HistoryBuffer(' + str(len(self)) + ' of ' + str(self.steps) + ' steps recorded)'
+
+# make the history of a variable for a recording mode, which is 'full',
+# 'off', or the interval (in steps) at which to record it, and the number
+# of steps which its recent window holds (see HistoryBuffer)
+def make_history(mode='full', capacity=1024, dtype=float, window=0):
+    if mode == 'full':
+        every = 1
+    elif mode == 'off' or mode is None:
+        every = 0
+    else:
+        every = int(mode)
+    return HistoryBuffer(every=every, capacity=capacity, dtype=dtype, window=window)
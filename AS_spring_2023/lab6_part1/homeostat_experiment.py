@@ -6,6 +6,7 @@ from Sandbox import *
 import copy as cp
 
 from Homeostat import *
+from stability import *
 
 '''
 	4-unit Homeostat with random valued step change adaptation.
@@ -62,12 +63,21 @@ ts = [t]
 dt = 0.01
 duration = 500
 
+# uncomment to classify every configuration of weights which the Homeostat
+# tries as stable or unstable, from the eigenvalues of its step matrix, and
+# print how the predictions compare with what happened in the simulation
+# predictor = StabilityPredictor(homie, dt)
+
 while t < duration:
     # unit.step(dt)
     homie.step(dt)
+    # predictor.step()
     t += dt
     ts.append(t)
 
+# print(predictor.statistics())
+# print("Fraction of random configurations which are stable:", np.mean(sample_margins(len(homie.units), random_val, dt=dt) < 0))
+
 # PLOT 1: plot system state over time, showing when weights change
 plt.figure()
 for i, unit in enumerate(homie.units):
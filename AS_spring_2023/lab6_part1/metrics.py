@@ -0,0 +1,228 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+'''
+    Streaming statistics of a Homeostat run.
+
+    Instead of computing statistics after a run from the full histories of
+    every unit, a StreamingMetrics object is updated after every step, and
+    keeps a set of accumulators, each of which holds O(1) state per unit.
+    Runs which only need the statistics can then turn off their histories
+    (see the record argument of Homeostat).
+
+    Every accumulator has update(state, t, dt), which is passed the current
+    state of the homeostat's units (a UnitState), and result(), which
+    returns its statistics. New statistics can be added by passing other
+    accumulators to StreamingMetrics. All of them work with any of the
+    Homeostats, and give per-unit arrays, of shape (n_units,), or
+    (n_members, n_units) for a HomeostatEnsemble.
+'''
+
+'''
+    The state of a homeostat's units after a step, as arrays: theta, testing,
+    and outside, which says which units are outside their viability limits.
+'''
+class UnitState:
+
+    def __init__(self, homeostat):
+        self.homeostat = homeostat
+        self.object_units = not hasattr(homeostat, 'testing')
+        if self.object_units:
+            units = homeostat.units
+            self.upper_viability = np.array([unit.upper_viability for unit in units], dtype=float)
+            self.lower_viability = np.array([unit.lower_viability for unit in units], dtype=float)
+        self.update()
+
+    def update(self):
+        homeostat = self.homeostat
+        if self.object_units:
+            units = homeostat.units
+            self.theta = np.array([unit.get_theta() for unit in units], dtype=float)
+            self.testing = np.array([unit.testing for unit in units], dtype=bool)
+            self.outside = (self.theta > self.upper_viability) | (self.theta < self.lower_viability)
+        else:
+            self.theta = np.asarray(homeostat.theta, dtype=float)
+            self.testing = np.asarray(homeostat.testing, dtype=bool)
+            self.outside = ~np.asarray(homeostat.test_viability(), dtype=bool)
+
+    # the number of times each unit has adapted so far. This isn't needed
+    # after every step, so it is only worked out when it is asked for
+    def n_adaptations(self):
+        homeostat = self.homeostat
+        if self.object_units:
+            return np.array([len(unit.test_times) for unit in homeostat.units])
+        if hasattr(homeostat, 'n_adaptations'):
+            # HomeostatEnsemble and SparseHomeostat count adaptations as they go
+            return np.array(homeostat.n_adaptations)
+        return np.array([len(times) for times in homeostat.test_times])
+
+# the time each unit spends outside its viability limits
+class TimeOutsideViability:
+
+    name = 'time_outside_viability'
+
+    def __init__(self, state):
+        self.time = np.zeros(state.theta.shape)
+
+    def update(self, state, t, dt):
+        np.add(self.time, dt, out=self.time, where=state.outside)
+
+    def result(self):
+        return self.time
+
+# the time each unit spends testing new weights (i.e. adapting), which is
+# the same as unit.testing_hist.sum() * dt
+class TimeAdapting:
+
+    name = 'time_adapting'
+
+    def __init__(self, state):
+        self.time = np.zeros(state.theta.shape)
+
+    def update(self, state, t, dt):
+        np.add(self.time, dt, out=self.time, where=state.testing)
+
+    def result(self):
+        return self.time
+
+# the number of times each unit adapts
+class AdaptationCount:
+
+    name = 'n_adaptations'
+
+    def __init__(self, state):
+        self.state = state
+        self.initial = state.n_adaptations()
+
+    def update(self, state, t, dt):
+        pass
+
+    def result(self):
+        return self.state.n_adaptations() - self.initial
+
+# the first time from which every unit (of each member, for an ensemble)
+# stays viable, and not testing, for at least window units of time, or nan
+# if that never happens. If the units start out settled (e.g. from a stable
+# position), that first period doesn't count, as they haven't had to reach
+# stability yet
+class TimeToStability:
+
+    name = 'time_to_stability'
+
+    def __init__(self, state, window=10):
+        self.window = window
+        self.waiting = np.array(self.settled(state)) # members which haven't been unsettled yet
+        self.since = np.full(self.waiting.shape, np.inf) # when the current settled period started
+        self.time = np.full(self.waiting.shape, np.nan)
+        self.done = False
+
+    def settled(self, state):
+        return ~(state.outside | state.testing).any(axis=-1)
+
+    def update(self, state, t, dt):
+        if self.done:
+            return
+        settled = self.settled(state)
+        if self.waiting.any():
+            self.waiting = self.waiting & settled
+            settled = settled & ~self.waiting
+        self.since = np.where(settled, np.minimum(self.since, t), np.inf)
+        found = t - self.since >= self.window
+        if found.any():
+            self.time = np.where(np.isnan(self.time) & found, self.since, self.time)
+            self.done = not np.isnan(self.time).any()
+
+    def result(self):
+        return self.time
+
+# the running mean and variance of each unit's theta, over the steps. The
+# sums are of the differences from the initial values of theta, which keeps
+# the variance accurate when it is small compared to the mean
+class ThetaMoments:
+
+    name = 'theta_moments'
+
+    def __init__(self, state):
+        self.count = 0
+        self.shift = np.array(state.theta)
+        self.sum = np.zeros(state.theta.shape)
+        self.sum_sq = np.zeros(state.theta.shape)
+
+    def update(self, state, t, dt):
+        self.count += 1
+        delta = state.theta - self.shift
+        self.sum += delta
+        self.sum_sq += delta * delta
+
+    def result(self):
+        if not self.count:
+            return {'mean': self.shift * np.nan, 'variance': self.shift * np.nan}
+        mean = self.sum / self.count
+        return {'mean': self.shift + mean, 'variance': np.maximum(self.sum_sq / self.count - mean * mean, 0)}
+
+# a histogram of dwell times - the lengths of the periods which units spend
+# within their viability limits, between leaving them. Periods which are
+# still going on at the end of the run are not counted, as their lengths are
+# not known
+class DwellTimeHistogram:
+
+    name = 'dwell_times'
+
+    def __init__(self, state, bins=np.array([0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, np.inf])):
+        self.bins = np.asarray(bins, dtype=float)
+        self.counts = np.zeros(len(self.bins) - 1, dtype=int)
+        self.outside = state.outside.copy()
+        # when each unit last became viable
+        self.entered = np.full(state.outside.shape, float(getattr(state.homeostat, 't', 0)))
+
+    def update(self, state, t, dt):
+        changed = state.outside != self.outside
+        if changed.any():
+            leaving = changed & state.outside
+            if leaving.any():
+                dwells = t - self.entered[leaving]
+                bins = np.clip(np.searchsorted(self.bins, dwells, side='right') - 1, 0, len(self.counts) - 1)
+                np.add.at(self.counts, bins, 1)
+            self.entered[changed & self.outside] = t
+            self.outside = state.outside.copy()
+
+    def result(self):
+        return {'bins': self.bins, 'counts': self.counts}
+
+default_accumulators = [TimeOutsideViability, TimeAdapting, AdaptationCount, TimeToStability, ThetaMoments, DwellTimeHistogram]
+
+'''
+    A set of accumulators, which are updated after every step of a
+    homeostat, e.g.
+
+        metrics = StreamingMetrics(homeostat)
+        while t < duration:
+            homeostat.step(dt)
+            t += dt
+            metrics.update(t, dt)
+        metrics.results()
+
+    accumulators is a list of accumulator classes (or functions which make
+    an accumulator from a UnitState), by default default_accumulators.
+'''
+class StreamingMetrics:
+
+    def __init__(self, homeostat, accumulators=None):
+        self.state = UnitState(homeostat)
+        self.accumulators = [make(self.state) for make in (accumulators or default_accumulators)]
+        self.duration = 0
+
+    def update(self, t, dt):
+        self.state.update()
+        for accumulator in self.accumulators:
+            accumulator.update(self.state, t, dt)
+        self.duration += dt
+
+    # the statistics from every accumulator, by name, and the total time
+    # which they cover
+    def results(self):
+        results = {accumulator.name: accumulator.result() for accumulator in self.accumulators}
+        results['duration'] = self.duration
+        return results
@@ -0,0 +1,71 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+'''
+    Phase-space analysis of a single Homeostat Unit.
+
+    A unit's state is [theta, theta_dot], and while its weights are fixed,
+    and the units it is connected to are held still, its dynamics are
+        theta_dot'    = theta_dotdot
+        theta_dotdot  = -k * theta_dot + l * (p - q) * input_sum
+        input_sum     = w_self * theta + external_input
+    where w_self is the weight of the unit's connection to itself, and
+    external_input is the weighted sum of the outputs of the other units.
+
+    vector_field evaluates the dynamics over a whole grid of states at once,
+    and trajectories integrates a batch of initial states together, with the
+    same (lagged) Euler steps and hard limits as Unit.integrate, so that
+    trajectories give the same states as stepping a Unit, without growing
+    its histories. Neither adapts the unit's weights.
+'''
+
+# the parameters of the linear dynamics of a unit, with the outputs of the
+# other units held at their current values:
+# (w_self, external_input, k, l, p, q)
+def unit_field_params(unit):
+    w_self = 0
+    external_input = 0
+    for other, weight in zip(unit.units, unit.weights):
+        if other is unit:
+            w_self += weight
+        else:
+            external_input += other.get_theta() * weight
+    return w_self, external_input, unit.k, unit.l, unit.p, unit.q
+
+# the acceleration of a unit, for arrays of states
+def unit_acceleration(theta, theta_dot, w_self, external_input=0, k=1, l=1, p=2, q=1):
+    return (-k * theta_dot) + (l * (p - q) * (w_self * theta + external_input))
+
+# the vector field [theta_dot, theta_dotdot] of unit at every state in the
+# (e.g. meshgrid) arrays thetas and theta_dots
+def vector_field(unit, thetas, theta_dots):
+    thetas = np.asarray(thetas, dtype=float)
+    theta_dots = np.asarray(theta_dots, dtype=float)
+    return theta_dots, unit_acceleration(thetas, theta_dots, *unit_field_params(unit))
+
+# integrate a batch of initial states of unit for n_steps steps of dt, and
+# return the state after every step, as a (batch, n_steps, 2) array of
+# [theta, theta_dot], i.e. trajectories[b, :, 0] is the same as
+# unit.thetas[1:] would be after stepping a unit which started at state b.
+# As in a newly constructed Unit, theta_dotdot starts at 0
+def trajectories(unit, theta0s, theta_dot0s, n_steps, dt):
+    w_self, external_input, k, l, p, q = unit_field_params(unit)
+    theta = np.array(theta0s, dtype=float)
+    theta_dot = np.array(theta_dot0s, dtype=float)
+    theta_dotdot = np.zeros_like(theta)
+    states = np.zeros((len(theta), n_steps, 2))
+    for step in range(n_steps):
+        # the same updates as in Unit.update_inputs and Unit.integrate
+        new_theta_dotdot = unit_acceleration(theta, theta_dot, w_self, external_input, k, l, p, q)
+        new_theta_dot = theta_dot + theta_dotdot * dt
+        new_theta = theta + theta_dot * dt
+        clamped = (new_theta > unit.upper_limit) | (new_theta < unit.lower_limit)
+        if clamped.any():
+            new_theta = np.clip(new_theta, unit.lower_limit, unit.upper_limit)
+            new_theta_dot[clamped] = 0
+        theta, theta_dot, theta_dotdot = new_theta, new_theta_dot, new_theta_dotdot
+        states[:, step, 0] = theta
+        states[:, step, 1] = theta_dot
+    return states
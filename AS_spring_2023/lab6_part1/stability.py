@@ -0,0 +1,288 @@
+import sys
+import math
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+'''
+    Stability analysis of a Homeostat's weight configurations.
+
+    While no unit is at a hard limit, a Homeostat is a linear system, so
+    whether a configuration of weights is stable can be read from the
+    eigenvalues of its Jacobian, instead of being found by simulating it for
+    test_interval time units and waiting to see if it loses viability.
+
+    Two forms of the linear system are available:
+        - the continuous-time dynamics, with state [theta, theta_dot], which
+          are stable when every eigenvalue of homeostat_jacobian has a
+          negative real part
+        - the Euler steps which Unit.integrate takes with a given dt, with
+          state [theta, theta_dot, theta_dotdot], which are stable when every
+          eigenvalue of euler_step_matrix has a magnitude below 1
+'''
+
+# the Jacobian of the continuous-time dynamics of a Homeostat, for the state
+# [theta (n), theta_dot (n)], where weights[i] holds the weights of unit i
+def homeostat_jacobian(weights, k=1, l=1, p=2, q=1):
+    weights = np.asarray(weights, dtype=float)
+    n = len(weights)
+    gain = np.broadcast_to(np.asarray(l) * (np.asarray(p) - np.asarray(q)), (n,))
+    J = np.zeros((2*n, 2*n))
+    J[:n, n:] = np.eye(n)
+    J[n:, :n] = gain[:, None] * weights
+    J[n:, n:] = -np.diag(np.broadcast_to(k, (n,)))
+    return J
+
+# the matrix which maps the state [theta (n), theta_dot (n), theta_dotdot (n)]
+# of a Homeostat at one Euler step to the next, as in Unit.integrate, where
+# the units are stepped in order, so that unit i uses the new values of
+# theta of units 0..i-1
+def euler_step_matrix(weights, dt, k=1, l=1, p=2, q=1):
+    weights = np.asarray(weights, dtype=float)
+    n = len(weights)
+    gain = np.broadcast_to(np.asarray(l) * (np.asarray(p) - np.asarray(q)), (n,))[:, None]
+    eye = np.eye(n)
+    F = np.zeros((3*n, 3*n))
+    # theta = theta + theta_dot * dt
+    F[:n, :n] = eye
+    F[:n, n:2*n] = dt * eye
+    # theta_dot = theta_dot + theta_dotdot * dt
+    F[n:2*n, n:2*n] = eye
+    F[n:2*n, 2*n:] = dt * eye
+    # theta_dotdot = -k * theta_dot + l * (p - q) * input_sum
+    F[2*n:, :n] = gain * weights
+    F[2*n:, n:2*n] = (gain * dt * np.tril(weights, -1)) - np.diag(np.broadcast_to(k, (n,)))
+    return F
+
+# the stability margin of a configuration: the largest real part of the
+# eigenvalues of the Jacobian, if dt is None, otherwise the largest
+# magnitude of the eigenvalues of the Euler step matrix minus 1. The
+# configuration is stable when the margin is negative
+def stability_margin(weights, k=1, l=1, p=2, q=1, dt=None):
+    if dt is None:
+        return np.linalg.eigvals(homeostat_jacobian(weights, k, l, p, q)).real.max()
+    return np.abs(np.linalg.eigvals(euler_step_matrix(weights, dt, k, l, p, q))).max() - 1
+
+def predict_stable(weights, k=1, l=1, p=2, q=1, dt=None):
+    return stability_margin(weights, k, l, p, q, dt) < 0
+
+# classify n_samples random configurations of weights, drawn row by row
+# with adapt_fun (e.g. random_val or random_selector), and return their
+# stability margins, e.g. np.mean(margins < 0) estimates the probability
+# that a single adaptation of every unit finds a stable configuration.
+# The eigenvalues of all of the configurations are computed at once. The
+# weights are drawn from rng, if it is given, otherwise from the global RNG
+def sample_margins(n_units, adapt_fun, n_samples=1000, weights_set=None, k=1, l=1, p=2, q=1, dt=None, rng=None):
+    weights = np.zeros((n_samples, n_units, n_units))
+    for s in range(n_samples):
+        for i in range(n_units):
+            weights[s, i] = adapt_fun(dt, [], [np.zeros(n_units)], [], [], weights_set=weights_set, self_ind=i, rng=rng)
+    if dt is None:
+        matrices = np.array([homeostat_jacobian(w, k, l, p, q) for w in weights])
+        return np.linalg.eigvals(matrices).real.max(axis=1)
+    matrices = np.array([euler_step_matrix(w, dt, k, l, p, q) for w in weights])
+    return np.abs(np.linalg.eigvals(matrices)).max(axis=1) - 1
+
+# get the weight matrix and the unit parameters (k, l, p, q) of a Homeostat
+# or a VectorHomeostat
+def homeostat_params(homeostat):
+    if hasattr(homeostat, 'units') and hasattr(homeostat.units[0], 'weights'):
+        units = homeostat.units
+        weights = np.array([unit.weights for unit in units], dtype=float)
+        return weights, tuple(np.array([getattr(unit, name) for unit in units], dtype=float) for name in 'klpq')
+    return np.array(homeostat.weights, dtype=float), (homeostat.k, homeostat.l, homeostat.p, homeostat.q)
+
+'''
+    Predict-only analysis of a Homeostat's search for a stable configuration.
+
+    Call step() after every step of the Homeostat. Whenever any unit adapts,
+    the new configuration of weights is classified from its eigenvalues, and
+    when it is replaced by the next one, or the run ends, its outcome is
+    recorded, so that the predictions can be compared with what the
+    simulation actually did. The simulation itself is not changed.
+'''
+class StabilityPredictor:
+
+    def __init__(self, homeostat, dt=None):
+        self.homeostat = homeostat
+        # the Euler step which the predictions are for, or None to use the
+        # continuous-time dynamics
+        self.dt = dt
+        self.n_adaptations = -1
+        # one entry per configuration: [start time, end time (or None), predicted stable, margin]
+        self.configurations = []
+        self.step()
+
+    # the number of adaptations which the homeostat has made so far
+    def count_adaptations(self):
+        test_times = self.homeostat.test_times if hasattr(self.homeostat, 'test_times') else [unit.test_times for unit in self.homeostat.units]
+        return sum(len(times) for times in test_times)
+
+    def step(self):
+        n_adaptations = self.count_adaptations()
+        if n_adaptations != self.n_adaptations:
+            self.n_adaptations = n_adaptations
+            t = self.homeostat.t
+            if self.configurations:
+                self.configurations[-1][1] = t
+            weights, (k, l, p, q) = homeostat_params(self.homeostat)
+            margin = stability_margin(weights, k, l, p, q, self.dt)
+            self.configurations.append([t, None, margin < 0, margin])
+
+    # summarise the predictions. A configuration "held" if it was never
+    # replaced, and "failed" if some unit adapted again while it was in use
+    def statistics(self):
+        predicted = np.array([c[2] for c in self.configurations], dtype=bool)
+        held = np.array([c[1] is None for c in self.configurations], dtype=bool)
+        durations = np.array([(self.homeostat.t if c[1] is None else c[1]) - c[0] for c in self.configurations])
+        return {'configurations': len(self.configurations),
+                'predicted_stable': int(predicted.sum()),
+                'predicted_unstable': int((~predicted).sum()),
+                'stable_held': int((predicted & held).sum()),
+                'stable_failed': int((predicted & ~held).sum()),
+                'unstable_held': int((~predicted & held).sum()),
+                'unstable_failed': int((~predicted & ~held).sum()),
+                'mean_time_stable': durations[predicted].mean() if predicted.any() else np.nan,
+                'mean_time_unstable': durations[~predicted].mean() if (~predicted).any() else np.nan}
+
+'''
+    Stability of whole batches of configurations at once.
+
+    batch_stable classifies an array of weight matrices, of shape
+    (batch, n, n). When every unit has the same k, l, p and q, and the
+    continuous-time dynamics are used, the characteristic polynomial of the
+    Jacobian is q_W(lambda^2 + k lambda), where q_W is the characteristic
+    polynomial of l (p - q) W, so stability is decided from the polynomial's
+    coefficients with the Routh-Hurwitz test, without finding any
+    eigenvalues, which is much faster for large batches. Otherwise, the
+    eigenvalues of the batch of Jacobians (or Euler step matrices) are
+    found.
+
+    Configurations which are only marginally stable, e.g. those with
+    singular weight matrices, which are common when the weights are drawn
+    from a discrete set, are not stable. Their coefficients (or eigenvalues)
+    are only zero (or on the imaginary axis) up to rounding, so anything
+    within tolerance of being marginally stable, relative to the sizes of
+    the terms which it was computed from, is counted as not stable.
+'''
+
+# the characteristic polynomials det(mu I - A) of a batch of matrices, as a
+# (batch, n + 1) array of coefficients, highest power first (Faddeev-LeVerrier)
+def characteristic_polynomials(matrices):
+    matrices = np.asarray(matrices, dtype=float)
+    n = matrices.shape[-1]
+    coefficients = np.zeros(matrices.shape[:-2] + (n + 1,))
+    coefficients[..., 0] = 1
+    M = np.zeros_like(matrices)
+    diagonal = np.arange(n)
+    for j in range(1, n + 1):
+        M = matrices @ M
+        M[..., diagonal, diagonal] += coefficients[..., j - 1, None]
+        coefficients[..., j] = -np.einsum('...ij,...ji->...', matrices, M) / j
+    return coefficients
+
+# bounds on the sizes of the coefficients of the characteristic polynomials
+# of matrices of size n, whose rows have absolute sums of at most norms. The
+# coefficient of mu^(n - j) is a sum of binom(n, j) principal minors of size
+# j, each of which is at most norms^j
+def characteristic_scales(norms, n):
+    j = np.arange(n + 1)
+    return np.array([math.comb(n, i) for i in j]) * np.asarray(norms, dtype=float)[..., None] ** j
+
+# whether every root of each polynomial in a batch (coefficients highest
+# power first, with a positive leading coefficient) has a negative real
+# part, from the first column of its Routh array. Polynomials with roots on
+# the imaginary axis are not stable.
+#   scales are the sizes of the terms which each coefficient was computed
+# from (by default, the largest coefficient of each polynomial), and the
+# rounding errors of the coefficients are taken to be in proportion to
+# them. The scales of the entries of the Routh array are the sizes of the
+# terms which they are computed from, in the same way as the entries, and
+# the leading coefficient and every pivot must be more than
+# tolerance times its scale, so that a coefficient or pivot which is only
+# zero up to rounding doesn't make a marginally stable polynomial stable.
+#   The rows of the Routh array are held as lists of arrays over the batch,
+# which is much faster than indexing into (batch, degree) arrays
+def hurwitz_stable(coefficients, scales=None, tolerance=1e-12):
+    coefficients = np.asarray(coefficients, dtype=float)
+    if scales is None:
+        scales = np.abs(coefficients).max(axis=-1, keepdims=True)
+    scales = np.broadcast_to(scales, coefficients.shape)
+    shape = coefficients.shape[:-1]
+    columns = list(coefficients.reshape(-1, coefficients.shape[-1]).T)
+    scale_columns = list(scales.reshape(-1, coefficients.shape[-1]).T)
+    zero = np.zeros_like(columns[0])
+    width = len(columns) // 2 + 1
+    upper = columns[0::2] + [zero] * (width - len(columns[0::2]))
+    lower = columns[1::2] + [zero] * (width - len(columns[1::2]))
+    upper_scales = scale_columns[0::2] + [zero] * (width - len(columns[0::2]))
+    lower_scales = scale_columns[1::2] + [zero] * (width - len(columns[1::2]))
+    stable = upper[0] > tolerance * upper_scales[0]
+    # scales which overflow only make the test stricter
+    with np.errstate(over='ignore', invalid='ignore'):
+        for _ in range(len(columns) - 1):
+            pivot = lower[0]
+            stable &= pivot > tolerance * lower_scales[0]
+            pivot = np.where(stable, pivot, 1)
+            ratio = upper[0] / pivot
+            abs_ratio = np.abs(ratio)
+            row = [upper[i + 1] - ratio * lower[i + 1] for i in range(width - 1)] + [zero]
+            row_scales = [upper_scales[i + 1] + abs_ratio * lower_scales[i + 1] for i in range(width - 1)] + [zero]
+            upper, lower = lower, row
+            upper_scales, lower_scales = lower_scales, row_scales
+    return stable.reshape(shape)
+
+# the Jacobians (see homeostat_jacobian) of a batch of weight matrices
+def batch_jacobians(weights, k=1, l=1, p=2, q=1):
+    n = weights.shape[-1]
+    gain = np.broadcast_to(np.asarray(l) * (np.asarray(p) - np.asarray(q)), (n,))
+    J = np.zeros(weights.shape[:-2] + (2*n, 2*n))
+    J[..., :n, n:] = np.eye(n)
+    J[..., n:, :n] = gain[:, None] * weights
+    J[..., n:, n:] = -np.diag(np.broadcast_to(k, (n,)))
+    return J
+
+# the Euler step matrices (see euler_step_matrix) of a batch of weight matrices
+def batch_euler_step_matrices(weights, dt, k=1, l=1, p=2, q=1):
+    n = weights.shape[-1]
+    gain = np.broadcast_to(np.asarray(l) * (np.asarray(p) - np.asarray(q)), (n,))[:, None]
+    eye = np.eye(n)
+    F = np.zeros(weights.shape[:-2] + (3*n, 3*n))
+    F[..., :n, :n] = eye
+    F[..., :n, n:2*n] = dt * eye
+    F[..., n:2*n, n:2*n] = eye
+    F[..., n:2*n, 2*n:] = dt * eye
+    F[..., 2*n:, :n] = gain * weights
+    F[..., 2*n:, n:2*n] = (gain * dt * np.tril(weights, -1)) - np.diag(np.broadcast_to(k, (n,)))
+    return F
+
+# the matrix S which turns the coefficients c of q_W(s), where
+# s = lambda^2 + k lambda, into those of q_W(lambda^2 + k lambda), c @ S
+def composition_matrix(n, k):
+    powers = [np.array([1.0])]
+    for _ in range(n):
+        powers.append(np.convolve(powers[-1], [1.0, k, 0.0]))
+    S = np.zeros((n + 1, 2*n + 1))
+    for j in range(n + 1):
+        S[j, 2*j:] = powers[n - j]
+    return S
+
+# whether each configuration in a batch of weight matrices is stable, and
+# not within tolerance of being marginally stable
+def batch_stable(weights, k=1, l=1, p=2, q=1, dt=None, tolerance=1e-12):
+    weights = np.asarray(weights, dtype=float)
+    if dt is None and all(np.ndim(param) == 0 for param in (k, l, p, q)):
+        # q_W(s) = sum_j c_j s^(n-j), with s = lambda^2 + k lambda
+        n = weights.shape[-1]
+        gain_weights = l * (p - q) * weights
+        c = characteristic_polynomials(gain_weights)
+        scales = characteristic_scales(np.abs(gain_weights).sum(axis=-1).max(axis=-1), n)
+        S = composition_matrix(n, k)
+        return hurwitz_stable(c @ S, scales @ np.abs(S), tolerance)
+    # repeated eigenvalues are only found to about the square root of the
+    # rounding error, so they are judged with the square root of tolerance
+    if dt is None:
+        J = batch_jacobians(weights, k, l, p, q)
+        return np.linalg.eigvals(J).real.max(axis=-1) < -np.sqrt(tolerance) * np.abs(J).sum(axis=-1).max(axis=-1)
+    F = batch_euler_step_matrices(weights, dt, k, l, p, q)
+    return np.abs(np.linalg.eigvals(F)).max(axis=-1) < 1 - np.sqrt(tolerance) * np.abs(F).sum(axis=-1).max(axis=-1)
@@ -0,0 +1,164 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+import sqlite3
+from collections import OrderedDict
+
+from Homeostat import *
+from stability import *
+
+'''
+    A cache of the stability of Homeostat weight configurations.
+
+    With a discrete weights_set (e.g. np.linspace(-1, 1, 26), as used with
+    random_selector), the same configurations of weights come up again and
+    again, across units and across runs. Their stability only needs to be
+    worked out once: a StabilityCache stores, for each configuration (the
+    weight matrix, quantized to resolution, and the units' k, l, p and q),
+    whether it is stable, and its dominant eigenvalue (see stability.py).
+
+    The most recently used maxsize configurations are kept in memory. If a
+    path is given, every configuration is also stored in an SQLite database
+    at that path, so that the cache persists between runs, and can be shared
+    by the processes of a sweep. The database is opened in WAL mode, so that
+    reading it doesn't wait for other processes' writes, and each new
+    configuration is committed as soon as it is stored, so that the write
+    lock is only held for one insert at a time.
+'''
+class StabilityCache:
+
+    def __init__(self, maxsize=100000, path=None, resolution=1e-9, dt=None, timeout=60):
+        self.maxsize = maxsize
+        self.resolution = resolution
+        # the Euler step which stability is worked out for, or None to use
+        # the continuous-time dynamics
+        self.dt = dt
+        self.entries = OrderedDict() # key -> (stable, dominant eigenvalue), in order of use
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path is not None:
+            # with isolation_level=None, every statement is committed as it
+            # is run. timeout is how long to wait for another process's
+            # write lock, in seconds
+            self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            # commits in WAL mode don't need to wait for the disk, at the
+            # risk of losing the last few entries if the machine fails
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS stability (key BLOB PRIMARY KEY, stable INTEGER, re REAL, im REAL)')
+
+    # the key of a configuration
+    def key(self, weights, k=1, l=1, p=2, q=1):
+        weights = np.asarray(weights, dtype=float)
+        n = len(weights)
+        quantized = np.round(weights / self.resolution).astype(np.int64)
+        params = np.array([np.broadcast_to(param, (n,)) for param in (k, l, p, q)], dtype=float)
+        header = np.array([n, np.nan if self.dt is None else self.dt])
+        return header.tobytes() + quantized.tobytes() + params.tobytes()
+
+    # work out whether a configuration is stable, and its dominant
+    # eigenvalue - the one with the largest real part, or for an Euler
+    # step, the largest magnitude
+    def evaluate(self, weights, k=1, l=1, p=2, q=1):
+        if self.dt is None:
+            eigenvalues = np.linalg.eigvals(homeostat_jacobian(weights, k, l, p, q))
+            dominant = eigenvalues[np.argmax(eigenvalues.real)]
+            return bool(dominant.real < 0), complex(dominant)
+        eigenvalues = np.linalg.eigvals(euler_step_matrix(weights, self.dt, k, l, p, q))
+        dominant = eigenvalues[np.argmax(np.abs(eigenvalues))]
+        return bool(np.abs(dominant) < 1), complex(dominant)
+
+    # (stable, dominant eigenvalue) for a configuration, from the cache if
+    # it is there, otherwise it is worked out and added to the cache
+    def lookup(self, weights, k=1, l=1, p=2, q=1):
+        key = self.key(weights, k, l, p, q)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        if self.db is not None:
+            row = self.db.execute('SELECT stable, re, im FROM stability WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                entry = (bool(row[0]), complex(row[1], row[2]))
+                self.remember(key, entry)
+                return entry
+        self.misses += 1
+        entry = self.evaluate(weights, k, l, p, q)
+        self.remember(key, entry)
+        if self.db is not None:
+            self.db.execute('INSERT OR REPLACE INTO stability VALUES (?, ?, ?, ?)', (key, int(entry[0]), entry[1].real, entry[1].imag))
+        return entry
+
+    def is_stable(self, weights, k=1, l=1, p=2, q=1):
+        return self.lookup(weights, k, l, p, q)[0]
+
+    # add an entry to the in-memory cache, evicting the least recently used
+    # entry if it is full
+    def remember(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def statistics(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else np.nan}
+
+'''
+    An adaptation function which draws new weights as random_selector does,
+    but uses a StabilityCache to skip configurations which are known to be
+    unstable, instead of simulating each of them for test_interval time
+    units. It must be attached to the homeostat which uses it, so that it
+    can see the weights of the other units, e.g.
+
+        cache = StabilityCache(path='stability.db')
+        selector = CachedSelector(cache)
+        homeostat = Homeostat(n_units=4, ..., adapt_fun=selector, weights_set=np.linspace(-1, 1, 26))
+        selector.attach(homeostat)
+
+    When a unit adapts, up to max_tries sets of weights are drawn, and the
+    first which makes the homeostat's configuration stable is used, or the
+    last one drawn if none of them do. The adapting unit is identified by
+    self_ind, which is its index in a Homeostat or VectorHomeostat.
+'''
+class CachedSelector:
+
+    __name__ = 'cached_selector'
+    # like random_selector, which it draws weights with, it only needs the
+    # most recent entry of each history
+    history_window = random_selector.history_window
+
+    def __init__(self, cache, max_tries=10, homeostat=None):
+        self.cache = cache
+        self.max_tries = max_tries
+        self.homeostat = homeostat
+        self.skipped = 0 # the number of configurations which were skipped
+
+    def attach(self, homeostat):
+        self.homeostat = homeostat
+
+    def __call__(self, dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set, self_ind=None, rng=None):
+        weights = random_selector(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set, self_ind=self_ind, rng=rng)
+        if self.homeostat is None or self_ind is None:
+            return weights
+        configuration, (k, l, p, q) = homeostat_params(self.homeostat)
+        for _ in range(self.max_tries - 1):
+            configuration[self_ind] = weights
+            if self.cache.is_stable(configuration, k, l, p, q):
+                break
+            self.skipped += 1
+            weights = random_selector(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set, self_ind=self_ind, rng=rng)
+        return weights
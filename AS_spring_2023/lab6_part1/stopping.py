@@ -0,0 +1,138 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../..')
+from Sandbox import *
+
+'''
+    Criteria for stopping a Homeostat run early.
+
+    A criterion is checked after every step, with check(homeostat, t), and
+    returns True when the run should stop. The criteria work with any of the
+    Homeostats (see all_settled and count_adaptations), and with a
+    HomeostatEnsemble they only stop the run when every member meets them.
+
+    Each criterion says whether the statistics of a run which it stops can
+    be extrapolated to the full duration: if a run stops because it has
+    settled, the units are assumed to stay viable, and not to adapt again,
+    for the rest of the run, so e.g. the time spent adapting is already
+    final. Otherwise (e.g. if it stops after a maximum number of
+    adaptations), the statistics are censored - they only cover the time
+    until the run stopped.
+'''
+
+# whether every unit of a Homeostat is viable and not testing new weights,
+# whether it is made of Units or holds its state in arrays
+def all_settled(homeostat):
+    if hasattr(homeostat, 'testing'):
+        return not np.any(homeostat.testing) and np.all(homeostat.test_viability())
+    for unit in homeostat.units:
+        if unit.testing or not unit.test_viability():
+            return False
+    return True
+
+# the total number of times that the units of a Homeostat have adapted
+def count_adaptations(homeostat):
+    if hasattr(homeostat, 'testing'):
+        if hasattr(homeostat, 'n_members'):
+            # a HomeostatEnsemble has a list of lists of times per member
+            return sum(len(times) for member in homeostat.test_times for times in member)
+        return sum(len(times) for times in homeostat.test_times)
+    return sum(len(unit.test_times) for unit in homeostat.units)
+
+class StoppingCriterion:
+
+    # the reason which is reported when this criterion stops a run
+    reason = 'stopped'
+    # whether a run's statistics can be extrapolated to the full duration
+    # when this criterion stops it
+    extrapolates = False
+
+    def reset(self):
+        pass
+
+    def check(self, homeostat, t):
+        return False
+
+'''
+    Stop once every unit has been viable, and not testing new weights, for
+    settle_time units of time.
+'''
+class Settled(StoppingCriterion):
+
+    reason = 'settled'
+    extrapolates = True
+
+    def __init__(self, settle_time):
+        self.settle_time = settle_time
+        self.reset()
+
+    def reset(self):
+        self.since = None # the time since when every unit has been settled
+
+    def check(self, homeostat, t):
+        if not all_settled(homeostat):
+            self.since = None
+            return False
+        if self.since is None:
+            self.since = t
+        return t - self.since >= self.settle_time
+
+'''
+    Stop once no unit has changed its weights for unchanged_time units of
+    time.
+'''
+class WeightsUnchanged(StoppingCriterion):
+
+    reason = 'weights unchanged'
+    extrapolates = True
+
+    def __init__(self, unchanged_time):
+        self.unchanged_time = unchanged_time
+        self.reset()
+
+    def reset(self):
+        self.n_adaptations = None
+        self.since = None
+
+    def check(self, homeostat, t):
+        n_adaptations = count_adaptations(homeostat)
+        if n_adaptations != self.n_adaptations:
+            self.n_adaptations = n_adaptations
+            self.since = t
+            return False
+        return t - self.since >= self.unchanged_time
+
+'''
+    Stop once the units have adapted max_adaptations times in total.
+'''
+class MaxAdaptations(StoppingCriterion):
+
+    reason = 'max adaptations'
+
+    def __init__(self, max_adaptations):
+        self.max_adaptations = max_adaptations
+
+    def check(self, homeostat, t):
+        return count_adaptations(homeostat) >= self.max_adaptations
+
+# the criteria which can be given by name, e.g. as ('settled', 200), so
+# that they can be passed to run_once as parameters of a sweep
+criteria_by_name = {'settled': Settled, 'weights_unchanged': WeightsUnchanged, 'max_adaptations': MaxAdaptations}
+
+# make a list of criteria from a list of criteria and (name, argument) pairs
+def make_criteria(stop_when):
+    criteria = []
+    for criterion in stop_when or []:
+        if isinstance(criterion, StoppingCriterion):
+            criteria.append(criterion)
+        else:
+            name, argument = criterion
+            criteria.append(criteria_by_name[name](argument))
+    return criteria
+
+# check a list of criteria, and return the first one which is met, if any
+def check_stopping(criteria, homeostat, t):
+    for criterion in criteria:
+        if criterion.check(homeostat, t):
+            return criterion
+    return None
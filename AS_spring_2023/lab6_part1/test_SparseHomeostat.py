@@ -0,0 +1,52 @@
+import unittest
+
+from SparseHomeostat import *
+
+# an adaptation function which doesn't make the self-connection negative
+@history_window(1)
+def unsigned_val(dt, inputs_hist, weights_hist, thetas, theta_dots, weights_set=[], self_ind=None, rng=None):
+    return get_rng(rng).uniform(-1, 1, len(weights_hist[0])).tolist()
+
+'''
+    Tests of the adaptation of SparseHomeostat's self-connections.
+'''
+class Test_self_connections(unittest.TestCase):
+
+    def test_self_edge_first_in_row(self):
+        # unit 1 receives inputs from units 2 and 3, so its own self-edge is
+        # the first entry in its row
+        homeostat = SparseHomeostat(4, sources=[2, 3, 0, 0], targets=[1, 1, 2, 3], upper_viability=1, lower_viability=-1, adapt_fun=random_selector, weights_set=np.linspace(-1, 1, 26), seed=0)
+        self.assertEqual(homeostat.self_ind[1], 0)
+
+        outputs = np.ones(homeostat.n_edges)
+        for _ in range(50):
+            for i in range(1, homeostat.n_units):
+                homeostat.adjust_weights(0.01, i, outputs)
+                self.assertTrue(homeostat.data[homeostat.indptr[i] + homeostat.self_ind[i]] <= 0)
+
+    def test_random_graph(self):
+        homeostat = SparseHomeostat.random_graph(200, 4, upper_viability=1, lower_viability=-1, adapt_fun=random_creeper, graph_seed=0, seed=0)
+        outputs = np.ones(homeostat.n_edges)
+        for i in range(1, homeostat.n_units):
+            homeostat.adjust_weights(0.01, i, outputs)
+        self_weights = homeostat.data[homeostat.indices == homeostat.rows]
+        self.assertTrue(np.all(self_weights[1:] <= 0))
+
+    def test_complete_graph(self):
+        # with a complete graph, the weights from every adaptation function
+        # are used as in Homeostat, whether or not it makes the
+        # self-connections negative
+        n_units = 4
+        sources, targets = np.nonzero(~np.eye(n_units, dtype=bool))
+        for adapt_fun, weights_set in [(unsigned_val, None), (random_val, None), (random_creeper, None), (random_selector, np.linspace(-1, 1, 26))]:
+            sparse = SparseHomeostat(n_units, sources, targets, upper_limit=20, lower_limit=-20, upper_viability=1, lower_viability=-1, adapt_fun=adapt_fun, weights_set=weights_set, record_history=True, seed=0)
+            homeostat = Homeostat(n_units=n_units, upper_limit=20, lower_limit=-20, upper_viability=1, lower_viability=-1, adapt_fun=adapt_fun, weights_set=weights_set, test_interval=10, seed=0)
+            for _ in range(3000):
+                sparse.step(0.01)
+                homeostat.step(0.01)
+            self.assertEqual(sparse.test_times, [unit.test_times for unit in homeostat.units])
+            self.assertTrue(np.allclose(sparse.data.reshape(n_units, n_units), [unit.weights for unit in homeostat.units]))
+            self.assertTrue(np.allclose(np.array(sparse.thetas), np.array([unit.thetas for unit in homeostat.units]).T))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+import multiprocessing
+
+from stability_cache import *
+
+# look up n random configurations in a cache at path, after ready is set,
+# and put the number of entries in the database, or the error, in results
+def look_up_configurations(path, ready, results, n=20, seed=1):
+    ready.wait(10)
+    try:
+        cache = StabilityCache(path=path, timeout=5)
+        rng = np.random.default_rng(seed)
+        for _ in range(n):
+            cache.lookup(rng.uniform(-1, 1, (3, 3)))
+        results.put(cache.db.execute('SELECT COUNT(*) FROM stability').fetchone()[0])
+        cache.close()
+    except Exception as e:
+        results.put(repr(e))
+
+'''
+    Tests of sharing a StabilityCache's database between processes.
+'''
+class Test_shared_database(unittest.TestCase):
+
+    def test_two_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stability.db')
+            ready = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=look_up_configurations, args=(path, ready, results))
+            process.start()
+
+            # this process stores some configurations, and keeps its
+            # connection open while the other process stores its own
+            cache = StabilityCache(path=path)
+            rng = np.random.default_rng(0)
+            for _ in range(20):
+                cache.lookup(rng.uniform(-1, 1, (3, 3)))
+            ready.set()
+            result = results.get(timeout=30)
+            process.join()
+
+            self.assertEqual(result, 40)
+            # and each sees the other's configurations
+            cache.entries.clear()
+            rng = np.random.default_rng(1)
+            for _ in range(20):
+                cache.lookup(rng.uniform(-1, 1, (3, 3)))
+            self.assertEqual(cache.misses, 20)
+            self.assertEqual(cache.hits, 20)
+            cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../../Sandbox_v1_2')
+sys.path.insert(1, '../lab6_part1')
+from Sandbox import *
+
+import os
+import json
+import time
+import platform
+import itertools
+import tracemalloc
+
+from Homeostat import *
+from VectorHomeostat import *
+
+from homeostat_disturbances import *
+
+'''
+    Benchmarks of how fast the Homeostat engines step.
+
+    A benchmark runs a set of standard scenarios, which cover the number of
+    units, dt, the adaptation function, whether the histories are recorded,
+    and the disturbances (none, or the impulses or square wave from
+    homeostat_experiment2, with their times scaled to the run's duration).
+    Each scenario is run with every engine, and the results report, for
+    each one:
+        - steps per second, from the fastest of a few timed runs
+        - the peak memory used while constructing and running the homeostat
+        - the memory (bytes, and blocks) which is still allocated at the end
+          of a run, per step, e.g. for the histories
+    The memory is measured with tracemalloc, in a separate run from the
+    timings, as tracing slows the runs down. CPython does not count every
+    allocation, so the blocks per step are the blocks which each step
+    leaves allocated, rather than all of the allocations it makes.
+
+    The results are saved as JSON, so that a later benchmark can be compared
+    with one which was saved as a baseline, e.g.
+
+        results = benchmark()
+        save_benchmark(results, 'benchmarks.json')
+        ...
+        report(compare(benchmark(), load_benchmark('benchmarks.json')))
+
+    A new engine is benchmarked by adding it to engines, and compared with
+    the object engine (Homeostat) with compare_engines.
+'''
+
+# the adaptation functions which the scenarios use, by name, and the
+# weights set which each one is given
+adapt_funs = {'random_val': (random_val, None),
+              'random_creeper': (random_creeper, None),
+              'random_selector': (random_selector, np.linspace(-1, 1, 26))}
+
+# the parts of a benchmark result which identify its scenario and engine
+scenario_fields = ['engine', 'n_units', 'dt', 'adapt_fun', 'disturbances', 'histories']
+
+# construct a Homeostat, with or without its histories, and return it, and
+# what a DisturbanceSchedule writes into for it, or None to write into its
+# current theta
+def make_object_homeostat(n_units, adapt_fun, weights_set, histories, duration, dt, seed):
+    if histories:
+        record = None
+    else:
+        record = {'thetas': 'off', 'theta_dots': 'off', 'theta_dotdots': 'off', 'inputs_hist': 'off'}
+    homeostat = Homeostat(n_units=n_units, upper_limit=20, lower_limit=-20, upper_viability=1, lower_viability=-1, adapt_fun=adapt_fun, weights_set=weights_set, test_interval=10, record=record, duration=duration, dt=dt, seed=seed)
+    return homeostat, homeostat.units
+
+def make_vector_homeostat(n_units, adapt_fun, weights_set, histories, duration, dt, seed):
+    homeostat = VectorHomeostat(n_units=n_units, upper_limit=20, lower_limit=-20, upper_viability=1, lower_viability=-1, adapt_fun=adapt_fun, weights_set=weights_set, test_interval=10, record_history=histories, seed=seed)
+    # theta is a view of the state, which every step replaces
+    return homeostat, None
+
+# the engines which are benchmarked, by name. Each one is a function with
+# the arguments of make_object_homeostat
+engines = {'object': make_object_homeostat,
+           'vector': make_vector_homeostat}
+
+# the disturbances of a scenario, for a homeostat's units, with the times
+# of the disturbances in homeostat_experiment2 (for a run of 1000) scaled to
+# the duration of the run
+def make_disturbances(disturbances, units, duration):
+    scale = duration / 1000
+    if disturbances == 'impulse':
+        return [ImpulseDisturbanceSource(unit=units[0], start_times=[200 * scale, 300 * scale, 400 * scale, 800 * scale], mag=10),
+                ImpulseDisturbanceSource(unit=units[0], start_times=[250 * scale, 350 * scale, 450 * scale], mag=-10)]
+    if disturbances == 'square':
+        return [SquareWaveDisturbanceSource(unit=units[0], start_times=[50 * scale, 700 * scale], stop_times=[450 * scale], amp=10, phase_shift=10)]
+    return []
+
+# the scenarios for a benchmark, as dicts, for every combination of the
+# given values
+def make_scenarios(n_units=[2, 4, 16, 64], dts=[0.01], adapt_fun_names=list(adapt_funs), disturbances=[None, 'impulse', 'square'], histories=[False, True], engine_names=list(engines)):
+    return [{'engine': engine, 'n_units': n, 'dt': dt, 'adapt_fun': name, 'disturbances': disturbance, 'histories': history}
+            for engine, n, dt, name, disturbance, history in itertools.product(engine_names, n_units, dts, adapt_fun_names, disturbances, histories)]
+
+# construct the homeostat for a scenario, for a run of n_steps, and return
+# it, what its disturbances are written into, and its disturbances
+def setup_scenario(scenario, n_steps, seed=0):
+    dt = scenario['dt']
+    duration = n_steps * dt
+    adapt_fun, weights_set = adapt_funs[scenario['adapt_fun']]
+    homeostat, target = engines[scenario['engine']](scenario['n_units'], adapt_fun, weights_set, scenario['histories'], duration, dt, seed)
+    units = homeostat.units if hasattr(homeostat, 'units') else list(range(scenario['n_units']))
+    disturbances = make_disturbances(scenario['disturbances'], units, duration)
+    # every engine takes the same disturbances, as a schedule
+    schedule = compile_disturbances(disturbances, units, n_steps, dt)
+    return homeostat, target, schedule
+
+# step a homeostat n_steps times, with its disturbances
+def run_steps(homeostat, target, schedule, n_steps, dt):
+    for step in range(n_steps):
+        homeostat.step(dt)
+        schedule.apply(step, homeostat.theta if target is None else target)
+
+# the time to step the homeostat for a scenario n_steps times, not
+# including its construction
+def time_scenario(scenario, n_steps, seed=0):
+    homeostat, target, schedule = setup_scenario(scenario, n_steps, seed)
+    start = time.perf_counter()
+    run_steps(homeostat, target, schedule, n_steps, scenario['dt'])
+    return time.perf_counter() - start
+
+# the memory used by a run of a scenario
+def measure_memory(scenario, n_steps, seed=0):
+    tracemalloc.start()
+    try:
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        start_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        homeostat, target, schedule = setup_scenario(scenario, n_steps, seed)
+        run_steps(homeostat, target, schedule, n_steps, scenario['dt'])
+        end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        # the snapshot's own memory isn't traced
+        end_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    return {'peak_memory': peak_bytes - start_bytes,
+            'bytes_per_step': (end_bytes - start_bytes) / n_steps,
+            'blocks_per_step': (end_blocks - start_blocks) / n_steps}
+
+# benchmark a scenario: the steps per second, from the fastest of repeats
+# timed runs of n_steps, after a shorter run to warm up, and the memory
+# used by a run of n_steps
+def benchmark_scenario(scenario, n_steps=2000, repeats=3, seed=0):
+    time_scenario(scenario, max(1, n_steps // 10), seed)
+    times = [time_scenario(scenario, n_steps, seed) for _ in range(repeats)]
+    result = dict(scenario)
+    result.update({'n_steps': n_steps,
+                   'steps_per_second': n_steps / min(times),
+                   'median_steps_per_second': n_steps / float(np.median(times))})
+    result.update(measure_memory(scenario, n_steps, seed))
+    return result
+
+# details of the machine and software which a benchmark was run on
+def environment():
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine()}
+
+# run a benchmark, over the given scenarios (by default, make_scenarios())
+def benchmark(scenarios=None, n_steps=2000, repeats=3, seed=0, verbose=True):
+    if scenarios is None:
+        scenarios = make_scenarios()
+    results = []
+    for i, scenario in enumerate(scenarios):
+        result = benchmark_scenario(scenario, n_steps, repeats, seed)
+        results.append(result)
+        if verbose:
+            print(str(i + 1) + '/' + str(len(scenarios)), scenario_name(result), '%.0f steps/s' % result['steps_per_second'])
+    return {'environment': environment(), 'results': results}
+
+def save_benchmark(benchmark_results, path):
+    with open(path, 'w') as f:
+        json.dump(benchmark_results, f, indent=1)
+
+def load_benchmark(path):
+    with open(path) as f:
+        return json.load(f)
+
+# a short description of a result's scenario
+def scenario_name(result):
+    return ' '.join(str(field) + '=' + str(result[field]) for field in scenario_fields)
+
+def scenario_key(result):
+    return tuple(result[field] for field in scenario_fields)
+
+'''
+    Compare a benchmark with a baseline, scenario by scenario. Each
+    comparison has the scenario, the steps per second and peak memory of
+    the benchmark and the baseline, and their ratios (benchmark / baseline),
+    and says whether the benchmark is a regression: more than tolerance
+    slower than the baseline, or using more than tolerance more memory.
+    Scenarios which are only in one of the two are left out.
+'''
+def compare(benchmark_results, baseline, tolerance=0.2):
+    baseline_results = {scenario_key(result): result for result in baseline['results']}
+    comparisons = []
+    for result in benchmark_results['results']:
+        base = baseline_results.get(scenario_key(result))
+        if base is None:
+            continue
+        speed_ratio = result['steps_per_second'] / base['steps_per_second']
+        memory_ratio = result['peak_memory'] / base['peak_memory'] if base['peak_memory'] else np.nan
+        comparison = {field: result[field] for field in scenario_fields}
+        comparison.update({'steps_per_second': result['steps_per_second'],
+                           'baseline_steps_per_second': base['steps_per_second'],
+                           'speed_ratio': speed_ratio,
+                           'peak_memory': result['peak_memory'],
+                           'baseline_peak_memory': base['peak_memory'],
+                           'memory_ratio': memory_ratio,
+                           'regression': bool(speed_ratio < 1 - tolerance or memory_ratio > 1 + tolerance)})
+        comparisons.append(comparison)
+    return comparisons
+
+# compare every engine with a reference engine (by default, the object
+# engine) in each scenario of one benchmark, as for compare, where a
+# speed_ratio above 1 means an engine is faster than the reference
+def compare_engines(benchmark_results, reference='object', tolerance=0.2):
+    results = benchmark_results['results']
+    comparisons = []
+    for engine in sorted({result['engine'] for result in results} - {reference}):
+        # match the engine's results with the reference's, by giving the
+        # reference's results the engine's name
+        baseline = {'results': [dict(result, engine=engine) for result in results if result['engine'] == reference]}
+        comparisons += compare({'results': [result for result in results if result['engine'] == engine]}, baseline, tolerance)
+    return comparisons
+
+# print a table of comparisons, from compare or compare_engines
+def report(comparisons):
+    for comparison in comparisons:
+        print('%-90s %10.0f steps/s (%5.2fx) %10.0f bytes peak (%5.2fx)%s' % (scenario_name(comparison), comparison['steps_per_second'], comparison['speed_ratio'], comparison['peak_memory'], comparison['memory_ratio'], '  REGRESSION' if comparison['regression'] else ''))
+    regressions = sum(comparison['regression'] for comparison in comparisons)
+    print(str(regressions) + ' regressions in ' + str(len(comparisons)) + ' scenarios')
+
+if __name__ == '__main__':
+    results = benchmark()
+    save_benchmark(results, 'benchmarks.json')
+    report(compare_engines(results))
+    # compare with a saved baseline, if there is one
+    if os.path.exists('benchmarks_baseline.json'):
+        report(compare(results, load_benchmark('benchmarks_baseline.json')))
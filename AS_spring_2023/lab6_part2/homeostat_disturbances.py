@@ -23,6 +23,13 @@ class ImpulseDisturbanceSource(DisturbanceSource):
 
             self.enabled = False  # unlike a generic DisturbanceSource, this is a one-shot disturbance, and so is automatically disabled immediately after being applied
 
+    # the values which this source would write into the unit's theta after
+    # each step, for steps ending at times ts, and a mask of the steps at
+    # which it would write them (see compile_disturbances)
+    def schedule(self, ts):
+        mask = enabled_steps(self, ts, one_shot=True)
+        return np.full(len(ts), float(self.mag)), mask
+
     # no need to implement reset in this class, as the unit's parameters/attributes
     # are not disturbed
 
@@ -40,5 +47,105 @@ class SquareWaveDisturbanceSource(DisturbanceSource):
         if self.enabled:  # if the disturbance source is enabled, disturb the homeostat essential variable
             self.unit.thetas[-1] = o # only use the signal when disturbance is enabled
 
+    # the values which this source would write into the unit's theta after
+    # each step, for steps ending at times ts, and a mask of the steps at
+    # which it would write them (see compile_disturbances)
+    def schedule(self, ts):
+        sq_wave = self.sq_wave
+        o = np.sign(np.sin(2 * np.pi * sq_wave.freq * (ts + sq_wave.phase_shift)))
+        return sq_wave.offset + (sq_wave.amp * o), enabled_steps(self, ts)
+
     # no need to implement reset in this class, as the unit's parameters/attributes
     # are not disturbed
+
+# for steps ending at times ts, find the steps at which a DisturbanceSource
+# is enabled, following the same rules as DisturbanceSource.step, from the
+# source's initial state: at most one start or stop time is used per step,
+# and a time is used in the first step which ends after it. If one_shot is
+# True, the source is disabled again straight after each step at which it
+# is enabled, as in ImpulseDisturbanceSource
+def enabled_steps(source, ts, one_shot=False):
+    enabled = np.zeros(len(ts), dtype=bool)
+    state = source.init_enabled
+    start_times = list(source.init_start_times)
+    stop_times = list(source.init_stop_times)
+    k = 0
+    while k < len(ts):
+        if state:
+            if not stop_times:
+                enabled[k:] = True
+                break
+            # the source stays enabled until the step at which it is disabled
+            j = max(k, np.searchsorted(ts, stop_times.pop(0), side='right'))
+            enabled[k:j] = True
+            state = False
+        else:
+            if not start_times:
+                break
+            j = max(k, np.searchsorted(ts, start_times.pop(0), side='right'))
+            if j < len(ts):
+                enabled[j] = True
+            state = not one_shot
+        k = j + 1
+    return enabled
+
+'''
+    A precompiled schedule of disturbances, for a run of n_steps steps.
+
+    Every disturbance source in this file works by overwriting the theta of
+    one unit after some steps, and what it writes, and when, does not depend
+    on the homeostat, so it can all be worked out before the run. The
+    schedule holds, for the disturbed units (units), an array of the values
+    to write after each step (values[k] after step k + 1) and a mask of
+    which of them to write, with sources later in the list overriding
+    earlier ones, as they would when stepped in order.
+
+    apply(k, target) writes the values for step k into target, which can be
+    an array of thetas (e.g. VectorHomeostat.theta, or the (members, units)
+    theta of a HomeostatEnsemble), or a list of units (of a Homeostat or a
+    HomeostatEnsemble), in which case unit.thetas[-1] is set, as the sources
+    themselves do. Only the steps in active_steps do anything, so a fast
+    homeostat can take every step between them as a single block.
+'''
+class DisturbanceSchedule:
+
+    def __init__(self, units, values, mask):
+        self.units = np.array(units, dtype=int)
+        self.values = values
+        self.mask = mask
+        self.active_steps = np.flatnonzero(mask.any(axis=1)) if len(self.units) else np.zeros(0, dtype=int)
+        self.active = set(self.active_steps.tolist())
+
+    def __len__(self):
+        return len(self.values)
+
+    # write the disturbances for step k into target, and return whether
+    # there were any
+    def apply(self, k, target):
+        if k not in self.active:
+            return False
+        mask = self.mask[k]
+        if isinstance(target, np.ndarray):
+            target[..., self.units[mask]] = self.values[k, mask]
+        else:
+            for i, value in zip(self.units[mask], self.values[k, mask]):
+                target[i].thetas[-1] = value
+        return True
+
+# compile a list of disturbance sources into a DisturbanceSchedule for
+# n_steps steps of dt, where units is the list of units which the sources
+# refer to (e.g. homeostat.units). The sources are not changed
+def compile_disturbances(disturbances, units, n_steps, dt):
+    # the times at the end of each step, accumulated in the same way as a
+    # source's clock
+    ts = np.cumsum(np.full(n_steps, dt))
+    indices = [next(i for i, unit in enumerate(units) if unit is disturbance.unit) for disturbance in disturbances]
+    disturbed = sorted(set(indices))
+    values = np.zeros((n_steps, len(disturbed)))
+    mask = np.zeros((n_steps, len(disturbed)), dtype=bool)
+    for disturbance, i in zip(disturbances, indices):
+        column = disturbed.index(i)
+        source_values, source_mask = disturbance.schedule(ts)
+        values[source_mask, column] = source_values[source_mask]
+        mask[:, column] |= source_mask
+    return DisturbanceSchedule(disturbed, values, mask)
@@ -5,13 +5,30 @@ sys.path.insert(1, '../lab6_part1')
 from Sandbox import *
 
 import copy as cp
-from tqdm import tqdm
 
 from Homeostat import *
+from HomeostatEnsemble import *
+from stopping import *
+from metrics import *
+from checkpoints import *
 
 from homeostat_disturbances import *
 
-def run_once(plot_data, n_units=4, dt=0.01, viability_scale=1, k=1, duration=1000, experiment=2):
+# stop_when is a list of stopping criteria (see stopping.py), e.g.
+# [('settled', 200)], which can end the run before duration, once there are
+# no more disturbances to come. The returned Homeostat's stop_reason and
+# stop_time say why and when the run ended (stop_reason is None if it ran
+# for the full duration), and censored says whether its statistics only
+# cover the time until it stopped.
+# If metrics is True, or a list of accumulators (see metrics.py), the
+# returned Homeostat's metrics are a StreamingMetrics, which is updated
+# during the run, so its statistics don't depend on any histories.
+# If checkpoint is given (a checkpoint, or the path of a saved one, see
+# checkpoints.py), the run starts from the homeostat in the checkpoint,
+# e.g. one which has already settled, instead of a new random one. Its
+# viability limits are still set by viability_scale, and if a seed is
+# given, its units adapt with new random streams from the seed
+def run_once(plot_data, n_units=4, dt=0.01, viability_scale=1, k=1, duration=1000, experiment=2, seed=None, stop_when=None, metrics=False, checkpoint=None):
     # Homeostat parameters
     upper_limit = 20
     lower_limit = -20
@@ -30,14 +47,28 @@ def run_once(plot_data, n_units=4, dt=0.01, viability_scale=1, k=1, duration=100
     ts = [t]
     # duration = 1000
 
-    # construct Homeostat
-    homeostat = Homeostat(n_units=n_units, upper_limit=upper_limit, lower_limit=lower_limit, upper_viability=upper_viability, lower_viability=lower_viability, adapt_fun=adapt_fun, weights_set=weights_set, test_interval=test_interval)
+    # the state histories are only needed for plotting, so if the run is
+    # not plotted, they are not recorded
+    if plot_data:
+        record = None
+    else:
+        record = {'thetas': 'off', 'theta_dots': 'off', 'theta_dotdots': 'off', 'inputs_hist': 'off'}
+
+    if checkpoint is not None:
+        # restore Homeostat, which carries on from its saved state
+        homeostat = restore_homeostat(checkpoint, record=record, duration=duration, dt=dt, seed=seed)
+        for unit in homeostat.units:
+            unit.upper_viability = upper_viability
+            unit.lower_viability = lower_viability
+    else:
+        # construct Homeostat
+        homeostat = Homeostat(n_units=n_units, upper_limit=upper_limit, lower_limit=lower_limit, upper_viability=upper_viability, lower_viability=lower_viability, adapt_fun=adapt_fun, weights_set=weights_set, test_interval=test_interval, record=record, duration=duration, dt=dt, seed=seed)
 
     # manipulate damping parameters of springs
     for unit in homeostat.units:
         unit.k = k
 
-    if experiment > 0:
+    if experiment > 0 and checkpoint is None:
         # start Homeostat from stable position
         for unit in homeostat.units:
             unit.thetas[-1] = 0
@@ -58,40 +89,146 @@ def run_once(plot_data, n_units=4, dt=0.01, viability_scale=1, k=1, duration=100
     # randomise parameters for system equations
     # homeostat.randomise_params()
 
+    # compile the disturbances into a schedule for the whole run, so that
+    # they don't need to be stepped
+    schedule = compile_disturbances(disturbances, homeostat.units, int(np.ceil(duration / dt)) + 1, dt)
+
+    # the run can only stop early after the last disturbance
+    criteria = make_criteria(stop_when)
+    last_disturbance = schedule.active_steps[-1] if len(schedule.active_steps) else -1
+    homeostat.stop_reason = None
+    homeostat.censored = False
+
+    if metrics:
+        homeostat.metrics = StreamingMetrics(homeostat, None if metrics is True else metrics)
+
     # main Homeostat simulation loop
+    step = 0
     while t < duration:
         homeostat.step(dt)
-        for disturbance in disturbances:
-            disturbance.step(dt)
+        schedule.apply(step, homeostat.units)
+        step += 1
         t += dt
         ts.append(t)
+        if metrics:
+            homeostat.metrics.update(t, dt)
+        if criteria and step > last_disturbance:
+            criterion = check_stopping(criteria, homeostat, t)
+            if criterion is not None:
+                homeostat.stop_reason = criterion.reason
+                homeostat.censored = not criterion.extrapolates
+                break
+    homeostat.stop_time = t
 
     if plot_data:
-        # plot Homeostat essential variables and weights over time
-        fig, ax = plt.subplots(2, 1)
+        plot_run(ts, [unit.thetas for unit in homeostat.units], [unit.weights_hist for unit in homeostat.units], upper_viability, lower_viability, k)
 
-        # plot all homeostat unit variables over time
-        for i, unit in enumerate(homeostat.units):
-            ax[0].plot(ts, unit.thetas, label='Unit ' + str(i) + ': essential variable')
-        ax[0].plot([ts[0], ts[-1]], [upper_viability, upper_viability], 'r--', label='upper viable boundary')
-        ax[0].plot([ts[0], ts[-1]], [lower_viability, lower_viability], 'g--', label='lower viable boundary')
-        ax[0].set_title('Essential variables')
-        ax[0].set_xlabel('t')
-        ax[0].set_ylabel('Essential variable')
-        ax[0].legend()
-
-        # plot all homeostat unit weights over time
-        for i, unit in enumerate(homeostat.units):
-            ax[1].plot(ts, unit.weights_hist, label='Unit ' + str(i) + ': weight')
-        ax[1].set_title('Connection weights')
-        ax[1].set_xlabel('t')
-        ax[1].set_ylabel('Weight')
-        ax[1].legend()
+    return homeostat
 
-        plt.suptitle("Needle spring damping: " + str(k))
+# plot Homeostat essential variables and weights over time, where thetas[i]
+# and weights_hist[i] are the histories of unit i
+def plot_run(ts, thetas, weights_hist, upper_viability, lower_viability, k):
+    fig, ax = plt.subplots(2, 1)
 
+    # plot all homeostat unit variables over time
+    for i, unit_thetas in enumerate(thetas):
+        ax[0].plot(ts, unit_thetas, label='Unit ' + str(i) + ': essential variable')
+    ax[0].plot([ts[0], ts[-1]], [upper_viability, upper_viability], 'r--', label='upper viable boundary')
+    ax[0].plot([ts[0], ts[-1]], [lower_viability, lower_viability], 'g--', label='lower viable boundary')
+    ax[0].set_title('Essential variables')
+    ax[0].set_xlabel('t')
+    ax[0].set_ylabel('Essential variable')
+    ax[0].legend()
+
+    # plot all homeostat unit weights over time
+    for i, unit_weights in enumerate(weights_hist):
+        ax[1].plot(ts, unit_weights, label='Unit ' + str(i) + ': weight')
+    ax[1].set_title('Connection weights')
+    ax[1].set_xlabel('t')
+    ax[1].set_ylabel('Weight')
+    ax[1].legend()
+
+    plt.suptitle("Needle spring damping: " + str(k))
+
+# run an undisturbed Homeostat from a random start until it has settled (or
+# for at most duration), and save a checkpoint of it to path, so that
+# disturbance experiments can start from it with run_once(checkpoint=path)
+def save_settled_checkpoint(path, n_units=4, dt=0.01, viability_scale=1, k=1, duration=1000, settle_time=100, seed=None):
+    homeostat = run_once(plot_data=False, n_units=n_units, dt=dt, viability_scale=viability_scale, k=k, duration=duration, experiment=0, seed=seed, stop_when=[('settled', settle_time)])
+    save_checkpoint(homeostat, path)
     return homeostat
 
+'''
+    Run many Homeostats at once, as a HomeostatEnsemble, with the same setup
+    as in run_once. viability_scales and ks can be given as single values,
+    or as arrays with one value per member of the ensemble, e.g. for a sweep
+    over 20 values of k, with 10 runs for each value:
+
+        ensemble = run_ensemble(n_members=200, ks=np.repeat(np.linspace(0.1, 10, 20), 10))
+
+    The members in plot_members are recorded and plotted, and metrics are
+    streamed, as in run_once.
+'''
+def run_ensemble(n_members, n_units=4, dt=0.01, viability_scales=1, ks=1, duration=1000, experiment=2, plot_members=[], seed=None, metrics=False):
+    # Homeostat parameters
+    upper_limit = 20
+    lower_limit = -20
+    viability_scales = np.broadcast_to(viability_scales, (n_members,))
+    ks = np.broadcast_to(ks, (n_members,))
+    adapt_fun = random_val
+    weights_set = None
+    test_interval = 10
+
+    # # uncomment to use a discrete weight set
+    # adapt_fun = random_selector
+    # weights_set = np.linspace(-1, 1, 26)
+
+    # Simulation parameters
+    t = 0
+    ts = [t]
+
+    # construct ensemble, with per-member viability limits and damping
+    # parameters of springs
+    ensemble = HomeostatEnsemble(n_members=n_members, n_units=n_units, upper_limit=upper_limit, lower_limit=lower_limit, upper_viability=viability_scales, lower_viability=-viability_scales, adapt_fun=adapt_fun, weights_set=weights_set, test_interval=test_interval, k=ks, record_history=list(plot_members) if len(plot_members) else False, seed=seed)
+
+    if experiment > 0:
+        # start Homeostats from stable positions
+        ensemble.theta[:] = 0
+        ensemble.theta_dot[:] = 0
+
+    # the disturbances are applied to unit 0 of every member
+    if experiment == 1:
+        disturbances = [ImpulseDisturbanceSource(unit=ensemble.units[0], start_times=[200, 300, 400, 800], mag=10),
+        ImpulseDisturbanceSource(unit=ensemble.units[0], start_times=[250, 350, 450], mag=-10)]
+    elif experiment == 2:
+        disturbances = [SquareWaveDisturbanceSource(unit=ensemble.units[0], start_times=[50, 700], stop_times=[450], amp=10, phase_shift=10)]
+    else:
+        disturbances = []
+
+    # compile the disturbances into a schedule for the whole run
+    schedule = compile_disturbances(disturbances, ensemble.units, int(np.ceil(duration / dt)) + 1, dt)
+
+    if metrics:
+        ensemble.metrics = StreamingMetrics(ensemble, None if metrics is True else metrics)
+
+    # main simulation loop - all members are stepped together
+    step = 0
+    while t < duration:
+        ensemble.step(dt)
+        schedule.apply(step, ensemble.units)
+        step += 1
+        t += dt
+        ts.append(t)
+        if metrics:
+            ensemble.metrics.update(t, dt)
+
+    for j, member in enumerate(plot_members):
+        thetas = np.array(ensemble.thetas)[:, j]
+        weights_hist = np.array(ensemble.weights_hist)[:, j]
+        plot_run(ts, thetas.T, weights_hist.transpose(1, 0, 2), viability_scales[member], -viability_scales[member], ks[member])
+
+    return ensemble
+
 '''
 	In this example, we simulate the Homeostat a number of times, with a
 	disturbance to one unit that is repeated many times.
@@ -111,7 +248,7 @@ def run_once(plot_data, n_units=4, dt=0.01, viability_scale=1, k=1, duration=100
 
 		The average time for all units over all runs is also printed, at the end.
 '''
-def basic_analysis(n_units=2, dt=0.01, n_runs=1, k=1, viability_scale=2, duration=1000, experiment=2):
+def basic_analysis(n_units=2, dt=0.01, n_runs=1, k=1, viability_scale=2, duration=1000, experiment=2, stop_when=None):
     # n_units = 2 # number of units in Homeostat
     # dt = 0.01 # integration interval
     # n_runs = 1 # number of runs to simulate for per parameter value
@@ -119,11 +256,13 @@ def basic_analysis(n_units=2, dt=0.01, n_runs=1, k=1, viability_scale=2, duratio
     # viability_scale = 1 # scale of +- viability limits
     sum_of_test_t_sums = 0
     for i in range(n_runs):
-        homeostat = run_once(plot_data=i==n_runs-1, n_units=n_units, dt=dt, k=k, viability_scale=viability_scale, duration=duration, experiment=experiment)
+        homeostat = run_once(plot_data=i==n_runs-1, n_units=n_units, dt=dt, k=k, viability_scale=viability_scale, duration=duration, experiment=experiment, stop_when=stop_when)
         test_t_sum = 0
         print("\nRun ", i, "\n=======")
+        if homeostat.stop_reason is not None:
+            print("Stopped at t =", homeostat.stop_time, "(" + homeostat.stop_reason + ")", "- censored" if homeostat.censored else "")
         for i, unit in enumerate(homeostat.units):
-            test_t = sum(unit.testing_hist) * dt
+            test_t = unit.testing_hist.sum() * dt
             test_t_sum += test_t
             print("Unit ", i, " was adapting for ", test_t, " units of time")
         print("Average time adapting per unit: ", test_t_sum/n_units, "\n")
@@ -155,14 +294,12 @@ def param_sweep_1D(n_units=4, n_runs=10, viability_scales=np.linspace(0.2, 1, 5)
     dt = 0.01 # integration interval
     # n_runs = 4 # number of runs to simulate for per parameter value
     # viability_scales = np.linspace(0.2, 1, 5) # parameter values
-    average_times = []
-    for scale in tqdm(viability_scales):
-        adapting_times = 0
-        for i in range(n_runs):
-            homeostat = run_once(plot_data=(i==n_runs-1) and do_plots, n_units=n_units, dt=dt, viability_scale=scale, experiment=experiment)
-            for i, unit in enumerate(homeostat.units):
-                adapting_times += sum(unit.testing_hist) * dt
-        average_times.append(adapting_times / (n_runs*n_units))
+    # all runs for all parameter values are simulated together, as one ensemble
+    scales = np.repeat(viability_scales, n_runs)
+    plot_members = [(i+1)*n_runs - 1 for i in range(len(viability_scales))] if do_plots else []
+    ensemble = run_ensemble(n_members=len(scales), n_units=n_units, dt=dt, viability_scales=scales, experiment=experiment, plot_members=plot_members)
+    adapting_times = (ensemble.testing_steps.sum(axis=1) * dt).reshape(len(viability_scales), n_runs)
+    average_times = adapting_times.sum(axis=1) / (n_runs*n_units)
     plt.figure()
     plt.plot(2*(np.array(viability_scales)), average_times)
     plt.xlabel("Width of viability region")
@@ -179,23 +316,111 @@ def other_param_sweep_1D(n_units=4, n_runs=5, ks = np.linspace(0.1, 10, 20), do_
     dt = 0.01 # integration interval
     # n_runs = 1 # number of runs to simulate for per parameter value
     # ks = np.linspace(0.1, 10, 20) # damping parameter values
-    average_times = []
-    for k in tqdm(ks):
-        adapting_times = 0
-        for i in range(n_runs):
-            homeostat = run_once(plot_data=(i==n_runs-1) and do_plots, n_units=n_units, dt=dt, k=k, experiment=experiment)
-            for i, unit in enumerate(homeostat.units):
-                adapting_times += sum(unit.testing_hist) * dt
-        average_times.append(adapting_times / (n_runs*n_units))
+    # all runs for all parameter values are simulated together, as one ensemble
+    member_ks = np.repeat(ks, n_runs)
+    plot_members = [(i+1)*n_runs - 1 for i in range(len(ks))] if do_plots else []
+    ensemble = run_ensemble(n_members=len(member_ks), n_units=n_units, dt=dt, ks=member_ks, experiment=experiment, plot_members=plot_members)
+    adapting_times = (ensemble.testing_steps.sum(axis=1) * dt).reshape(len(ks), n_runs)
+    average_times = adapting_times.sum(axis=1) / (n_runs*n_units)
     plt.figure()
     plt.plot(ks, average_times)
     plt.xlabel("Needle spring stiffneses")
     plt.ylabel("Average time units were adapting")
     plt.title("Parameter sweep over needle spring damping, with " + str(n_runs) + " runs")
 
+'''
+	A continuation sweep. Instead of starting a new random Homeostat for every
+	parameter value, each run carries its settled state and weights on from
+	one value to the next, so that a run only has to adapt if the new value
+	makes its current configuration unstable (or unviable). Sweeping up and
+	then back down (see there_and_back) shows whether the Homeostat's
+	behaviour depends on the direction of the sweep, i.e. whether there is
+	hysteresis.
+
+	param is 'k', 'viability_scale', or another parameter of the units (e.g.
+	'l'). The runs are simulated together, as the members of one ensemble.
+	At each value, the members are stepped until every one of them has been
+	viable, and not adapting, for settle_time units of time, or for at most
+	max_duration. If perturbation is not 0, the members' thetas are moved by
+	random amounts, with that standard deviation, when the value changes.
+	Before the first value, the members are settled from their random
+	starts in the same way.
+
+	Returns a dict of (n_values, n_runs) arrays: the number of adaptations
+	the members made at each value, the time they spent adapting, the time
+	it took them to settle (nan if they didn't), and whether they settled,
+	and the time which was simulated at each value.
+'''
+def continuation_sweep_1D(param='k', values=np.linspace(0.1, 10, 20), n_units=4, n_runs=5, dt=0.01, viability_scale=1, k=1, settle_time=50, max_duration=1000, perturbation=0, seed=None):
+    ensemble = HomeostatEnsemble(n_members=n_runs, n_units=n_units, upper_limit=20, lower_limit=-20, upper_viability=viability_scale, lower_viability=-viability_scale, adapt_fun=random_val, test_interval=10, k=k, seed=seed)
+    rng = get_rng(ensemble.rng)
+
+    # step the ensemble until every member has settled, and return the
+    # time it took each member to settle, and the time which was simulated
+    def settle():
+        t = 0
+        since = np.full(n_runs, np.inf) # when each member's current settled period started
+        while t < max_duration:
+            ensemble.step(dt)
+            t += dt
+            settled = ~((ensemble.theta > ensemble.upper_viability) | (ensemble.theta < ensemble.lower_viability) | ensemble.testing).any(axis=1)
+            since = np.where(settled, np.minimum(since, t), np.inf)
+            if (t - since >= settle_time).all():
+                break
+        return np.where(t - since >= settle_time, since, np.nan), t
+
+    settle()
+    results = {name: np.zeros((len(values), n_runs)) for name in ['n_adaptations', 'adapting_time', 'settle_time']}
+    results['settled'] = np.zeros((len(values), n_runs), dtype=bool)
+    results['simulated_time'] = np.zeros(len(values))
+    for i, value in enumerate(values):
+        if param == 'viability_scale':
+            ensemble.upper_viability = ensemble.member_param(value)
+            ensemble.lower_viability = ensemble.member_param(-value)
+        else:
+            setattr(ensemble, param, ensemble.member_param(value))
+        if perturbation:
+            ensemble.theta = ensemble.theta + rng.normal(0, perturbation, ensemble.theta.shape)
+
+        n_adaptations = ensemble.n_adaptations.sum(axis=1)
+        testing_steps = ensemble.testing_steps.sum(axis=1)
+        settle_times, simulated_time = settle()
+        results['n_adaptations'][i] = ensemble.n_adaptations.sum(axis=1) - n_adaptations
+        results['adapting_time'][i] = (ensemble.testing_steps.sum(axis=1) - testing_steps) * dt
+        results['settle_time'][i] = settle_times
+        results['settled'][i] = ~np.isnan(settle_times)
+        results['simulated_time'][i] = simulated_time
+    return results
+
+# a list of parameter values which goes up, and then back down again, for
+# a continuation sweep which looks for hysteresis
+def there_and_back(values):
+    values = np.asarray(values)
+    return np.concatenate((values, values[-2::-1]))
+
+# plot the mean number of adaptations per run at each value of a
+# continuation sweep, with the sweep up and the sweep back down in
+# different colours, if values came from there_and_back
+def plot_continuation(values, results, param='k'):
+    values = np.asarray(values)
+    mean_adaptations = results['n_adaptations'].mean(axis=1)
+    turn = int(np.argmax(values)) + 1
+    plt.figure()
+    plt.plot(values[:turn], mean_adaptations[:turn], 'o-', label='increasing ' + param)
+    if turn < len(values):
+        plt.plot(values[turn-1:], mean_adaptations[turn-1:], 's--', label='decreasing ' + param)
+    plt.xlabel(param)
+    plt.ylabel("Average number of adaptations per run")
+    plt.title("Continuation sweep over " + param + ", with " + str(results['n_adaptations'].shape[1]) + " runs")
+    plt.legend()
+
 
-# basic_analysis(n_runs=2, n_units=4, k=1, viability_scale=1, duration=1000, experiment=0)
-# param_sweep_1D(n_units=2, n_runs=4, viability_scales=np.linspace(0.2, 1, 10), do_plots=True, experiment=0)
-other_param_sweep_1D(n_units=4, n_runs=4, do_plots=True, ks=np.linspace(0.1, 10, 3), experiment=0)
+# the examples are only run when this file is run as a script, so that
+# run_once can be imported by the worker processes of a parallel sweep (see
+# homeostat_sweeps.py)
+if __name__ == '__main__':
+    # basic_analysis(n_runs=2, n_units=4, k=1, viability_scale=1, duration=1000, experiment=0)
+    # param_sweep_1D(n_units=2, n_runs=4, viability_scales=np.linspace(0.2, 1, 10), do_plots=True, experiment=0)
+    other_param_sweep_1D(n_units=4, n_runs=4, do_plots=True, ks=np.linspace(0.1, 10, 3), experiment=0)
 
-plt.show()
+    plt.show()
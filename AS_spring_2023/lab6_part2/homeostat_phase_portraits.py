@@ -7,6 +7,7 @@ from Sandbox import *
 import copy as cp
 
 from Homeostat import *
+from phase_space import *
 
 # construct a Homeostat unit. this is the unit which we will study
 unit0 = Unit(lower_viability=-np.Inf, upper_viability=np.Inf, test_interval=10, # add a new Unit to the Homeostat
@@ -48,16 +49,8 @@ lims = (-15, 15)
 plot_angles = np.linspace(*lims, n)
 thetas, thetadots = np.meshgrid(plot_angles, plot_angles)
 
-# for each point on the quiver plot, calculate the acceleration
-thetadotdots = np.zeros([n, n])
-for i in range(len(thetas[0])):
-    for j in range(len(thetas[0])):
-        theta = thetas[i][j]
-        thetadot = thetadots[i][j]
-        unit0.thetas[-1] = theta # set unit state variables to values from grid
-        unit0.theta_dots[-1] = thetadot
-        unit0.step(dt) # step unit to find new acceleration value
-        thetadotdots[i][j] = unit0.theta_dotdots[-1] # store acceleration value
+# calculate the acceleration at every point on the quiver plot at once
+_, thetadotdots = vector_field(unit0, thetas, thetadots)
 
 # produce quiver plot to show field for unit0
 fig, ax = plt.subplots()
@@ -69,40 +62,22 @@ ax.quiver(thetas, thetadots, thetadots, thetadotdots)
 ax.plot([10, 10], [-15, 15], 'r--', linewidth='2')
 ax.plot([-10, -10], [-15, 15], 'r--', linewidth='2')
 
-# run the simulation 20 times from random initial states
-for _ in range(20):
-    # randomise essential variable
-    theta0 = random_in_interval(minimum=-15, maximum=15)
-    # randomise rate of change of essential variable
-    theta_dot0 = random_in_interval(minimum=-15, maximum=15)
-    # construct unit0 - this is the unit we are studying
-    unit0 = Unit(lower_viability=-np.Inf, upper_viability=np.Inf, test_interval=10, # add a new Unit to the Homeostat
-                 theta0=theta0,
-                 theta_dot0=theta_dot0,
-                 adapt_fun = random_val
-                 )
-
-    unit1 = Unit(lower_viability=-np.Inf, upper_viability=np.Inf, test_interval=10, # add a new Unit to the Homeostat
-                 theta0=unit1_output,
-                 theta_dot0=0,
-                 adapt_fun = random_val
-                 )
-
-    # connect units
-    # note: unit 0 is connected to itself
-    #       unit 1 is connected to unit 0, but nothing is connected to unit 1
-    unit0.add_connection(unit0, w00)
-    unit0.add_connection(unit1, w10)
-
-    # run simulation for a fixed number of steps
-    for _ in range(1000):
-        unit0.step(dt)
-
+# run the simulation 20 times from random initial states, all at once
+n_runs = 20
+# randomise essential variable
+theta0s = np.random.uniform(-15, 15, n_runs)
+# randomise rate of change of essential variable
+theta_dot0s = np.random.uniform(-15, 15, n_runs)
+# run simulations for a fixed number of steps - unit1 is still held at
+# its constant output
+states = trajectories(unit0, theta0s, theta_dot0s, 1000, dt)
+
+for run in states:
     # plot lines of behaviour from simulation run
     # this plots a circle at the *beginning* of the line, so we can tell which direction it is moving in
-    plt.plot(unit0.thetas[1], unit0.theta_dots[1], 'bo')
+    plt.plot(run[0, 0], run[0, 1], 'bo')
     # this plots the actual line of behaviour
-    plt.plot(unit0.thetas[1:], unit0.theta_dots[1:], 'b--')
+    plt.plot(run[:, 0], run[:, 1], 'b--')
 
 
 # set axis limits
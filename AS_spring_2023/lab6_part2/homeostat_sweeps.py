@@ -0,0 +1,197 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../../Sandbox_v1_2')
+sys.path.insert(1, '../lab6_part1')
+from Sandbox import *
+
+import os
+import json
+import hashlib
+import inspect
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from homeostat_experiment2 import run_once
+
+'''
+    Parallel, resumable parameter sweeps over the arguments of run_once.
+
+    A sweep is given as a grid of parameter values, e.g.
+
+        grid = {'k': np.linspace(0.1, 10, 20), 'viability_scale': np.linspace(0.2, 1, 5)}
+
+    and every combination of values in the grid is run n_runs times. Each
+    (combination, run) pair is a task, which is run in a pool of worker
+    processes, with its own seed, which is derived from the sweep's seed,
+    the task's parameters and its run number, and passed to run_once, so a
+    task gives the same result whichever worker runs it, in whichever order,
+    and whichever other tasks are in the sweep.
+
+    As each task finishes, its metrics are appended to a results file, with
+    one JSON record per line. If a sweep is interrupted, running it again
+    with the same results file only runs the tasks which are not in the file
+    yet.
+'''
+
+# the default metrics for a run: the time each unit spent adapting, which is
+# what basic_analysis and the 1D sweeps in homeostat_experiment2 report, and
+# the number of times each unit adapted, and if the run was stopped early
+# (see the stop_when argument of run_once), why and when
+def adapting_metrics(homeostat, params):
+    adapting_times = [float(unit.testing_hist.sum() * params['dt']) for unit in homeostat.units]
+    return {'adapting_times': adapting_times,
+            'mean_adapting_time': float(np.mean(adapting_times)),
+            'n_adaptations': [len(unit.test_times) for unit in homeostat.units],
+            'stop_reason': homeostat.stop_reason,
+            'stop_time': float(homeostat.stop_time),
+            'censored': homeostat.censored}
+
+# the statistics which were streamed during a run (see metrics.py), for
+# sweeps with fixed_params={'metrics': True}, which don't rely on any of the
+# units' histories
+def streamed_metrics(homeostat, params):
+    results = homeostat.metrics.results()
+    results.update({'mean_adapting_time': float(np.mean(results['time_adapting'])),
+                    'stop_reason': homeostat.stop_reason,
+                    'stop_time': float(homeostat.stop_time),
+                    'censored': homeostat.censored})
+    return results
+
+# convert NumPy values to plain Python values, so that they can be written
+# as JSON
+def to_json_value(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(v) for v in value]
+    if isinstance(value, dict):
+        return {key: to_json_value(v) for key, v in value.items()}
+    return value
+
+# the full list of tasks for a sweep, as dicts of {'params', 'run', 'seed'},
+# where params are all of the arguments to run_once (apart from plot_data
+# and seed), including the defaults
+def make_tasks(grid, n_runs=1, fixed_params={}, seed=0):
+    names = list(grid.keys())
+    tasks = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        params = dict(fixed_params)
+        params.update(zip(names, values))
+        bound = inspect.signature(run_once).bind(plot_data=False, **params)
+        bound.apply_defaults()
+        params = to_json_value(dict(bound.arguments))
+        del params['plot_data']
+        del params['seed']
+        for run in range(n_runs):
+            tasks.append({'params': params, 'run': run, 'seed': seed})
+    return tasks
+
+# a key which identifies a task (or its record) in the results file
+def task_key(task):
+    return json.dumps([task['params'], task['run'], task.get('seed')], sort_keys=True)
+
+# the spawn key of a task's random streams, from a hash of the task's key,
+# so that it doesn't depend on where the task is in the sweep, and tasks
+# with different parameters or runs have different streams
+def task_spawn_key(task):
+    digest = hashlib.sha256(task_key(task).encode()).digest()
+    return (int.from_bytes(digest[:16], 'little'),)
+
+# simulate a single task, and return its record for the results file
+def run_task(task, metrics=adapting_metrics):
+    seed_sequence = np.random.SeedSequence(task['seed'], spawn_key=task_spawn_key(task))
+    homeostat = run_once(plot_data=False, seed=seed_sequence, **task['params'])
+    return {'params': task['params'], 'run': task['run'], 'seed': task['seed'],
+            'metrics': to_json_value(metrics(homeostat, task['params']))}
+
+# load the records in a results file. if the last line was only partly
+# written when a sweep was interrupted, it is removed from the file
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)
+    return [json.loads(line) for line in data[:end].decode().splitlines() if line.strip()]
+
+'''
+    Run a sweep, writing the results to results_path, and return the records
+    of all of its tasks, in the order of make_tasks.
+
+    Tasks which already have a record in results_path (with the same
+    parameters, run and seed) are not run again. n_workers is the number of
+    processes to use (by default, one per core), and with n_workers=1, tasks
+    are run in this process, which is useful for debugging. metrics must be
+    a function which can be pickled, i.e. one defined at the top level of a
+    module, which takes a Homeostat and the parameters it was run with, and
+    returns a dict of values which can be written as JSON.
+'''
+def sweep(grid, results_path, n_runs=1, fixed_params={}, seed=0, n_workers=None, metrics=adapting_metrics, verbose=True):
+    tasks = make_tasks(grid, n_runs, fixed_params, seed)
+
+    done = {}
+    for record in load_results(results_path):
+        done[task_key(record)] = record
+    todo = [task for task in tasks if task_key(task) not in done]
+    if verbose:
+        print(len(tasks) - len(todo), 'of', len(tasks), 'tasks already done')
+
+    with open(results_path, 'a') as f:
+        # write each record as soon as its task finishes
+        def save(record):
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            done[task_key(record)] = record
+            if verbose:
+                print('task done (' + str(len(done)) + '/' + str(len(tasks)) + ')')
+
+        if n_workers == 1:
+            for task in todo:
+                save(run_task(task, metrics))
+        elif todo:
+            executor = ProcessPoolExecutor(max_workers=n_workers)
+            try:
+                futures = [executor.submit(run_task, task, metrics) for task in todo]
+                for future in as_completed(futures):
+                    save(future.result())
+            finally:
+                # if the sweep is interrupted, don't start any more tasks
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    return [done[task_key(task)] for task in tasks]
+
+# arrange one metric from the records of a sweep as an array, with one axis
+# per parameter in the grid (in the order of the grid) and a last axis for
+# the runs. The record of each task of the sweep (with the given grid,
+# n_runs, fixed_params and seed) is looked up by its key, so records can
+# be in any order, and records of other sweeps are left out
+def results_array(records, grid, n_runs, metric='mean_adapting_time', fixed_params={}, seed=0):
+    shape = [len(values) for values in grid.values()] + [n_runs]
+    by_key = {task_key(record): record for record in records}
+    values = [by_key[task_key(task)]['metrics'][metric] for task in make_tasks(grid, n_runs, fixed_params, seed)]
+    return np.array(values).reshape(shape + list(np.shape(values[0])))
+
+'''
+	A 2D parameter sweep, over the damping coefficient and the width of the
+	viability region, which plots the average time the units spent adapting
+	for every pair of values. Run this file again after interrupting it, and
+	it will continue from where it stopped.
+'''
+if __name__ == '__main__':
+    grid = {'k': np.linspace(0.1, 10, 10), 'viability_scale': np.linspace(0.2, 1, 5)}
+    n_runs = 10
+    fixed_params = {'n_units': 4, 'duration': 1000, 'experiment': 0}
+    records = sweep(grid, 'sweep_k_viability.jsonl', n_runs=n_runs, fixed_params=fixed_params)
+    average_times = results_array(records, grid, n_runs, fixed_params=fixed_params).mean(axis=-1)
+
+    plt.figure()
+    plt.imshow(average_times.T, origin='lower', aspect='auto', extent=[grid['k'][0], grid['k'][-1], 2*grid['viability_scale'][0], 2*grid['viability_scale'][-1]])
+    plt.colorbar(label='Average time units were adapting')
+    plt.xlabel('Needle spring damping')
+    plt.ylabel('Width of viability region')
+    plt.title('Parameter sweep, with ' + str(n_runs) + ' runs')
+    plt.show()
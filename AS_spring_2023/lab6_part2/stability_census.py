@@ -0,0 +1,317 @@
+import sys
+# relative path to folder which contains the Sandbox module
+sys.path.insert(1, '../../Sandbox_v1_2')
+sys.path.insert(1, '../lab6_part1')
+from Sandbox import *
+
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from stability import *
+from homeostat_sweeps import load_results, to_json_value
+
+'''
+    How likely is a Homeostat to be ultrastable? This counts the fraction of
+    the configurations of weights, drawn from a discrete weights_set (as
+    random_selector draws them), which are stable, either by enumerating
+    every configuration or by stratified sampling, for given n_units and
+    unit parameters (k, l, p, q, which are the same for every unit, and dt,
+    for the stability of the Euler steps, or None for the continuous-time
+    dynamics - see stability.py).
+
+    Enumeration
+        A configuration is a weight matrix, which is numbered in mixed radix,
+        with the first n - 1 rows (the "prefix") as the high digits, and the
+        last row as the low digits. Two things make the count feasible for
+        e.g. 26^9 configurations of 3 units:
+            - if weights_set is symmetric about 0, and doesn't include 0,
+              then flipping the signs of some units (W -> D W D, with D a
+              diagonal matrix of +-1) gives a similar matrix, with the same
+              stability, so only the configurations whose first row has
+              positive weights to the other units are counted, and each
+              stands for 2^(n - 1) configurations
+            - the characteristic polynomial of a matrix is linear in each of
+              its rows, so for each prefix, the polynomials of all of the
+              possible last rows are found with one matrix product, and
+              classified with the Routh-Hurwitz test (see batch_stable)
+        The prefixes are split into shards, which are run in a pool of
+        worker processes. Configurations which are only marginally stable
+        (with eigenvalues on the imaginary axis, e.g. singular weight
+        matrices), up to a tolerance for rounding, are counted as not
+        stable (see batch_stable).
+
+    Sampling
+        For larger spaces, the configurations are split into strata by the
+        values of the self-connections (the diagonal), which have the most
+        effect on stability, and the same number of random configurations
+        is drawn from each stratum. The estimate is the mean of the strata's
+        fractions, with its standard error.
+
+    As in homeostat_sweeps.py, the result of every shard is appended to a
+    results file, with one JSON record per line, so that an interrupted
+    census carries on from where it stopped, and the results of earlier
+    censuses are reused. fraction_table summarises every census in a file.
+'''
+
+'''
+    The space of weight matrices of n_units units, with entries from
+    weights_set. If negative_self is True, the self-connections are only
+    drawn from the negative values, -abs(weights_set), as the example
+    adaptation functions make them.
+'''
+class WeightSpace:
+
+    def __init__(self, n_units, weights_set, negative_self=True, use_symmetry=True):
+        self.n_units = n_units
+        weights_set = np.unique(np.asarray(weights_set, dtype=float))
+        # sets such as np.linspace(-1, 1, 26) are only symmetric up to
+        # rounding, so they are made exactly symmetric, so that -abs(w)
+        # gives the same values for w and -w
+        if np.allclose(weights_set, -weights_set[::-1]):
+            positive = weights_set[weights_set > 0]
+            weights_set = np.concatenate((-positive[::-1], weights_set[weights_set == 0][:1], positive))
+        self.weights_set = weights_set
+        self.negative_self = negative_self
+        # whether the sign-flip symmetry can be used
+        self.symmetric = bool(use_symmetry and n_units > 1 and np.array_equal(weights_set, -weights_set[::-1]) and not np.any(weights_set == 0))
+        self.multiplicity = 2 ** (n_units - 1) if self.symmetric else 1
+
+        # the values which each entry of the matrix can take, in row-major order
+        self.choices = []
+        for i in range(n_units):
+            for j in range(n_units):
+                if i == j:
+                    self.choices.append(np.unique(-np.abs(weights_set)) if negative_self else weights_set)
+                elif i == 0 and self.symmetric:
+                    self.choices.append(weights_set[weights_set > 0])
+                else:
+                    self.choices.append(weights_set)
+        self.radices = [len(choice) for choice in self.choices]
+        self.n_prefixes = int(np.prod(self.radices[:-n_units], dtype=object))
+        self.n_last_rows = int(np.prod(self.radices[-n_units:], dtype=object))
+        # every configuration which is enumerated stands for multiplicity configurations
+        self.n_configurations = self.n_prefixes * self.n_last_rows * self.multiplicity
+
+    # the weights of the entries with the given digits, as (batch, n_entries)
+    def entries(self, digits, first=0):
+        return np.stack([self.choices[first + e][digits[e]] for e in range(len(digits))], axis=-1)
+
+    # the prefixes with indices start..stop-1, as (batch, n - 1, n) arrays
+    def prefixes(self, start, stop):
+        n = self.n_units
+        digits = np.unravel_index(np.arange(start, stop), self.radices[:-n])
+        return self.entries(digits).reshape(-1, n - 1, n)
+
+    # every possible last row, as an (n_last_rows, n) array
+    def last_rows(self):
+        n = self.n_units
+        digits = np.unravel_index(np.arange(self.n_last_rows), self.radices[-n:])
+        return self.entries(digits, first=len(self.choices) - n)
+
+    # a description of the space, which identifies it in a results file
+    def description(self):
+        return {'n_units': self.n_units, 'weights_set': self.weights_set.tolist(), 'negative_self': self.negative_self}
+
+# the number of stable configurations whose prefixes have indices
+# start..stop-1, out of the configurations of the space which these stand
+# for. Prefixes are processed in batches of about batch_size configurations
+def count_stable(space, start, stop, k=1, l=1, p=2, q=1, dt=None, batch_size=2**18):
+    n = space.n_units
+    last_rows = space.last_rows()
+    gain = l * (p - q)
+    linear = dt is None and all(np.ndim(param) == 0 for param in (k, l, p, q))
+    if linear:
+        # the matrix which turns the coefficients of q_W(s) into those of
+        # q_W(lambda^2 + k lambda), as in batch_stable
+        S = composition_matrix(n, k)
+        # the last row of the matrices with last row 0 and e_j
+        unit_rows = np.concatenate((np.zeros((1, n)), np.eye(n)))
+        last_norms = np.abs(last_rows).sum(axis=1)
+
+    stable = 0
+    step = max(1, batch_size // len(last_rows))
+    for first in range(start, stop, step):
+        prefixes = space.prefixes(first, min(first + step, stop))
+        if linear:
+            # c(last row) = c(0) + sum_j last_row[j] * (c(e_j) - c(0))
+            matrices = np.concatenate((np.repeat(prefixes[:, None], n + 1, axis=1), np.broadcast_to(unit_rows[None, :, None, :], (len(prefixes), n + 1, 1, n))), axis=2)
+            c = characteristic_polynomials(gain * matrices)
+            c0 = c[:, 0]
+            D = c[:, 1:] - c0[:, None]
+            coefficients = c0[:, None] + last_rows @ D
+            # rounding errors are judged against bounds on the sizes of the
+            # coefficients, as in batch_stable. The bounds only depend on the
+            # largest absolute row sum of each matrix, which takes few values,
+            # so they are found once for each value and looked up
+            prefix_norms = np.abs(prefixes).sum(axis=2).max(axis=1)
+            norms = np.unique(np.concatenate((prefix_norms, last_norms)))
+            norm_scales = characteristic_scales(abs(gain) * norms, n) @ np.abs(S)
+            norm_indices = np.maximum(np.searchsorted(norms, prefix_norms)[:, None], np.searchsorted(norms, last_norms))
+            stable += int(np.count_nonzero(hurwitz_stable(coefficients @ S, norm_scales[norm_indices])))
+        else:
+            weights = np.concatenate((np.repeat(prefixes[:, None], len(last_rows), axis=1), np.broadcast_to(last_rows[None, :, None, :], (len(prefixes), len(last_rows), 1, n))), axis=2)
+            stable += int(np.count_nonzero(batch_stable(weights.reshape(-1, n, n), k, l, p, q, dt)))
+    return stable * space.multiplicity, (stop - start) * space.n_last_rows * space.multiplicity
+
+# the number of stable configurations in each of the strata first..last-1
+# (see sampled_census), from n_samples random configurations per stratum
+def sample_strata(space, first, last, n_samples, k=1, l=1, p=2, q=1, dt=None, seed=None, batch_size=2**16):
+    n = space.n_units
+    rng = np.random.default_rng(seed)
+    diagonal = [i * n + i for i in range(n)]
+    strata = np.unravel_index(np.arange(first, last), [space.radices[e] for e in diagonal])
+    counts = []
+    for s in range(last - first):
+        stable = 0
+        for done in range(0, n_samples, batch_size):
+            count = min(batch_size, n_samples - done)
+            digits = [np.full(count, strata[diagonal.index(e)][s]) if e in diagonal else rng.integers(0, space.radices[e], count) for e in range(n * n)]
+            stable += int(np.count_nonzero(batch_stable(space.entries(digits).reshape(-1, n, n), k, l, p, q, dt)))
+        counts.append(stable)
+    return counts
+
+# run a single shard of a census, and return its record for the results file
+def run_shard(task):
+    space = WeightSpace(**task['space'], use_symmetry=task['method'] == 'exhaustive')
+    params = task['params']
+    if task['method'] == 'exhaustive':
+        stable, total = count_stable(space, task['start'], task['stop'], **params)
+        return dict(task, stable=stable, total=total)
+    seed = np.random.SeedSequence(task['seed'], spawn_key=(task['shard'],))
+    counts = sample_strata(space, task['start'], task['stop'], task['n_samples'], seed=seed, **params)
+    return dict(task, counts=counts)
+
+# a key which identifies a census in the results file
+def census_key(space, params, method, n_samples=None, seed=None):
+    return json.dumps([space, params, method, n_samples, seed], sort_keys=True)
+
+# run the tasks of a census which are not in the results file yet, and
+# return the records of all of its shards
+def run_census(tasks, results_path, n_workers=None, verbose=True):
+    done = {}
+    for record in load_results(results_path):
+        done[(record['key'], record['shard'])] = record
+    todo = [task for task in tasks if (task['key'], task['shard']) not in done]
+    if verbose:
+        print(len(tasks) - len(todo), 'of', len(tasks), 'shards already done')
+
+    with open(results_path, 'a') as f:
+        def save(record):
+            f.write(json.dumps(to_json_value(record)) + '\n')
+            f.flush()
+            done[(record['key'], record['shard'])] = record
+            if verbose:
+                print('shard', record['shard'], 'done')
+
+        if n_workers == 1:
+            for task in todo:
+                save(run_shard(task))
+        elif todo:
+            executor = ProcessPoolExecutor(max_workers=n_workers)
+            try:
+                futures = [executor.submit(run_shard, task) for task in todo]
+                for future in as_completed(futures):
+                    save(future.result())
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    return [done[(task['key'], task['shard'])] for task in tasks]
+
+'''
+    Count the stable configurations of n_units units with weights from
+    weights_set exactly, and return a summary of the census (see
+    summarise). The space is split into n_shards shards (by default, about
+    2^24 configurations each), which are run in n_workers processes.
+'''
+def census(n_units, weights_set, results_path, k=1, l=1, p=2, q=1, dt=None, negative_self=True, n_shards=None, n_workers=None, verbose=True):
+    space = WeightSpace(n_units, weights_set, negative_self)
+    params = {'k': k, 'l': l, 'p': p, 'q': q, 'dt': dt}
+    if n_shards is None:
+        n_shards = max(1, min(space.n_prefixes, -(-space.n_prefixes * space.n_last_rows // 2**24)))
+    key = census_key(space.description(), params, 'exhaustive')
+    bounds = np.linspace(0, space.n_prefixes, n_shards + 1).astype(np.int64)
+    tasks = [{'key': key, 'space': space.description(), 'params': params, 'method': 'exhaustive', 'shard': s, 'start': int(bounds[s]), 'stop': int(bounds[s + 1]), 'end': space.n_prefixes} for s in range(n_shards)]
+    return summarise(run_census(tasks, results_path, n_workers, verbose))
+
+'''
+    Estimate the fraction of stable configurations by stratified sampling,
+    with n_samples configurations from each stratum of self-connections.
+    If there are more than max_strata combinations of self-connections,
+    only the first ones (in the order of the units) are used to define the
+    strata. Returns a summary of the census (see summarise).
+'''
+def sampled_census(n_units, weights_set, results_path, n_samples=1000, k=1, l=1, p=2, q=1, dt=None, negative_self=True, max_strata=4096, n_shards=None, seed=0, n_workers=None, verbose=True):
+    space = WeightSpace(n_units, weights_set, negative_self, use_symmetry=False)
+    params = {'k': k, 'l': l, 'p': p, 'q': q, 'dt': dt}
+    n_strata = 1
+    for i in range(n_units):
+        if n_strata * space.radices[i * n_units + i] > max_strata:
+            break
+        n_strata *= space.radices[i * n_units + i]
+    if n_shards is None:
+        n_shards = min(n_strata, 64)
+    key = census_key(space.description(), params, 'sampled', n_samples, seed)
+    bounds = np.linspace(0, n_strata, n_shards + 1).astype(np.int64)
+    tasks = [{'key': key, 'space': space.description(), 'params': params, 'method': 'sampled', 'n_samples': n_samples, 'seed': seed, 'shard': s, 'start': int(bounds[s]), 'stop': int(bounds[s + 1]), 'end': n_strata} for s in range(n_shards)]
+    return summarise(run_census(tasks, results_path, n_workers, verbose))
+
+# combine the records of the shards of one census into its stable fraction
+# (and, for a sampled census, the standard error of the fraction)
+def summarise(records):
+    first = records[0]
+    summary = dict(first['space'], **first['params'])
+    del summary['weights_set']
+    summary['n_weights'] = len(first['space']['weights_set'])
+    summary['method'] = first['method']
+    if first['method'] == 'exhaustive':
+        summary['stable'] = sum(record['stable'] for record in records)
+        summary['configurations'] = sum(record['total'] for record in records)
+        summary['fraction'] = summary['stable'] / summary['configurations']
+        summary['stderr'] = 0.0
+    else:
+        fractions = np.concatenate([record['counts'] for record in records]) / first['n_samples']
+        summary['samples'] = len(fractions) * first['n_samples']
+        summary['fraction'] = float(fractions.mean())
+        # the strata are the same size, so the variance of the estimate is
+        # the mean of the strata's variances, over the number of strata
+        n = first['n_samples']
+        summary['stderr'] = float(np.sqrt(np.sum(fractions * (1 - fractions) / max(1, n - 1))) / len(fractions))
+    return summary
+
+# the summaries of every complete census in a results file, e.g. to print
+# as a table of stable fractions by n_units and unit parameters. Censuses
+# which have only been partly run (or whose records don't say where their
+# range ends) are left out
+def fraction_table(results_path):
+    censuses = {}
+    for record in load_results(results_path):
+        censuses.setdefault(record['key'], {})[record['shard']] = record
+    table = []
+    for shards in censuses.values():
+        records = [shards[s] for s in sorted(shards)]
+        # a census is complete when its shards cover all of its range, from
+        # 0 to its end (the number of prefixes, or of strata)
+        if records[0]['start'] == 0 and all(a['stop'] == b['start'] for a, b in zip(records, records[1:])) and records[-1]['stop'] == records[-1].get('end'):
+            table.append(summarise(records))
+    return table
+
+'''
+    Stable fractions for Ashby's discrete weights, np.linspace(-1, 1, 26):
+    exactly, for 2 units, and by sampling, for 3 to 6 units, and how the
+    fraction for 2 units depends on the damping, k. (The exact census for 3
+    units, census(3, weights_set, results_path), takes about 10 core-hours.)
+    Run this file again after interrupting it, and it will carry on from
+    where it stopped.
+'''
+if __name__ == '__main__':
+    weights_set = np.linspace(-1, 1, 26)
+    results_path = 'stability_census.jsonl'
+    census(2, weights_set, results_path)
+    for n_units in [3, 4, 5, 6]:
+        sampled_census(n_units, weights_set, results_path, n_samples=1000)
+    for k in np.linspace(0.1, 5, 10):
+        census(2, weights_set, results_path, k=float(k))
+
+    print('n_units      k method        fraction    stderr')
+    for row in fraction_table(results_path):
+        print(f"{row['n_units']:7d} {row['k']:6.2f} {row['method']:10s} {row['fraction']:10.6f} {row['stderr']:9.2g}")
@@ -0,0 +1,65 @@
+import os
+import random
+import tempfile
+import unittest
+
+from homeostat_sweeps import *
+
+'''
+    Tests that the results of a sweep don't depend on which other tasks are
+    in it, or on the order of its records, with short runs, so that they run
+    quickly.
+'''
+class Test_sweep(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.results_path = os.path.join(self.directory.name, 'sweep.jsonl')
+        self.grid = {'k': [0.5, 1, 2]}
+        self.fixed_params = {'duration': 20, 'experiment': 0}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_spawn_keys(self):
+        tasks = make_tasks(self.grid, 2, self.fixed_params)
+        spawn_keys = [task_spawn_key(task) for task in tasks]
+        self.assertEqual(len(set(spawn_keys)), len(tasks))
+        # a task has the same random streams when more runs are added to its
+        # sweep, or when the grid changes
+        for task in make_tasks(self.grid, 1, self.fixed_params) + make_tasks({'k': [2]}, 2, self.fixed_params):
+            self.assertIn(task_spawn_key(task), spawn_keys)
+        # but not with a different seed
+        for task in make_tasks(self.grid, 2, self.fixed_params, seed=1):
+            self.assertNotIn(task_spawn_key(task), spawn_keys)
+
+    def test_resume_with_more_runs(self):
+        records = sweep(self.grid, self.results_path, n_runs=2, fixed_params=self.fixed_params, n_workers=1, verbose=False)
+        # a sweep with more runs reuses the records of the first, and gives
+        # the same results as running all of its tasks from scratch
+        resumed = sweep(self.grid, self.results_path, n_runs=3, fixed_params=self.fixed_params, n_workers=1, verbose=False)
+        for record in records:
+            self.assertIn(record, resumed)
+        os.remove(self.results_path)
+        fresh = sweep(self.grid, self.results_path, n_runs=3, fixed_params=self.fixed_params, n_workers=1, verbose=False)
+        self.assertEqual(resumed, fresh)
+        # records of a sweep with another seed are kept apart
+        other = sweep(self.grid, self.results_path, n_runs=3, fixed_params=self.fixed_params, seed=1, n_workers=1, verbose=False)
+        self.assertEqual(len(load_results(self.results_path)), 2*len(fresh))
+        self.assertEqual(sweep(self.grid, self.results_path, n_runs=3, fixed_params=self.fixed_params, n_workers=1, verbose=False), fresh)
+        self.assertNotEqual([record['metrics'] for record in other], [record['metrics'] for record in fresh])
+
+    def test_results_array(self):
+        records = sweep(self.grid, self.results_path, n_runs=2, fixed_params=self.fixed_params, n_workers=1, verbose=False)
+        sweep(self.grid, self.results_path, n_runs=2, fixed_params=self.fixed_params, seed=1, n_workers=1, verbose=False)
+        shuffled = load_results(self.results_path)
+        random.Random(0).shuffle(shuffled)
+        times = results_array(shuffled, self.grid, 2, metric='adapting_times', fixed_params=self.fixed_params)
+        self.assertEqual(times.shape, (3, 2, 4))
+        for i, k in enumerate(self.grid['k']):
+            for run in range(2):
+                record = [record for record in records if record['params']['k'] == k and record['run'] == run][0]
+                self.assertEqual(times[i, run].tolist(), record['metrics']['adapting_times'])
+
+if __name__ == '__main__':
+    unittest.main()
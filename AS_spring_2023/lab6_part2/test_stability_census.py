@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from stability_census import *
+
+'''
+    Tests of the bookkeeping of stability censuses, with a small space of
+    weights, so that they run quickly.
+'''
+class Test_fraction_table(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.results_path = os.path.join(self.directory.name, 'census.jsonl')
+        self.weights_set = np.linspace(-1, 1, 6)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_complete(self):
+        summary = census(2, self.weights_set, self.results_path, n_shards=4, n_workers=1, verbose=False)
+        table = fraction_table(self.results_path)
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table[0]['fraction'], summary['fraction'])
+
+    def test_partly_run(self):
+        census(2, self.weights_set, self.results_path, n_shards=4, n_workers=1, verbose=False)
+        sampled_census(2, self.weights_set, self.results_path, n_samples=10, n_shards=4, n_workers=1, verbose=False)
+        # keep only the first two shards of each census, as if they had been
+        # interrupted
+        with open(self.results_path) as f:
+            lines = f.readlines()
+        with open(self.results_path, 'w') as f:
+            f.writelines(lines[:2] + lines[4:6])
+        self.assertEqual(fraction_table(self.results_path), [])
+
+        # running the censuses again completes them
+        census(2, self.weights_set, self.results_path, n_shards=4, n_workers=1, verbose=False)
+        sampled_census(2, self.weights_set, self.results_path, n_samples=10, n_shards=4, n_workers=1, verbose=False)
+        self.assertEqual(len(fraction_table(self.results_path)), 2)
+
+'''
+    Tests of the count of stable configurations against the eigenvalues of
+    every configuration, for 3 units and small weights sets, which have many
+    singular (marginally stable) weight matrices.
+'''
+class Test_count_stable(unittest.TestCase):
+
+    def test_eigenvalues(self):
+        for weights_set in [np.linspace(-1, 1, 4), [-1, -0.5, 0.5, 1]]:
+            space = WeightSpace(3, weights_set, use_symmetry=False)
+            weights = np.concatenate((np.repeat(space.prefixes(0, space.n_prefixes)[:, None], space.n_last_rows, axis=1), np.broadcast_to(space.last_rows()[None, :, None], (space.n_prefixes, space.n_last_rows, 1, 3))), axis=2).reshape(-1, 3, 3)
+            margins = np.linalg.eigvals(batch_jacobians(weights)).real.max(axis=-1)
+            n_stable = np.count_nonzero(margins < -1e-6)
+            # none of the configurations are close to the boundary, apart
+            # from the marginally stable ones
+            self.assertEqual(n_stable, np.count_nonzero(margins < -1e-12))
+
+            self.assertEqual(count_stable(space, 0, space.n_prefixes)[0], n_stable)
+            symmetric_space = WeightSpace(3, weights_set)
+            self.assertTrue(symmetric_space.symmetric)
+            self.assertEqual(count_stable(symmetric_space, 0, symmetric_space.n_prefixes)[0], n_stable)
+            self.assertEqual(np.count_nonzero(batch_stable(weights)), n_stable)
+
+if __name__ == '__main__':
+    unittest.main()
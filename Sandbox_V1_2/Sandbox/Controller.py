@@ -1,6 +1,53 @@
 from .System import *
 from .noise import *
 import copy as cp
+from collections import deque
+from itertools import islice
+
+def history_window(n_steps: int) -> Callable:
+    """
+        A decorator for adaptation functions, which declares that the function only needs the last ``n_steps`` entries of each history it is passed. A :class:`Controller` then passes it a :class:`HistoryWindow` of each history, instead of the whole history, and if the controller does not record its full histories (see ``record_history``), it only keeps that many entries of them, so that the function runs in constant memory, however long the simulation is.
+
+        For example::
+
+            @history_window(10)
+            def adapt_fun(dt, inputs_hist, commands_hist, params_hist):
+                ...
+
+        :param n_steps: The number of entries of each history which the function needs.
+        :type n_steps: int
+    """
+    def declare(adapt_fun):
+        adapt_fun.history_window = n_steps
+        return adapt_fun
+    return declare
+
+class HistoryWindow:
+    """
+        A read-only view of the last ``n_steps`` entries of a history (a list, or a ``deque``), oldest first, which does not copy them. The view is live - if the history is appended to, the view moves along with it. It can be indexed (including with negative indices and slices), iterated over, and its length is the number of entries it covers, which is less than ``n_steps`` if the history is shorter than that.
+    """
+    def __init__(self, history, n_steps: int):
+        self.history = history
+        self.n_steps = n_steps
+
+    def __len__(self) -> int:
+        return min(self.n_steps, len(self.history))
+
+    def __getitem__(self, index):
+        n = len(self)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(n))]
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('HistoryWindow index out of range')
+        return self.history[len(self.history) - n + index]
+
+    def __iter__(self):
+        return islice(self.history, len(self.history) - len(self), None)
+
+    def __repr__(self) -> str:
+        return 'HistoryWindow(' + str(len(self)) + ' of ' + str(len(self.history)) + ' entries)'
 
 class Controller(System):
 
@@ -11,7 +58,7 @@ class Controller(System):
         #. Using ``step_fun(dt, inputs, params, state)``. ``step_fun`` is a function which can be written anywhere in the code for your experiment and passed to a :class:`Controller` when it is constructed. This will only work for relatively simple controllers.
         #. By creating a subclass of :class:`Controller`, like :class:`BraitenbergController`, where you can add any attributes you need to by writing a new __init__ method (which should call ``super().__init__``, so that attributes from :class:`Controller` are inherited and set up correctly). In some cases, you may also need to override the step method of :class:`Controller` (possibly using ``super().step`` to inherit existing functionality), and to add other methods to the class.
 
-        If you want to create a self-adaptive controller, then you can either create a subclass of :class:`Controller` or - for relatively simple cases - you can implement an ``adapt_fun(dt, inputs_hist, commands_hist, params_hist)`` function and pass it into a :class:`Controller` when it is constructed.
+        If you want to create a self-adaptive controller, then you can either create a subclass of :class:`Controller` or - for relatively simple cases - you can implement an ``adapt_fun(dt, inputs_hist, commands_hist, params_hist)`` function and pass it into a :class:`Controller` when it is constructed. An ``adapt_fun`` which only looks at recent behaviour can declare how much history it needs with :func:`history_window`.
     """
     # construct Controller
     def __init__(self, inputs_n: int,
@@ -19,11 +66,12 @@ class Controller(System):
                        step_fun: Callable[[float, List[float], List[float], List[float]], List[float]], noisemakers: List[NoiseSource]=None, noisemakers_inds=None, params: List[float]=None,
                        adapt_fun: Callable[[List[float], List[float], List[float]], None]=None,
                        adapt_enabled: bool=True,
-                       test_interval: float=0):
+                       test_interval: float=0,
+                       record_history: bool=True):
 
         """
 
-        __init__(inputs_n: int, commands_n: int, step_fun: Callable[[float, List[float], List[float], List[float]], List[float]], noisemakers: List[NoiseSource]=None, noisemakers_inds=None, params: List[float]=None, adapt_fun: Callable[[List[float], List[float], List[float]], None]=None, adapt_enabled: bool=True, test_interval: float=0)
+        __init__(inputs_n: int, commands_n: int, step_fun: Callable[[float, List[float], List[float], List[float]], List[float]], noisemakers: List[NoiseSource]=None, noisemakers_inds=None, params: List[float]=None, adapt_fun: Callable[[List[float], List[float], List[float]], None]=None, adapt_enabled: bool=True, test_interval: float=0, record_history: bool=True)
 
             :param inputs_n: The number of inputs expected by the controller.
             :type inputs_n: int
@@ -52,6 +100,9 @@ class Controller(System):
             :param test_interval: The period of time to wait between parameter changes, if an adapt_fun is being used.
             :type test_interval: float
 
+            :param record_history: If the ``adapt_fun`` declares how much history it needs (see :func:`history_window`), and ``record_history`` is False, then the controller only keeps that many entries of its inputs, commands and parameters histories, instead of the full histories.
+            :type record_history: bool
+
         """
 
         # call System init
@@ -62,21 +113,24 @@ class Controller(System):
         self.noisemakers_inds = noisemakers_inds
         self.step_fun = step_fun
         self.adapt_fun = adapt_fun
+        # the number of entries of each history which adapt_fun needs, or None if it needs the full histories
+        self.history_window = getattr(adapt_fun, 'history_window', None)
+        self.record_history = record_history
 
         # attributes which may change have initial values saved so that the
         # controller can  be reset
-        self.inputs_hist: List[List[float]] = [[0.] * inputs_n]
+        self.inputs_hist: List[List[float]] = self.new_history([[0.] * inputs_n])
         self.initial_inputs_hist = []
         for input in self.inputs_hist:
             self.initial_inputs_hist.append(input)
-        self.commands_hist: List[List[float]] = [[0.] * commands_n]
+        self.commands_hist: List[List[float]] = self.new_history([[0.] * commands_n])
         self.initial_commands_hist = []
         for c in self.commands_hist:
             self.initial_commands_hist.append(c)
         self.params = params
         self.params_hist = None
         if self.params:
-            self.params_hist = [self.params]
+            self.params_hist = self.new_history([self.params])
         # if self.params:
         #     params_n = len(params)
         #     self.params_hist: List[List[float]] = [[0.] * params_n]
@@ -92,14 +146,28 @@ class Controller(System):
             You will typically want to get the controller's data before resetting it, e.g. so that you can store if for the purposes of analysis. The most convenient way to do this will often be to call the ``get_data_and_reset`` method defined in the :class:`System` class.
         """
         self.t = 0
-        self.inputs_hist = self.initial_inputs_hist
-        self.commands_hist = cp.deepcopy(self.initial_commands_hist)
+        self.inputs_hist = self.new_history(self.initial_inputs_hist)
+        self.commands_hist = self.new_history(cp.deepcopy(self.initial_commands_hist))
         self.params = self.initial_params
-        self.params_hist = [self.params]
+        self.params_hist = self.new_history([self.params])
         if self.noisemakers:
             for noisemaker in self.noisemakers:
                 noisemaker.reset()
 
+    def new_history(self, entries: list):
+        """
+            A method for starting one of the controller's histories, with the given entries. If the controller keeps only the window of history which its ``adapt_fun`` needs, the history is a ``deque`` of that length, otherwise it is the list of entries itself.
+
+            :param entries: The initial entries of the history.
+            :type entries: list
+
+            :return: The history.
+            :rtype: list or deque
+        """
+        if self.record_history or self.history_window is None:
+            return entries
+        return deque(entries, maxlen=max(1, self.history_window))
+
     def get_data(self) -> Dict[str, dict]:
         """
             A method for getting the simulation run data from a Controller.
@@ -149,7 +217,13 @@ class Controller(System):
         if self.adapt_fun and self.adapt_enabled:
             if self.t >= self.test_interval:
                 self.t = 0
-                self.params = self.adapt_fun(dt, self.inputs_hist, self.commands_hist, self.params_hist)
+                if self.history_window is None:
+                    self.params = self.adapt_fun(dt, self.inputs_hist, self.commands_hist, self.params_hist)
+                else:
+                    # pass views of only as much history as adapt_fun needs
+                    n = self.history_window
+                    params_hist = None if self.params_hist is None else HistoryWindow(self.params_hist, n)
+                    self.params = self.adapt_fun(dt, HistoryWindow(self.inputs_hist, n), HistoryWindow(self.commands_hist, n), params_hist)
 
         # store new params
         if self.params:
@@ -99,6 +99,7 @@ class Robot(Agent):
 
         self.sensors: List[LightSensor] = sensors
         self.initial_sensors = sensors
+        self.sensor_bank = LightSensorBank(sensors)  # steps the light sensors with many light sources together, in one vectorised pass
         self.sensor_angles: List[float] = sensor_angles
         self.initial_sensor_angles: List[float] = []
         # COULD DO STRAIGHT COPY OF LIST HERE
@@ -207,17 +208,10 @@ class Robot(Agent):
         '''
             Only called from step().
 
-            A method which steps the sensors in the robot's `sensors` list, and returns the sensor activations in a list.
+            A method which steps the sensors in the robot's `sensors` list, and returns the sensor activations in a list. The sensors are stepped with a :class:`LightSensorBank`, which gives the same results as calling each sensor's ``step`` method in turn, and which only vectorises over the light sources of sensors which detect many of them (or the light sources in a :class:`LightField`), stepping the others one at a time.
         '''
-        activations = []
-        for sensor in self.sensors:
-            s = sensor.step(dt)
-            # print(s)
-            # print(sensor.light_sources)
-            # activations.append(sensor.step(dt))
-            activations.append(s)
-
-        return activations
+        self.sensor_bank.sensors = self.sensors
+        return self.sensor_bank.step(dt)
 
     def get_data(self) -> Dict[str, Dict[str, Any]]:
         '''
@@ -3,6 +3,7 @@ from .stimuli import *
 from .noise import *
 
 import math
+import operator
 
 # base sensor class. in the current implementation, only contains methods for drawing
 class Sensor(System):
@@ -209,12 +210,18 @@ class LightSensor(Sensor, FOV_thing):
         self.activation = 0.0  # begin with zero activation, and add to it for every detected light source
         # only detect anything if enabled
         if self.enabled:
-            for source in self.light_sources:  # for every light source the sensor can detect
-                # if this sensor has a label set, then it will only detect sensors with the same label
-                if not self.label or self.label == source.label:
-                    angle_to_source = math.atan2(source.y - self.y, source.x - self.x)  # find angle of vector from light source to sensor
-                    if abs(angle_difference(angle_to_source, self.theta)) <= (self.FOV/2):  # if angle is within field fo view, the sensor detects the light
-                        self.activation += source.get_brightness_at(self.x,self.y)  # stimuli from multiple lights are added linearly
+            field = self.light_sources
+            if isinstance(field, LightField) and (field.index is not None or field.raster is not None or len(field) >= BANK_MIN_SOURCES):
+                # the light sources' attributes are stored in the field's arrays, so vectorise over the ones this sensor can
+                # detect, in the same way as LightSensorBank (which also uses the field's raster or index, if it has one)
+                self.activation = LightSensorBank([self]).activations([self])[0]
+            else:
+                for source in self.light_sources:  # for every light source the sensor can detect
+                    # if this sensor has a label set, then it will only detect sensors with the same label
+                    if not self.label or self.label == source.label:
+                        angle_to_source = math.atan2(source.y - self.y, source.x - self.x)  # find angle of vector from light source to sensor
+                        if abs(angle_difference(angle_to_source, self.theta)) <= (self.FOV/2):  # if angle is within field fo view, the sensor detects the light
+                            self.activation += source.get_brightness_at(self.x,self.y)  # stimuli from multiple lights are added linearly
 
             # add noise, if a noisemaker is implemented
             if self.noisemaker != None:
@@ -265,3 +272,242 @@ class LightSensor(Sensor, FOV_thing):
         super().pygame_draw(screen, scale, shiftx, shifty)
 
         self.pygame_draw_FOV(screen, scale, shiftx, shifty)
+
+# the largest difference from the edge of a sensor's field of view at which
+# LightSensorBank checks whether a light source is in view again, in the same
+# way as LightSensor.step does. NumPy's arctan2 can differ from math.atan2 in
+# the last few bits, which only matters this close to the edge
+FOV_EDGE_TOLERANCE = 1e-9
+
+# the number of light sources below which it is faster for a LightSensor to
+# loop over its light sources than to vectorise over them
+BANK_MIN_SOURCES = 16
+
+# the attributes of a LightSource which LightSensorBank reads, in one pass
+light_source_attributes = operator.attrgetter('x', 'y', 'brightness', 'gradient', 'model', 'is_on', 'label')
+
+class LightSensorBank:
+    """
+        A class for stepping a list of :class:`LightSensor` objects together. Instead of each sensor looping over its light sources in Python, the bearings of every light source from every sensor, whether they are in each sensor's field of view, and their brightness at each sensor, are computed as (n_sensors x n_sources) arrays, in one vectorised pass per step. The activations, and everything else the sensors record, are numerically identical to stepping each sensor with :meth:`Sandbox.LightSensor.step`:
+
+        * distances, brightnesses and angle differences are computed with the same floating point operations as in :meth:`Sandbox.LightSource.get_brightness_at` and :func:`angle_difference`
+        * the bearing of a light source is computed with NumPy's ``arctan2``, and any source which is within ``FOV_EDGE_TOLERANCE`` of the edge of a sensor's field of view is checked again with ``math.atan2``
+        * each sensor's brightnesses are summed in the order of its ``light_sources`` list
+        * noise is added to each sensor in turn, in the order of the list, so noise sources draw the same random numbers
+
+        If all of the sensors detect the light sources in the same :class:`LightField`, the light sources' attributes are read from the field's arrays, otherwise they are read from each light source. Each sensor then only visits the light sources which have its label, if it has one, and if the field has a :class:`LightSourceIndex`, the light sources which the index finds near it, as :meth:`Sandbox.LightSensor.step` does. If the field has a :class:`BrightnessRaster`, the sensors which can use it get their activations from it, as in :meth:`Sandbox.LightSensor.step`, and these are not identical to the exact activations.
+
+        Any sensors in the list which are not :class:`LightSensor` objects, or which are instances of subclasses that override ``step``, are stepped with their own ``step`` methods, as are sensors with a list of fewer than ``min_sources`` light sources, for which the vectorised pass is slower than looping over them.
+    """
+    def __init__(self, sensors: List[Sensor], min_sources: int=BANK_MIN_SOURCES):
+        '''
+            __init__(sensors: List[Sensor], min_sources: int=BANK_MIN_SOURCES)
+
+            :param sensors: The sensors to step. This list can be changed (or replaced) between steps.
+            :type sensors: List of :class:`Sensor` objects
+
+            :param min_sources: The smallest number of light sources in a sensor's (plain) list for which the sensor is stepped in the vectorised pass. Defaults to ``BANK_MIN_SOURCES``. Sensors which detect the light sources in a :class:`LightField` are always stepped in the vectorised pass.
+            :type min_sources: int
+        '''
+        self.sensors = sensors
+        self.min_sources = min_sources
+        # the light sources of all of the sensors, and for each sensor, the
+        # indices of its light sources in that list. These are only rebuilt
+        # when the sensors' lists change
+        self.source_lists = []
+        self.sources = []
+        self.indices = None
+        # the attributes of the light sources, as they were last read, and the
+        # arrays made from them, which are only made again when they change
+        self.source_values = None
+        self.source_arrays = None
+
+    # the sources of all of the sensors, in one list, and an array with a
+    # row of indices into that list for each sensor, in the order of its own
+    # list, padded with the index of an extra source, with zero brightness
+    def update_sources(self, sensors: List[LightSensor]) -> None:
+        source_lists = [list(sensor.light_sources) for sensor in sensors]
+        if source_lists == self.source_lists:
+            return
+        self.source_lists = source_lists
+        columns = {}
+        for sources in source_lists:
+            for source in sources:
+                columns.setdefault(id(source), len(columns))
+        self.sources = [None] * len(columns)
+        for sources in source_lists:
+            for source in sources:
+                self.sources[columns[id(source)]] = source
+        width = max([len(sources) for sources in source_lists] + [0])
+        self.indices = np.full((len(sensors), width), len(columns), dtype=int)
+        for i, sources in enumerate(source_lists):
+            self.indices[i, :len(sources)] = [columns[id(source)] for source in sources]
+
+    # the attributes of the light sources as arrays, which are only made
+    # again when any of the light sources' attributes have changed
+    def source_attributes(self, sources: List[LightSource]) -> Tuple[np.ndarray, ...]:
+        values = list(map(light_source_attributes, sources))
+        if values != self.source_values:
+            self.source_values = values
+            x, y, brightness, gradient, models, is_on, labels = zip(*values) if values else [()] * 7
+            self.source_arrays = (np.array(x, dtype=float), np.array(y, dtype=float), np.array(brightness, dtype=float), np.array(gradient, dtype=float),
+                                  np.array([light_models.get(model, -1) for model in models], dtype=int), np.array(is_on, dtype=bool), np.array(labels, dtype=object))
+        return self.source_arrays
+
+    def activations(self, sensors: List[LightSensor]) -> np.ndarray:
+        """
+            A method to compute the activations of a list of :class:`LightSensor` objects, before noise is added, without stepping them.
+
+            :param sensors: The sensors.
+            :type sensors: List of :class:`LightSensor` objects
+
+            :return: The activations of the sensors, without noise.
+            :rtype: NumPy array of floats
+        """
+        if not len(sensors):
+            return np.zeros(0)
+
+        # if all of the sensors detect the light sources in the same
+        # LightField, and it has a raster of their brightness, the sensors
+        # which can use it do, and the others are computed exactly
+        field = sensors[0].light_sources
+        if isinstance(field, LightField) and field.raster is not None and all(sensor.light_sources is field for sensor in sensors):
+            activations = field.raster.activations(sensors)
+            exact = np.flatnonzero(np.isnan(activations))
+            if len(exact):
+                activations[exact] = self.exact_activations([sensors[i] for i in exact])
+            return activations
+        return self.exact_activations(sensors)
+
+    def exact_activations(self, sensors: List[LightSensor]) -> np.ndarray:
+        """
+            A method to compute the activations of a list of :class:`LightSensor` objects, before noise is added, without stepping them, and without using a :class:`BrightnessRaster`.
+
+            :param sensors: The sensors.
+            :type sensors: List of :class:`LightSensor` objects
+
+            :return: The activations of the sensors, without noise.
+            :rtype: NumPy array of floats
+        """
+        if not len(sensors):
+            return np.zeros(0)
+
+        # if all of the sensors detect the light sources in the same
+        # LightField, their attributes are read from its arrays, otherwise
+        # they are read from each light source
+        field = sensors[0].light_sources
+        if isinstance(field, LightField) and all(sensor.light_sources is field for sensor in sensors):
+            sources = field.sources
+            n_sources = len(sources)
+            if field.index is not None or any(sensor.label for sensor in sensors):
+                # only the sources which each sensor needs to visit, padded as
+                # in update_sources
+                detectable = [field.detectable_indices(sensor.x, sensor.y, sensor.label) for sensor in sensors]
+                indices = np.full((len(sensors), max(len(sensor_indices) for sensor_indices in detectable)), n_sources, dtype=int)
+                for i, sensor_indices in enumerate(detectable):
+                    indices[i, :len(sensor_indices)] = sensor_indices
+            else:
+                indices = np.broadcast_to(np.arange(n_sources), (len(sensors), n_sources))
+            sx, sy, brightness, gradient, models, is_on = field.x, field.y, field.brightness, field.gradient, field.model, field.is_on
+        else:
+            field = None
+            self.update_sources(sensors)
+            sources = self.sources
+            n_sources = len(sources)
+            indices = self.indices
+            sx, sy, brightness, gradient, models, is_on, labels = self.source_attributes(sources)
+        if not n_sources:
+            return np.zeros(len(sensors))
+
+        # the attributes of each sensor's sources, in the order of its list,
+        # where the extra source used for padding is off
+        sx = np.append(sx, 0.0)[indices]
+        sy = np.append(sy, 0.0)[indices]
+        brightness = np.append(brightness, 0.0)[indices]
+        gradient = np.append(gradient, 0.0)[indices]
+        models = np.append(models, 0)[indices]
+        is_on = np.append(is_on, False)[indices]
+
+        # brightness of each source at each sensor, as in LightSource.get_brightness_at
+        x = np.array([sensor.x for sensor in sensors], dtype=float)[:, np.newaxis]
+        y = np.array([sensor.y for sensor in sensors], dtype=float)[:, np.newaxis]
+        dx = sx - x
+        dy = sy - y
+        dist = np.sqrt(dx * dx + dy * dy)
+        brightnesses = light_brightnesses(dist, brightness, gradient, models, is_on)
+
+        # which sources each sensor detects - the sources in a LightField
+        # have already been chosen by label
+        detected = np.ones(indices.shape, dtype=bool)
+        if field is None and any(sensor.label for sensor in sensors):
+            labels = np.append(labels, None)
+            for i, sensor in enumerate(sensors):
+                if sensor.label:
+                    detected[i] = labels[indices[i]] == sensor.label
+
+        # which sources are in each sensor's field of view - a sensor whose
+        # field of view is the full circle (or more) sees every source, as
+        # abs(angle_difference(...)) is never more than pi
+        half_FOV = np.array([sensor.FOV / 2 for sensor in sensors], dtype=float)
+        narrow = np.flatnonzero(half_FOV < math.pi)
+        if len(narrow):
+            theta = np.array([sensors[i].theta for i in narrow], dtype=float)[:, np.newaxis]
+            angle_to_source = np.arctan2(dy[narrow], dx[narrow])
+            diff = np.mod(angle_to_source - theta, 2*math.pi)
+            diff = np.where(diff > math.pi, diff - 2*math.pi, diff)
+            difference = np.abs(diff) - half_FOV[narrow, np.newaxis]
+            in_view = difference <= 0
+            # check sources which are right at the edge of the field of view
+            # again, in exactly the same way as LightSensor.step
+            for row, column in zip(*np.nonzero(np.abs(difference) <= FOV_EDGE_TOLERANCE)):
+                j = indices[narrow[row], column]
+                if j == n_sources:
+                    continue
+                sensor = sensors[narrow[row]]
+                source = sources[j]
+                in_view[row, column] = abs(angle_difference(math.atan2(source.y - sensor.y, source.x - sensor.x), sensor.theta)) <= (sensor.FOV/2)
+            detected[narrow] &= in_view
+
+        # sum each sensor's detected sources in the order of its list, starting
+        # from 0.0, which cumsum does one at a time, as in LightSensor.step
+        contributions = np.zeros((len(sensors), indices.shape[1] + 1))
+        contributions[:, 1:] = np.where(detected, brightnesses, 0.0)
+        return np.cumsum(contributions, axis=1)[:, -1]
+
+    # whether a sensor is stepped in the vectorised pass, rather than with its own step method
+    def banked(self, sensor: Sensor) -> bool:
+        if type(sensor).step is not LightSensor.step:
+            return False
+        return isinstance(sensor.light_sources, LightField) or len(sensor.light_sources) >= self.min_sources
+
+    def step(self, dt: float) -> List[float]:
+        """
+            A method to step all of the sensors forwards in time, which has the same effects as calling the ``step`` method of each sensor in turn.
+
+            :param dt: Integration interval.
+            :type dt: float
+
+            :return: The activations of the sensors, in a list.
+            :rtype: list of floats
+        """
+        banked = [sensor for sensor in self.sensors if self.banked(sensor)]
+        for sensor in banked:
+            Sensor.step(sensor, dt)  # call System step method, to store xy-coordinates and theta
+        enabled = [sensor for sensor in banked if sensor.enabled]
+        bank_activations = dict(zip(map(id, enabled), self.activations(enabled)))
+        banked_ids = set(map(id, banked))
+
+        activations = []
+        for sensor in self.sensors:
+            if id(sensor) not in banked_ids:
+                activations.append(sensor.step(dt))
+                continue
+            sensor.activation = 0.0
+            if sensor.enabled:
+                sensor.activation = bank_activations[id(sensor)]
+                # add noise, if a noisemaker is implemented
+                if sensor.noisemaker != None:
+                    sensor.activation += sensor.noisemaker.step(dt)
+            sensor.activations.append(sensor.activation)
+            activations.append(sensor.activation)
+        return activations
@@ -84,6 +84,22 @@ class Stimulus(System):
 #       be a distance at which a sensor is barely stimulated by it)
 #       - the downside is that the inverse square model can make it more difficult to program certain kinds of
 #       controller, due to its nonlinearity.
+class LightFieldAttribute:
+    """
+        A descriptor for an attribute of a :class:`LightSource` which is stored in the arrays of a :class:`LightField` once the light source has been added to one, and in the light source itself before that. Either way, the attribute is read and set in the same way, e.g. ``source.x = 1``.
+
+        Until a light source is added to a field, the attribute is an ordinary instance attribute, which Python finds before the descriptor, so reading it is as fast as ever. Setting the attribute of a light source which is in a field is handled by :meth:`Sandbox.LightSource.__setattr__`.
+    """
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, source, owner=None):
+        if source is None:
+            return self
+        if source.field is None:
+            raise AttributeError(self.name)
+        return source.field.get_value(self.name, source.field_index)
+
 class LightSource(Stimulus):
     """
         A subclass of :class:`Stimulus`, :class:`LightSource` is a class which represents a light source. It is possible to set the "model" of intensity of a :class:`LightSource` to be either an inverse square law of decay with distance, or a linear one, or for the light to be detected with constant brightness regardless of distance.
@@ -99,6 +115,26 @@ class LightSource(Stimulus):
           :alt: Inverse square light decay model
 
     """
+    # the LightField which the light source has been added to, if any, and
+    # its index in the field - the attributes below are stored in the field
+    field = None
+    field_index = None
+    x = LightFieldAttribute()
+    y = LightFieldAttribute()
+    brightness = LightFieldAttribute()
+    gradient = LightFieldAttribute()
+    model = LightFieldAttribute()
+    is_on = LightFieldAttribute()
+    label = LightFieldAttribute()
+
+    # attributes which are stored in a LightField are set in its arrays
+    def __setattr__(self, name: str, value) -> None:
+        field = self.field
+        if field is not None and name in field.arrays:
+            field.set_value(name, self.field_index, value)
+        else:
+            super().__setattr__(name, value)
+
     # construct light source
     def __init__(self, x: float, y: float, theta: float=None, brightness: float=1, gradient: float=0.01, model: str='inv_sq', is_on: bool=True, colour: str='yellow', label: str=None):
         """
@@ -263,6 +299,582 @@ class LightSource(Stimulus):
         self.colour = self.initial_colour
         self.label = self.initial_label
 
+# codes for the models of brightness of a LightSource, as stored in a LightField
+light_models = {'inv_sq': 0, 'linear': 1, 'binary': 2}
+
+def light_brightnesses(dist: np.ndarray, brightness: np.ndarray, gradient: np.ndarray, models: np.ndarray, is_on: np.ndarray) -> np.ndarray:
+    """
+        A function to find the brightness of many light sources at many distances at once, with exactly the same results as :meth:`Sandbox.LightSource.get_brightness_at`. Each of the arguments has one entry per light source, apart from ``dist``, which can have more dimensions, e.g. one row per position, and one column per light source.
+
+        :param dist: The distances from the light sources.
+        :type dist: NumPy array of floats
+
+        :param brightness: The brightness of each light source.
+        :type brightness: NumPy array of floats
+
+        :param gradient: The gradient of brightness of each light source, for the linear model.
+        :type gradient: NumPy array of floats
+
+        :param models: The code of the model of each light source, from ``light_models``. Any other code is a model which is not implemented, and gives a brightness of 0.
+        :type models: NumPy array of ints
+
+        :param is_on: Whether each light source is on.
+        :type is_on: NumPy array of bools
+
+        :return: The brightness of each light source at its distance.
+        :rtype: NumPy array of floats
+    """
+    if (models == 0).all():
+        brightnesses = brightness / np.power(dist + 1, 2)
+    else:
+        brightnesses = np.select([models == 0, models == 1, models == 2], [brightness / np.power(dist + 1, 2), np.maximum(brightness - gradient * dist, 0), np.broadcast_to(brightness, np.shape(dist))], 0.0)
+    if not is_on.all():
+        brightnesses = np.where(is_on, brightnesses, 0.0)
+    return brightnesses
+
+# the attributes of a LightSource which are stored in a LightField, and the
+# types of the arrays they are stored in. Models and labels are stored as
+# codes, which index the field's lists of model and label names
+light_field_arrays = [('x', float), ('y', float), ('brightness', float), ('gradient', float), ('model', int), ('is_on', bool), ('label', int)]
+
+class LightField:
+    """
+        A container for many :class:`LightSource` objects, which stores their positions, brightness, gradient, model, on/off state and label in contiguous NumPy arrays, so that they can be read in bulk, e.g. by a :class:`LightSensorBank`, or with :meth:`brightness_at`, instead of attribute by attribute.
+
+        The light sources in a :class:`LightField` are still the same objects, and can be used in the same way - their attributes are views of the field's arrays, so setting e.g. ``source.x`` or ``source.label``, as :class:`PerturbableLightSource` and :class:`LightSwitcherDisturbanceSource` do, changes the arrays. A :class:`LightField` can also be used in place of a list of light sources, e.g. as the ``light_sources`` of a :class:`LightSensor`: it can be iterated over, indexed, and appended to.
+
+        Only the attributes listed in ``light_field_arrays`` are stored in the field. A light source can only be in one field.
+    """
+    def __init__(self, sources: List[LightSource]=None, capacity: int=64):
+        """
+            __init__(sources: List[LightSource]=None, capacity: int=64)
+
+            :param sources: The light sources to add to the field. Defaults to ``None``, for an empty field.
+            :type sources: list[:class:`LightSource`]
+
+            :param capacity: The number of light sources to allocate the arrays for. The arrays grow as needed if more light sources are added.
+            :type capacity: int
+        """
+        self.sources: List[LightSource] = []
+        self.arrays = {name: np.zeros(max(1, capacity), dtype=dtype) for name, dtype in light_field_arrays}
+        self.model_names = list(light_models)
+        self.model_ids = dict(light_models)
+        self.label_names = [None]
+        self.label_ids = {None: 0}
+        self.index: LightSourceIndex = None  # a spatial index of the light sources, if one has been made for the field
+        self.raster: BrightnessRaster = None  # a raster of the light sources' brightness, if one has been made for the field
+        self.partitions: Dict[int, Tuple[np.ndarray, List[LightSource]]] = None  # the light sources with each label code, which are found again when any label changes
+        if sources:
+            self.extend(sources)
+
+    def append(self, source: LightSource) -> None:
+        """
+            A method to add a light source to the field. From now on, the light source's attributes are stored in the field's arrays.
+
+            :param source: The light source.
+            :type source: :class:`LightSource`
+        """
+        if source.field is not None:
+            raise ValueError('a LightSource can only be in one LightField')
+        index = len(self.sources)
+        if index == len(self.arrays['x']):
+            # double the size of the arrays
+            for name in self.arrays:
+                array = self.arrays[name]
+                self.arrays[name] = np.concatenate((array, np.zeros_like(array)))
+        values = {name: getattr(source, name) for name, _ in light_field_arrays}
+        self.sources.append(source)
+        source.field = self
+        source.field_index = index
+        for name, value in values.items():
+            self.set_value(name, index, value)
+            del source.__dict__[name]
+
+    def extend(self, sources: List[LightSource]) -> None:
+        """
+            A method to add a list of light sources to the field.
+
+            :param sources: The light sources.
+            :type sources: list[:class:`LightSource`]
+        """
+        for source in sources:
+            self.append(source)
+
+    # the code for a name in a list of names, which is added to the list if
+    # it is not already in it
+    def code(self, names: list, ids: dict, name) -> int:
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    def get_value(self, name: str, index: int):
+        """
+            A method to get an attribute of one of the light sources in the field, as it was set.
+
+            :param name: The name of the attribute.
+            :type name: str
+
+            :param index: The index of the light source in the field.
+            :type index: int
+        """
+        value = self.arrays[name][index]
+        if name == 'model':
+            return self.model_names[value]
+        if name == 'label':
+            return self.label_names[value]
+        return value.item()
+
+    def set_value(self, name: str, index: int, value) -> None:
+        """
+            A method to set an attribute of one of the light sources in the field.
+
+            :param name: The name of the attribute.
+            :type name: str
+
+            :param index: The index of the light source in the field.
+            :type index: int
+
+            :param value: The new value of the attribute.
+        """
+        if name == 'model':
+            value = self.code(self.model_names, self.model_ids, value)
+        elif name == 'label':
+            value = self.code(self.label_names, self.label_ids, value)
+        self.arrays[name][index] = value
+        if self.index is not None and name in light_index_attributes:
+            self.index.moved.add(index)
+        if self.raster is not None:
+            self.raster.invalidate()
+        if name == 'label':
+            self.partitions = None
+
+    def label_id(self, label: str) -> int:
+        """
+            A method to get the code of a label in the field's ``label`` array, or -1 if no light source in the field has ever had that label.
+
+            :param label: The label.
+            :type label: str
+
+            :return: The code of the label.
+            :rtype: int
+        """
+        return self.label_ids.get(label, -1)
+
+    def partition(self, label: str) -> Tuple[np.ndarray, List[LightSource]]:
+        """
+            A method to get the light sources in the field which have the given label. The light sources are partitioned by label when this is first called, and again after any light source's label has changed, e.g. when a :class:`LightSwitcherDisturbanceSource` swaps them.
+
+            :param label: The label.
+            :type label: str
+
+            :return: The indices of the light sources in the field, and the light sources, in the order they are in the field.
+            :rtype: tuple of a NumPy array of ints and a list of :class:`LightSource`
+        """
+        if self.partitions is None:
+            labels = self.label
+            self.partitions = {}
+            for code in np.unique(labels).tolist():
+                indices = np.flatnonzero(labels == code)
+                self.partitions[code] = (indices, [self.sources[i] for i in indices.tolist()])
+        return self.partitions.get(self.label_id(label), (np.zeros(0, dtype=int), []))
+
+    def detectable_indices(self, x: float, y: float, label: str=None) -> np.ndarray:
+        """
+            A method to get the indices of the light sources in the field which a :class:`LightSensor` at the given position, and with the given label, needs to visit: only the light sources which have the sensor's label, if it has one, and only the ones near the sensor, if the field has a :class:`LightSourceIndex`.
+
+            :param x: The x-coordinate of the sensor.
+            :type x: float
+
+            :param y: The y-coordinate of the sensor.
+            :type y: float
+
+            :param label: The sensor's label. Defaults to ``None``, for a sensor which detects light sources with any label.
+            :type label: str
+
+            :return: The indices of the light sources, in the order they are in the field.
+            :rtype: NumPy array of ints
+        """
+        if self.index is None:
+            if label:
+                return self.partition(label)[0]
+            return np.arange(len(self.sources))
+        indices = self.index.indices_near(x, y)
+        if label:
+            indices = indices[self.label[indices] == self.label_id(label)]
+        return indices
+
+    @property
+    def x(self) -> np.ndarray:
+        """The x-coordinates of the light sources, as a view of the field's array."""
+        return self.arrays['x'][:len(self.sources)]
+
+    @property
+    def y(self) -> np.ndarray:
+        """The y-coordinates of the light sources, as a view of the field's array."""
+        return self.arrays['y'][:len(self.sources)]
+
+    @property
+    def brightness(self) -> np.ndarray:
+        """The brightness of the light sources, as a view of the field's array."""
+        return self.arrays['brightness'][:len(self.sources)]
+
+    @property
+    def gradient(self) -> np.ndarray:
+        """The gradients of the light sources, as a view of the field's array."""
+        return self.arrays['gradient'][:len(self.sources)]
+
+    @property
+    def model(self) -> np.ndarray:
+        """The codes of the models of the light sources (see ``model_names``), as a view of the field's array."""
+        return self.arrays['model'][:len(self.sources)]
+
+    @property
+    def is_on(self) -> np.ndarray:
+        """Whether each light source is on, as a view of the field's array."""
+        return self.arrays['is_on'][:len(self.sources)]
+
+    @property
+    def label(self) -> np.ndarray:
+        """The codes of the labels of the light sources (see ``label_names``), as a view of the field's array."""
+        return self.arrays['label'][:len(self.sources)]
+
+    def brightness_at(self, x, y) -> np.ndarray:
+        """
+            A method to get the brightness of every light source in the field at each of the given xy coordinates, with the same results as calling :meth:`Sandbox.LightSource.get_brightness_at` for each of them.
+
+            :param x: The x-components of the positions to find the brightness at.
+            :type x: float, or array of floats
+
+            :param y: The y-components of the positions to find the brightness at.
+            :type y: float, or array of floats
+
+            :return: An array with a row for each position, and a column for each light source.
+            :rtype: NumPy array of floats
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=float))[:, np.newaxis]
+        y = np.atleast_1d(np.asarray(y, dtype=float))[:, np.newaxis]
+        dx = self.x - x
+        dy = self.y - y
+        dist = np.sqrt(dx * dx + dy * dy)
+        return light_brightnesses(dist, self.brightness, self.gradient, self.model, self.is_on)
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __getitem__(self, index):
+        return self.sources[index]
+
+    def __repr__(self) -> str:
+        return 'LightField(' + str(len(self.sources)) + ' light sources)'
+
+# the attributes of a LightSource which determine where it can be detected,
+# so that a LightSourceIndex has to be updated when one of them changes
+light_index_attributes = {'x', 'y', 'brightness', 'gradient', 'model', 'is_on'}
+
+class LightSourceIndex:
+    """
+        A spatial index of the light sources in a :class:`LightField`, which is used to find the light sources which can be detected at a given position, so that a :class:`LightSensor` (or a :class:`LightSensorBank`) only needs to visit those sources, instead of every source in the field. The cost of a sensor then depends on how many light sources there are near it, rather than on how many there are in total.
+
+        Each light source has a cutoff radius, beyond which its brightness is no more than ``tolerance``:
+
+        * for the ``linear`` model, this is where the brightness falls to ``tolerance`` - with a ``tolerance`` of 0, light sources are only left out where their brightness is exactly 0, so sensors' activations are unchanged
+        * for the ``inv_sq`` model, this is where ``brightness / (dist + 1)**2`` falls to ``tolerance``
+        * a ``binary`` light source can be detected everywhere, unless its brightness is no more than ``tolerance``
+        * a light source which is off is never detected
+
+        The index is a uniform grid of square cells, and each light source is listed in every cell which its cutoff radius overlaps. The light sources near a position are the ones listed in its cell, plus the ones which can be detected everywhere.
+
+        The index is updated incrementally: any change to a light source's position, brightness, gradient, model or on/off state, whether it is made by a :class:`Robot` which the light is attached to, by :meth:`PerturbableLightSource.perturb`, or in any other way, is recorded by the field, and only the light sources which have changed are moved in the grid, the next time the index is used.
+    """
+    def __init__(self, field: LightField, tolerance: float=1e-3, cell_size: float=None):
+        """
+            __init__(field: LightField, tolerance: float=1e-3, cell_size: float=None)
+
+            Makes an index of the light sources in a :class:`LightField`, which is used by sensors from then on. The index can be removed again by setting the field's ``index`` attribute to ``None``.
+
+            :param field: The field to make the index for.
+            :type field: :class:`LightField`
+
+            :param tolerance: The largest brightness which a light source can have at a position where it is left out. Defaults to ``1e-3``.
+            :type tolerance: float
+
+            :param cell_size: The width of the grid's cells. Defaults to ``None``, in which case the median cutoff radius of the field's light sources is used.
+            :type cell_size: float
+        """
+        self.field = field
+        self.tolerance = tolerance
+        self.cells: Dict[Tuple[int, int], set] = {}  # the indices of the light sources listed in each cell
+        self.everywhere = set()  # the indices of the light sources which can be detected everywhere
+        self.source_cells: Dict[int, List[Tuple[int, int]]] = {}  # the cells which each light source is listed in
+        self.max_cells = 256  # a light source which would be listed in more cells than this is treated as being detectable everywhere
+        if cell_size is None:
+            radii = self.cutoff_radii(np.arange(len(field)))
+            radii = radii[np.isfinite(radii) & (radii > 0)]
+            cell_size = float(np.median(radii)) if len(radii) else 1.0
+        self.cell_size = cell_size
+        # the light sources which have been added or changed since the index
+        # was last updated - the field adds to this
+        self.moved = set(range(len(field)))
+        field.index = self
+
+    def cutoff_radii(self, indices: np.ndarray) -> np.ndarray:
+        """
+            A method to find the distances beyond which the given light sources' brightness is no more than ``tolerance``.
+
+            :param indices: The indices of the light sources in the field.
+            :type indices: NumPy array of ints
+
+            :return: The cutoff radius of each light source, which is ``inf`` for one which can be detected everywhere, and ``nan`` for one which is off.
+            :rtype: NumPy array of floats
+        """
+        field = self.field
+        tolerance = self.tolerance
+        brightness = field.arrays['brightness'][indices]
+        gradient = field.arrays['gradient'][indices]
+        models = field.arrays['model'][indices]
+        is_on = field.arrays['is_on'][indices]
+        magnitude = np.abs(brightness)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if tolerance > 0:
+                inv_sq = np.maximum(np.sqrt(magnitude / tolerance) - 1, 0)
+            else:
+                inv_sq = np.where(magnitude > 0, np.inf, 0.0)
+            linear = np.where(gradient > 0, np.maximum(brightness - tolerance, 0) / gradient, np.where(brightness > tolerance, np.inf, 0.0))
+            binary = np.where(magnitude > tolerance, np.inf, 0.0)
+        radii = np.select([models == 0, models == 1, models == 2], [inv_sq, linear, binary], 0.0)
+        # the radii are widened very slightly, so that rounding errors in the
+        # distances can't leave out a light source which is right at its radius
+        radii = radii * (1 + 1e-9) + 1e-9
+        return np.where(is_on, radii, np.nan)
+
+    # take a light source out of the grid
+    def remove(self, index: int) -> None:
+        self.everywhere.discard(index)
+        for cell in self.source_cells.pop(index, []):
+            sources = self.cells[cell]
+            sources.discard(index)
+            if not sources:
+                del self.cells[cell]
+
+    def update(self) -> None:
+        """
+            A method to move the light sources which have changed since the index was last updated to the cells they are now in. This is called whenever the index is used, so it does not normally need to be called directly.
+        """
+        if not self.moved:
+            return
+        indices = np.fromiter(self.moved, dtype=int, count=len(self.moved))
+        self.moved.clear()
+        radii = self.cutoff_radii(indices)
+        xs = self.field.arrays['x'][indices]
+        ys = self.field.arrays['y'][indices]
+        size = self.cell_size
+        for index, x, y, radius in zip(indices.tolist(), xs.tolist(), ys.tolist(), radii.tolist()):
+            self.remove(index)
+            if radius != radius:
+                continue  # the light source is off
+            if radius != math.inf:
+                x_cells = range(int((x - radius) // size), int((x + radius) // size) + 1)
+                y_cells = range(int((y - radius) // size), int((y + radius) // size) + 1)
+                if len(x_cells) * len(y_cells) <= self.max_cells:
+                    cells = [(i, j) for i in x_cells for j in y_cells]
+                    for cell in cells:
+                        self.cells.setdefault(cell, set()).add(index)
+                    self.source_cells[index] = cells
+                    continue
+            self.everywhere.add(index)
+
+    def indices_near(self, x: float, y: float) -> np.ndarray:
+        """
+            A method to get the indices, in the field, of the light sources which may be brighter than ``tolerance`` at the given position.
+
+            :param x: The x-coordinate of the position.
+            :type x: float
+
+            :param y: The y-coordinate of the position.
+            :type y: float
+
+            :return: The indices of the light sources, in the order they are in the field.
+            :rtype: NumPy array of ints
+        """
+        self.update()
+        near = self.cells.get((int(x // self.cell_size), int(y // self.cell_size)))
+        near = near | self.everywhere if near else self.everywhere
+        return np.sort(np.fromiter(near, dtype=int, count=len(near)))
+
+    def sources_near(self, x: float, y: float) -> List[LightSource]:
+        """
+            A method to get the light sources which may be brighter than ``tolerance`` at the given position.
+
+            :param x: The x-coordinate of the position.
+            :type x: float
+
+            :param y: The y-coordinate of the position.
+            :type y: float
+
+            :return: The light sources, in the order they are in the field.
+            :rtype: list[:class:`LightSource`]
+        """
+        sources = self.field.sources
+        return [sources[i] for i in self.indices_near(x, y).tolist()]
+
+    def __repr__(self) -> str:
+        self.update()
+        return 'LightSourceIndex(' + str(len(self.field)) + ' light sources, ' + str(len(self.cells)) + ' cells)'
+
+class BrightnessRaster:
+    """
+        A precomputed raster of the total brightness of the light sources in a :class:`LightField`, over a rectangular area (e.g. an :class:`Arena`), for scenes where the light sources don't move. There is a raster of the brightness of all of the light sources, for sensors without a label, and one for each label, of the light sources which have that label.
+
+        A :class:`LightSensor` whose field of view is the full circle (which is the default), and which is inside the rasterised area, gets its activation by bilinear interpolation in the raster, so sensing takes the same time however many light sources there are. Interpolation is not accurate close to a light source, so the brightness of every light source within ``near_distance`` of the sensor is worked out exactly instead. Any other sensor, i.e. one with a narrower field of view, or outside the rasterised area, gets its activation exactly, in the usual way.
+
+        The raster is made when it is first used, and is thrown away whenever any light source in the field changes in any way (e.g. moves, or is switched on or off), to be made again when it is next used. In a scene where light sources move on every step, it is faster not to use a raster.
+    """
+    def __init__(self, field: LightField, x_min: float, x_max: float, y_min: float, y_max: float, resolution: float=0.5, near_distance: float=2):
+        """
+            __init__(field: LightField, x_min: float, x_max: float, y_min: float, y_max: float, resolution: float=0.5, near_distance: float=2)
+
+            Makes a raster of the brightness of the light sources in a :class:`LightField`, which is used by sensors from then on. The raster can be removed again by setting the field's ``raster`` attribute to ``None``.
+
+            :param field: The field to make the raster for.
+            :type field: :class:`LightField`
+
+            :param x_min: The smallest x-coordinate of the rasterised area.
+            :type x_min: float
+
+            :param x_max: The largest x-coordinate of the rasterised area.
+            :type x_max: float
+
+            :param y_min: The smallest y-coordinate of the rasterised area.
+            :type y_min: float
+
+            :param y_max: The largest y-coordinate of the rasterised area.
+            :type y_max: float
+
+            :param resolution: The distance between the points of the raster. Defaults to ``0.5``.
+            :type resolution: float
+
+            :param near_distance: The distance within which the brightness of a light source is worked out exactly, rather than interpolated. Defaults to ``2``.
+            :type near_distance: float
+        """
+        self.field = field
+        self.resolution = resolution
+        self.near_distance = near_distance
+        self.x_min = x_min
+        self.y_min = y_min
+        self.xs = x_min + resolution * np.arange(max(2, int(math.ceil((x_max - x_min) / resolution)) + 1))
+        self.ys = y_min + resolution * np.arange(max(2, int(math.ceil((y_max - y_min) / resolution)) + 1))
+        self.x_max = self.xs[-1]
+        self.y_max = self.ys[-1]
+        self.max_block = 2**20  # the largest number of (point, light source) brightnesses which are computed at once, when making the raster
+        self.rasters: Dict[int, np.ndarray] = None  # the rasters, by label code, where None is for all light sources
+        self.near_sources: Dict[Tuple[int, int], np.ndarray] = None  # the light sources which are near each cell of the raster
+        field.raster = self
+
+    def invalidate(self) -> None:
+        """
+            A method to throw the raster away, so that it is made again when it is next used. The field calls this whenever one of its light sources changes.
+        """
+        self.rasters = None
+        self.near_sources = None
+
+    def update(self) -> None:
+        """
+            A method to make the raster, if it has been invalidated. This is called whenever the raster is used, so it does not normally need to be called directly.
+        """
+        if self.rasters is not None:
+            return
+        field = self.field
+        labels = field.label
+        codes = np.unique(labels).tolist()
+        shape = (len(self.ys), len(self.xs))
+        rasters = {code: np.zeros(shape) for code in [None] + codes}
+        # a matrix which sums the brightnesses of the light sources with each label
+        label_sums = (labels[:, np.newaxis] == np.array(codes, dtype=int)).astype(float)
+        # the raster is made a few rows at a time, to limit the memory used
+        rows = max(1, self.max_block // max(1, len(self.xs) * len(field)))
+        for start in range(0, len(self.ys), rows):
+            y, x = np.meshgrid(self.ys[start:start + rows], self.xs, indexing='ij')
+            brightnesses = field.brightness_at(x.ravel(), y.ravel())
+            rasters[None][start:start + rows] = brightnesses.sum(axis=1).reshape(x.shape)
+            if len(codes) > 1:
+                for code, sums in zip(codes, (brightnesses @ label_sums).T):
+                    rasters[code][start:start + rows] = sums.reshape(x.shape)
+        if len(codes) == 1:
+            rasters[codes[0]] = rasters[None]
+        self.rasters = rasters
+
+        # the light sources which are within near_distance of each cell
+        self.near_sources = {}
+        near = {}
+        size = self.resolution
+        reach = self.near_distance
+        for index, (x, y, is_on) in enumerate(zip(field.x.tolist(), field.y.tolist(), field.is_on.tolist())):
+            if not is_on:
+                continue
+            # one cell further down and to the left, as a sensor on the far edge of the raster is treated as being in the last cell
+            for i in range(int((x - reach - self.x_min) // size) - 1, int((x + reach - self.x_min) // size) + 1):
+                for j in range(int((y - reach - self.y_min) // size) - 1, int((y + reach - self.y_min) // size) + 1):
+                    near.setdefault((i, j), []).append(index)
+        self.near_sources = {cell: np.array(indices) for cell, indices in near.items()}
+
+    def activations(self, sensors: list) -> np.ndarray:
+        """
+            A method to get the activations of a list of :class:`LightSensor` objects from the raster, before noise is added.
+
+            :param sensors: The sensors, which must all detect the light sources in the raster's field.
+            :type sensors: List of :class:`LightSensor` objects
+
+            :return: The activations of the sensors, which are ``nan`` for any sensor which can't use the raster, because its field of view is not the full circle, or it is outside the rasterised area.
+            :rtype: NumPy array of floats
+        """
+        self.update()
+        field = self.field
+        x = np.array([sensor.x for sensor in sensors], dtype=float)
+        y = np.array([sensor.y for sensor in sensors], dtype=float)
+        full_FOV = np.array([sensor.FOV / 2 >= math.pi for sensor in sensors], dtype=bool)
+        usable = full_FOV & (x >= self.x_min) & (x <= self.x_max) & (y >= self.y_min) & (y <= self.y_max)
+        activations = np.full(len(sensors), np.nan)
+
+        # the cell which each sensor is in, and where it is in the cell
+        fx = (x - self.x_min) / self.resolution
+        fy = (y - self.y_min) / self.resolution
+        i = np.clip(np.floor(np.where(usable, fx, 0)).astype(int), 0, len(self.xs) - 2)
+        j = np.clip(np.floor(np.where(usable, fy, 0)).astype(int), 0, len(self.ys) - 2)
+        tx = fx - i
+        ty = fy - j
+        weights = [(1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty]
+        corners = [(0, 0), (1, 0), (0, 1), (1, 1)]
+
+        for k in np.flatnonzero(usable).tolist():
+            sensor = sensors[k]
+            code = field.label_id(sensor.label) if sensor.label else None
+            raster = self.rasters.get(code)
+            if raster is None:
+                activations[k] = 0.0  # no light source has the sensor's label
+                continue
+            activation = sum(weight[k] * raster[j[k] + dj, i[k] + di] for weight, (di, dj) in zip(weights, corners))
+            # replace the interpolated brightness of the light sources near the
+            # sensor with their exact brightness
+            near = self.near_sources.get((i[k], j[k]))
+            if near is not None and code is not None:
+                near = near[field.label[near] == code]
+            if near is not None and len(near):
+                xs = np.array([self.xs[i[k]], self.xs[i[k] + 1], self.xs[i[k]], self.xs[i[k] + 1], x[k]])[:, np.newaxis]
+                ys = np.array([self.ys[j[k]], self.ys[j[k]], self.ys[j[k] + 1], self.ys[j[k] + 1], y[k]])[:, np.newaxis]
+                dx = field.x[near] - xs
+                dy = field.y[near] - ys
+                brightnesses = light_brightnesses(np.sqrt(dx * dx + dy * dy), field.brightness[near], field.gradient[near], field.model[near], field.is_on[near]).sum(axis=1)
+                activation += brightnesses[4] - sum(weight[k] * brightness for weight, brightness in zip(weights, brightnesses[:4]))
+            activations[k] = activation
+        return activations
+
+    def __repr__(self) -> str:
+        return 'BrightnessRaster(' + str(len(self.xs)) + 'x' + str(len(self.ys)) + ' points, ' + str(len(self.field)) + ' light sources)'
+
 class PerturbableLightSource(LightSource):
 
     def perturb(self):
@@ -115,3 +115,57 @@ class Test_Controller(MyTestCase):
         self.assertTrue(len(d["params_hist"][-1]) == 3)
         self.assertTrue(len(d["inputs_hist"][-1]) == 3)
         self.assertTrue(len(d["commands_hist"][-1]) == 5)
+
+    def test_history_window(self):
+
+        windows = []
+
+        @history_window(4)
+        def adapt_fun(dt, inputs_hist, commands_hist, params_hist):
+            windows.append((list(inputs_hist), list(commands_hist), list(params_hist)))
+            return [params_hist[-1][0] + 1]
+
+        c = Controller(inputs_n=1, commands_n=5, step_fun=dummy_stepfun, params=[0], adapt_fun=adapt_fun)
+
+        n = 10
+        for i in range(n):
+
+            c.step(0.1, inputs=[i])
+
+        # the full histories are still recorded
+        self.assertTrue(len(c.inputs_hist) == n+1)
+        self.assertTrue(len(c.params_hist) == n+1)
+
+        # but adapt_fun only sees the last 4 entries of each
+        self.assertTrue(len(windows) == n)
+        self.assertTrue(windows[0][0] == [[0], [0]])
+        self.assertTrue(windows[-1][0] == [[6], [7], [8], [9]])
+        self.assertTrue(windows[-1][2] == [[6], [7], [8], [9]])
+        self.assertTrue(len(windows[-1][1]) == 4)
+        self.assertTrue(c.params == [10])
+
+    def test_history_window_not_recorded(self):
+
+        @history_window(3)
+        def adapt_fun(dt, inputs_hist, commands_hist, params_hist):
+            self.assertTrue(inputs_hist[-1] == inputs_hist[len(inputs_hist) - 1])
+            self.assertTrue(inputs_hist[0:2] == [inputs_hist[0], inputs_hist[1]])
+            return [sum(inputs[0] for inputs in inputs_hist)]
+
+        c = Controller(inputs_n=1, commands_n=5, step_fun=dummy_stepfun, params=[0], adapt_fun=adapt_fun, record_history=False)
+
+        n = 10
+        for i in range(n):
+
+            c.step(0.1, inputs=[i])
+
+        # only the window is kept
+        self.assertTrue(list(c.inputs_hist) == [[7], [8], [9]])
+        self.assertTrue(len(c.commands_hist) == 3)
+        self.assertTrue(len(c.params_hist) == 3)
+        self.assertTrue(c.params == [7 + 8 + 9])
+
+        c.reset()
+
+        self.assertTrue(list(c.inputs_hist) == [[0]])
+        self.assertTrue(list(c.params_hist) == [[0]])
@@ -90,3 +90,157 @@ class Test_Sensor(MyTestCase):
         # TEST STEP METHOD
 
         # TEST RESET METHOD
+
+'''
+
+    The LightSensorBank class has these attributes:
+
+        sensors
+        min_sources
+        source_lists
+        sources
+        indices
+        source_values
+        source_arrays
+
+    The LightSensorBank class has these methods:
+
+        __init__
+        update_sources
+        source_attributes
+        activations
+        exact_activations
+        banked
+        step
+
+'''
+
+# a list of light sensors, and a list of light sources, with a mix of
+# models, labels, fields of view and sensors which are disabled or noisy
+def make_sensors(seed):
+    rng = np.random.default_rng(seed)
+    sources = []
+    for _ in range(40):
+        sources.append(LightSource(x=rng.uniform(-10, 10), y=rng.uniform(-10, 10), brightness=rng.choice([1, 2.5, -1]), gradient=rng.uniform(0, 0.2), model=rng.choice(['inv_sq', 'linear', 'binary']), is_on=bool(rng.random() < 0.8), label=rng.choice([None, 'a', 'b'])))
+    some_sources = sources[10:30][::-1] + sources[:3]
+    sensors = []
+    for i in range(8):
+        noisemaker = WhiteNoiseSource(min_val=-0.1, max_val=0.1) if i % 4 == 0 else None
+        sensors.append(LightSensor(light_sources=sources if i % 3 else some_sources, x=rng.uniform(-10, 10), y=rng.uniform(-10, 10), theta=rng.uniform(-7, 7), FOV=rng.choice([2*math.pi, math.pi/2, 1.0]), label=rng.choice([None, 'a', 'b']), enabled=bool(rng.random() < 0.9), noisemaker=noisemaker))
+    # a source which is exactly on the edge of a sensor's field of view
+    sources[5].x, sources[5].y = 1.0, 1.0
+    sensors.append(LightSensor(light_sources=sources, x=0.0, y=0.0, theta=0.0, FOV=math.pi/2))
+    return sensors
+
+class Test_LightSensorBank(MyTestCase):
+
+    def test_step(self):
+
+        # stepping sensors with a bank should give exactly the same results
+        # as stepping them one at a time
+        for seed in range(5):
+            sensors = make_sensors(seed)
+            banked_sensors = make_sensors(seed)
+            bank = LightSensorBank(banked_sensors)
+            rng = np.random.default_rng(seed)
+
+            for step in range(20):
+
+                for sensor, banked_sensor in zip(sensors, banked_sensors):
+                    sensor.x = banked_sensor.x = sensor.x + rng.normal(0, 0.5)
+                    sensor.y = banked_sensor.y = sensor.y + rng.normal(0, 0.5)
+                    sensor.theta = banked_sensor.theta = sensor.theta + rng.normal(0, 0.5)
+
+                # change the light sources part way through
+                if step == 10:
+                    sensors[0].light_sources[3].is_on = False
+                    banked_sensors[0].light_sources[3].is_on = False
+                    sensors[1].light_sources.append(LightSource(x=1, y=1))
+                    banked_sensors[1].light_sources.append(LightSource(x=1, y=1))
+
+                np.random.seed(step)
+                activations = [sensor.step(0.1) for sensor in sensors]
+                np.random.seed(step)
+                banked_activations = bank.step(0.1)
+
+                self.assertTrue(activations == banked_activations)
+
+            for sensor, banked_sensor in zip(sensors, banked_sensors):
+                self.assertTrue(sensor.activations == banked_sensor.activations)
+                self.assertTrue(sensor.xs == banked_sensor.xs)
+                self.assertTrue(sensor.thetas == banked_sensor.thetas)
+
+    def test_min_sources(self):
+
+        # sensors with only a few light sources are stepped one at a time,
+        # unless the bank is told to vectorise over them, and in both cases
+        # changes to the light sources between steps should be seen
+        for min_sources in [BANK_MIN_SOURCES, 0]:
+            sources = [LightSource(x=3, y=1), LightSource(x=-2, y=4, model='linear', label='a')]
+            banked_sources = [LightSource(x=3, y=1), LightSource(x=-2, y=4, model='linear', label='a')]
+            sensors = [LightSensor(light_sources=sources, x=0, y=0, theta=i) for i in range(3)]
+            banked_sensors = [LightSensor(light_sources=banked_sources, x=0, y=0, theta=i) for i in range(3)]
+            bank = LightSensorBank(banked_sensors, min_sources=min_sources)
+
+            self.assertTrue(all(bank.banked(sensor) == (min_sources == 0) for sensor in banked_sensors))
+
+            for step in range(6):
+                for source in [sources[step % 2], banked_sources[step % 2]]:
+                    source.x += 0.5
+                    source.is_on = step != 3
+                    source.label = 'b' if step == 4 else source.label
+                activations = [sensor.step(0.1) for sensor in sensors]
+                self.assertTrue(activations == bank.step(0.1))
+
+    def test_no_sources(self):
+
+        sensors = [LightSensor(x=0, y=2, light_sources=[]), LightSensor(x=0, y=2, light_sources=[], enabled=False)]
+        bank = LightSensorBank(sensors)
+
+        self.assertTrue(bank.step(0.1) == [0, 0])
+        self.assertTrue(sensors[0].activations == [0, 0])
+
+    def test_light_field(self):
+
+        # sensors which detect the light sources in a LightField, which only
+        # visit the light sources with their label, and read their attributes
+        # from the field's arrays, should give exactly the same results as
+        # sensors which loop over a list of the same light sources
+        sensors = make_sensors(0)
+        sources = sensors[1].light_sources
+        sensors = [sensor for sensor in sensors if sensor.light_sources is sources]
+        field_sensors = make_sensors(0)
+        field_sources = field_sensors[1].light_sources
+        field = LightField(field_sources)
+        field_sensors = [sensor for sensor in field_sensors if sensor.light_sources is field_sources]
+        for sensor in field_sensors:
+            sensor.light_sources = field
+        bank = LightSensorBank(field_sensors)
+
+        self.assertTrue(len(sensors) > 1)
+
+        for step in range(10):
+
+            for sensor, field_sensor in zip(sensors, field_sensors):
+                sensor.theta = field_sensor.theta = sensor.theta + 0.3
+
+            if step == 5:
+                sources[4].is_on = not sources[4].is_on
+                field[4].is_on = not field[4].is_on
+
+            # swap the light sources' labels, as LightSwitcherDisturbanceSource
+            # does, and then change the sensors' labels, as
+            # SensorLabelSwitcherDisturbance does
+            if step == 3:
+                for source, field_source in zip(sources, field):
+                    source.label = field_source.label = {'a': 'b', 'b': 'a', None: None}[source.label]
+            if step == 7:
+                for sensor, field_sensor in zip(sensors, field_sensors):
+                    sensor.label = field_sensor.label = 'a'
+
+            np.random.seed(step)
+            activations = [sensor.step(0.1) for sensor in sensors]
+            np.random.seed(step)
+            self.assertTrue(activations == [sensor.step(0.1) for sensor in field_sensors])
+            np.random.seed(step)
+            self.assertTrue(activations == bank.step(0.1))
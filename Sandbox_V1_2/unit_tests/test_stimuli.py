@@ -214,3 +214,291 @@ class Test_LightSource(MyTestCase):
         self.assertTrue(ls.model == 'inv_sq')
         self.assertTrue(ls.colour == 'yellow')
         self.assertTrue(ls.label == None)
+
+'''
+
+    The LightField class has these attributes:
+
+        sources
+        arrays
+        model_names
+        model_ids
+        label_names
+        label_ids
+        index
+        raster
+        partitions
+
+    The LightField class has these methods:
+
+        __init__
+        append
+        extend
+        code
+        get_value
+        set_value
+        label_id
+        partition
+        detectable_indices
+        brightness_at
+
+'''
+
+class Test_LightField(MyTestCase):
+
+    def test_init(self) -> None:
+
+        sources = [LightSource(x=i, y=2*i, brightness=i+1, model=['inv_sq', 'linear', 'binary'][i % 3], is_on=(i != 2), label=[None, 'red'][i % 2]) for i in range(5)]
+        field = LightField(sources, capacity=2)
+
+        self.assertTrue(len(field) == 5)
+        self.assertTrue(list(field) == sources)
+        self.assertTrue(field[3] is sources[3])
+        self.assertTrue(list(field.x) == [0, 1, 2, 3, 4])
+        self.assertTrue(list(field.y) == [0, 2, 4, 6, 8])
+        self.assertTrue(list(field.brightness) == [1, 2, 3, 4, 5])
+        self.assertTrue(list(field.is_on) == [True, True, False, True, True])
+        self.assertTrue(list(field.model) == [0, 1, 2, 0, 1])
+        self.assertTrue(field.label_names[field.label[1]] == 'red')
+        self.assertTrue(field.label_id('blue') == -1)
+
+        # the light sources' attributes are views of the field's arrays
+        self.assertTrue(sources[1].x == 1)
+        self.assertTrue(sources[1].model == 'linear')
+        self.assertTrue(sources[1].label == 'red')
+        self.assertTrue(not sources[2].is_on)
+
+        sources[1].x = 10
+        sources[1].label = 'yellow'
+        sources[1].model = 'binary'
+        self.assertTrue(field.x[1] == 10)
+        self.assertTrue(sources[1].label == 'yellow')
+        self.assertTrue(field.model[1] == 2)
+
+        # a light source can only be in one field
+        with self.assertRaises(ValueError):
+            LightField([sources[0]])
+
+    def test_reset(self) -> None:
+
+        ls = LightSource(x=0, y=2, model='inv_sq', label='red')
+        field = LightField([ls])
+
+        ls.x = 78
+        ls.brightness = 29
+        ls.model = 'binary'
+        ls.label = 'yellow'
+
+        d = ls.get_data_and_reset()
+
+        self.assertTrue(d["x"] == 78)
+        self.assertTrue(d["brightness"] == 29)
+        self.assertTrue(d["model"] == 'binary')
+        self.assertTrue(d["label"] == 'yellow')
+        self.assertTrue(field.x[0] == 0)
+        self.assertTrue(field.brightness[0] == 1)
+        self.assertTrue(ls.model == 'inv_sq')
+        self.assertTrue(ls.label == 'red')
+
+    def test_disturbances(self) -> None:
+
+        sources = [LightSource(x=0, y=0, colour='red', label='red'), LightSource(x=1, y=0, colour='yellow', label='yellow')]
+        field = LightField(sources)
+        switcher = LightSwitcherDisturbanceSource(light_sources=field, start_times=[0.05])
+        switcher.step(0.1)
+
+        self.assertTrue(sources[0].label == 'yellow')
+        self.assertTrue(sources[1].label == 'red')
+        self.assertTrue(field.label_names[field.label[0]] == 'yellow')
+
+        ls = PerturbableLightSource(x=1, y=2)
+        field.append(ls)
+        ls.perturb()
+
+        self.assertTrue(field.x[2] == ls.x)
+        self.assertTrue(ls.xs[-1] == ls.x)
+
+    def test_partition(self) -> None:
+
+        sources = [LightSource(x=i, y=0, colour=['red', 'yellow'][i % 2], label=['red', 'yellow'][i % 2]) for i in range(6)]
+        field = LightField(sources)
+
+        indices, partition = field.partition('red')
+        self.assertTrue(list(indices) == [0, 2, 4])
+        self.assertTrue(partition == [sources[0], sources[2], sources[4]])
+        self.assertTrue(field.partition('blue')[1] == [])
+        self.assertTrue(list(field.detectable_indices(0, 0, 'yellow')) == [1, 3, 5])
+        self.assertTrue(list(field.detectable_indices(0, 0)) == list(range(6)))
+
+        # the partitions follow the light sources' labels
+        switcher = LightSwitcherDisturbanceSource(light_sources=field, start_times=[0.05])
+        switcher.step(0.1)
+        self.assertTrue(list(field.partition('red')[0]) == [1, 3, 5])
+        sources[0].label = 'red'
+        self.assertTrue(list(field.partition('red')[0]) == [0, 1, 3, 5])
+
+    def test_brightness_at(self) -> None:
+
+        rng = np.random.default_rng(0)
+        sources = [LightSource(x=rng.uniform(-10, 10), y=rng.uniform(-10, 10), brightness=rng.uniform(0, 2), model=['inv_sq', 'linear', 'binary'][i % 3], is_on=(i % 5 != 0)) for i in range(30)]
+        field = LightField(sources)
+        xs = rng.uniform(-10, 10, 7)
+        ys = rng.uniform(-10, 10, 7)
+
+        brightnesses = field.brightness_at(xs, ys)
+
+        self.assertTrue(brightnesses.shape == (7, 30))
+        for i in range(7):
+            for j, source in enumerate(sources):
+                self.assertTrue(brightnesses[i, j] == source.get_brightness_at(xs[i], ys[i]))
+
+'''
+
+    The LightSourceIndex class has these attributes:
+
+        field
+        tolerance
+        cells
+        everywhere
+        source_cells
+        max_cells
+        cell_size
+        moved
+
+    The LightSourceIndex class has these methods:
+
+        __init__
+        cutoff_radii
+        remove
+        update
+        indices_near
+        sources_near
+
+'''
+
+class Test_LightSourceIndex(MyTestCase):
+
+    def test_init(self) -> None:
+
+        sources = [LightSource(x=0, y=0, brightness=1, gradient=0.1, model='linear'),
+                   LightSource(x=50, y=0, brightness=1, model='inv_sq'),
+                   LightSource(x=0, y=50, brightness=1, model='binary'),
+                   LightSource(x=50, y=50, brightness=1, model='binary', is_on=False)]
+        field = LightField(sources)
+        index = LightSourceIndex(field, tolerance=0.01, cell_size=5)
+
+        self.assertTrue(field.index is index)
+        radii = index.cutoff_radii(np.arange(4))
+        self.assertTrue(abs(radii[0] - 9.9) < 1e-6)
+        self.assertTrue(abs(radii[1] - 9) < 1e-6)
+        self.assertTrue(radii[2] == math.inf)
+        self.assertTrue(np.isnan(radii[3]))
+
+        self.assertTrue(list(index.indices_near(1, 1)) == [0, 2])
+        self.assertTrue(list(index.indices_near(52, 2)) == [1, 2])
+        self.assertTrue(list(index.indices_near(25, 25)) == [2])
+        self.assertTrue(index.sources_near(1, 1) == [sources[0], sources[2]])
+
+    def test_update(self) -> None:
+
+        ls = PerturbableLightSource(x=0, y=0, brightness=1, gradient=0.1, model='linear')
+        field = LightField([ls])
+        index = LightSourceIndex(field, tolerance=0)
+
+        self.assertTrue(list(index.indices_near(100, 100)) == [])
+
+        # the index follows the light source when it moves, or changes
+        ls.x = 100
+        ls.y = 100
+        self.assertTrue(index.moved == {0})
+        self.assertTrue(list(index.indices_near(100, 100)) == [0])
+        self.assertTrue(list(index.indices_near(0, 0)) == [])
+
+        ls.perturb()
+        self.assertTrue(list(index.indices_near(ls.x, ls.y)) == [0])
+
+        ls.is_on = False
+        self.assertTrue(list(index.indices_near(ls.x, ls.y)) == [])
+
+        ls.reset()
+        self.assertTrue(ls.is_on)
+        self.assertTrue(list(index.indices_near(ls.x, ls.y)) == [0])
+
+    def test_sensors(self) -> None:
+
+        rng = np.random.default_rng(1)
+        sources = [LightSource(x=rng.uniform(-100, 100), y=rng.uniform(-100, 100), brightness=rng.uniform(0.5, 2), gradient=rng.uniform(0.05, 0.2), model='linear') for i in range(200)]
+        field = LightField(sources)
+        sensors = [LightSensor(field, x=rng.uniform(-100, 100), y=rng.uniform(-100, 100)) for _ in range(20)]
+        activations = [sensor.step(0.1) for sensor in sensors]
+
+        # with a tolerance of 0, only light sources which sensors can't
+        # detect are left out, so their activations don't change
+        LightSourceIndex(field, tolerance=0)
+        self.assertTrue([sensor.step(0.1) for sensor in sensors] == activations)
+        self.assertTrue(list(LightSensorBank(sensors).step(0.1)) == activations)
+
+'''
+
+    The BrightnessRaster class has these attributes:
+
+        field
+        resolution
+        near_distance
+        x_min
+        x_max
+        y_min
+        y_max
+        xs
+        ys
+        max_block
+        rasters
+        near_sources
+
+    The BrightnessRaster class has these methods:
+
+        __init__
+        invalidate
+        update
+        activations
+
+'''
+
+class Test_BrightnessRaster(MyTestCase):
+
+    def test_activations(self) -> None:
+
+        rng = np.random.default_rng(2)
+        sources = [LightSource(x=rng.uniform(-20, 20), y=rng.uniform(-20, 20), brightness=rng.uniform(0.5, 2), model=['inv_sq', 'linear', 'binary'][i % 3], label=['red', 'yellow'][i % 2]) for i in range(30)]
+        field = LightField(sources)
+        sensors = [LightSensor(field, x=rng.uniform(-20, 20), y=rng.uniform(-20, 20), label=[None, 'red', 'blue'][i % 3]) for i in range(30)]
+        sensors += [LightSensor(field, x=0, y=0, FOV=1), LightSensor(field, x=30, y=0)]
+        exact = [sensor.step(0.1) for sensor in sensors]
+
+        raster = BrightnessRaster(field, -20, 20, -20, 20, resolution=0.5)
+        activations = [sensor.step(0.1) for sensor in sensors]
+
+        self.assertTrue(field.raster is raster)
+        self.assertTrue(np.allclose(activations, exact, rtol=1e-3, atol=1e-12))
+        self.assertTrue(np.allclose(LightSensorBank(sensors).step(0.1), activations, rtol=1e-12, atol=1e-15))
+        # no light source has the label blue
+        self.assertTrue(activations[2] == 0)
+        # sensors with a narrower field of view, or outside the raster, are exact
+        self.assertTrue(activations[-2:] == exact[-2:])
+
+    def test_invalidate(self) -> None:
+
+        ls = LightSource(x=0, y=0, brightness=1, model='inv_sq')
+        field = LightField([ls])
+        raster = BrightnessRaster(field, -10, 10, -10, 10, resolution=1, near_distance=0.5)
+        sensor = LightSensor(field, x=5, y=0)
+
+        self.assertTrue(sensor.step(0.1) == 1 / 36)
+
+        # the raster is made again when a light source changes
+        ls.x = 2
+        self.assertTrue(raster.rasters is None)
+        self.assertTrue(sensor.step(0.1) == 1 / 16)
+
+        ls.is_on = False
+        self.assertTrue(sensor.step(0.1) == 0)